@@ -1,9 +1,7 @@
 # -*- coding: utf-8 -*-
-import math
 import os
 import pickle
 
-import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 import requests
@@ -14,12 +12,17 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import search_google.api
+from comparables import ComparableFighters
 from dash.dependencies import Input, Output, State
+from metrics import PREDICTIONS, add_metrics_route, observed
+from predict import df_weight_classes, predict_proba, with_age
 
 GOOGLE_API_DEVELOPER_KEY = "enter_key_here"
 CSE_ID = "enter_id_here"
 
-fighter_df = pd.read_csv("app_data/latest_fighter_stats.csv", index_col="index")
+FIGHTER_STATS_PATH = "app_data/latest_fighter_stats.csv"
+
+fighter_df = pd.read_csv(FIGHTER_STATS_PATH, index_col="index")
 weight_classes = pd.read_csv("app_data/weight_classes.csv")
 
 with open("app_data/model.sav", "rb") as mdl:
@@ -31,42 +34,18 @@ with open("app_data/cols.list", "rb") as c:
 with open("app_data/standard.scaler", "rb") as ss:
     scaler = pickle.load(ss)
 
-df_weight_classes = {
-    "Flyweight": "weight_class_Flyweight",
-    "Bantamweight": "weight_class_Bantamweight",
-    "Featherweight": "weight_class_Featherweight",
-    "Lightweight": "weight_class_Lightweight",
-    "Welterweight": "weight_class_Welterweight",
-    "Middleweight": "weight_class_Middleweight",
-    "Light Heavyweight": "weight_class_LightHeavyweight",
-    "Heavyweight": "weight_class_Heavyweight",
-    "Women's Strawweight": "weight_class_Women_Strawweight",
-    "Women's Flyweight": "weight_class_Women_Flyweight",
-    "Women's Bantamweight": "weight_class_Women_Bantamweight",
-    "Women's Featherweight": "weight_class_Women_Featherweight",
-    "Catch Weight": "weight_class_CatchWeight",
-    "Open Weight": "weight_class_OpenWeight",
-}
-
-
-def normalize(df: pd.DataFrame, scaler) -> pd.DataFrame:
-    df_num = df.select_dtypes(include=[np.float, np.int])
-    df[list(df_num.columns)] = scaler.transform(df[list(df_num.columns)])
-    return df
-
+comparables = ComparableFighters(fighter_df)
+comparables_mtime = os.path.getmtime(FIGHTER_STATS_PATH)
 
-def get_age(X):
 
-    median_age = 29
-
-    DOB = pd.to_datetime(X)
-    today = pd.to_datetime("today")
-
-    if pd.isnull(DOB):
-        return median_age
-    else:
-        age = math.floor((today - DOB).days / 365.25)
-        return age
+def current_comparables():
+    """The comparables, updated when ``latest_fighter_stats.csv`` was exported again."""
+    global comparables_mtime
+    mtime = os.path.getmtime(FIGHTER_STATS_PATH)
+    if mtime != comparables_mtime:
+        comparables.update(pd.read_csv(FIGHTER_STATS_PATH, index_col="index"))
+        comparables_mtime = mtime
+    return comparables
 
 
 def get_fighter_url(fighter):
@@ -116,6 +95,7 @@ external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 
 server = app.server
+add_metrics_route(server)
 
 app.scripts.config.serve_locally = True
 
@@ -266,6 +246,25 @@ app.layout = html.Div(
         html.Br(),
         html.Br(),
         html.Br(),
+        html.Div(
+            style={"width": "40%", "marginLeft": "auto", "marginRight": "auto"},
+            children=[
+                html.H2("Comparable Fighters", style={"textAlign": "center"}),
+                html.Label("Select Fighter", style={"fontSize": size["font"]}),
+                dcc.Dropdown(id="comparable-fighter"),
+                html.Br(),
+                html.Label("Number of Fighters", style={"fontSize": size["font"]}),
+                dcc.Dropdown(
+                    id="no_of_comparables",
+                    options=[{"label": str(k), "value": k} for k in (5, 10, 20)],
+                    value=5,
+                ),
+                html.Br(),
+                html.Div(id="comparables"),
+            ],
+        ),
+        html.Br(),
+        html.Br(),
         html.Div(
             [
                 dcc.Markdown(
@@ -317,6 +316,7 @@ app.layout = html.Div(
 
 
 @app.callback(Output("fight_type", "options"), [Input("no_of_rounds", "value")])
+@observed("set_no_of_rounds")
 def set_no_of_rounds(no_of_rounds):
     if no_of_rounds == 5:
         return [
@@ -328,6 +328,7 @@ def set_no_of_rounds(no_of_rounds):
 
 
 @app.callback(Output("red-fighter", "options"), [Input("weightclass", "value")])
+@observed("set_red_fighter")
 def set_red_fighter(weightclass):
 
     return [
@@ -339,6 +340,7 @@ def set_red_fighter(weightclass):
 
 
 @app.callback(Output("red-fighter", "value"), [Input("red-fighter", "options")])
+@observed("set_red_fighter_value")
 def set_red_fighter_value(options):
     if options:
         return options[7]["value"]
@@ -349,6 +351,7 @@ def set_red_fighter_value(options):
     Output("blue-fighter", "options"),
     [Input("weightclass", "value"), Input("red-fighter", "value")],
 )
+@observed("set_blue_fighter")
 def set_blue_fighter(weightclass, red_fighter):
     blue_weight_classes = weight_classes.copy()
 
@@ -365,6 +368,7 @@ def set_blue_fighter(weightclass, red_fighter):
 
 
 @app.callback(Output("blue-fighter", "value"), [Input("blue-fighter", "options")])
+@observed("set_blue_fighter_value")
 def set_blue_fighter_value(options):
     if options:
         return options[9]["value"]
@@ -372,6 +376,7 @@ def set_blue_fighter_value(options):
 
 
 @app.callback(Output("red-image", "src"), [Input("red-fighter", "value")])
+@observed("set_image_red")
 def set_image_red(fighter1):
     # return
     if fighter1:
@@ -379,6 +384,7 @@ def set_image_red(fighter1):
 
 
 @app.callback(Output("blue-image", "src"), [Input("blue-fighter", "value")])
+@observed("set_image_blue")
 def set_image_blue(fighter2):
     # return
     if fighter2:
@@ -396,6 +402,7 @@ def set_image_blue(fighter2):
         State("fight_type", "value"),
     ],
 )
+@observed("update_proba")
 def update_proba(nclicks, red, blue, weightclass, no_of_rounds, fight_type):
 
     if nclicks:
@@ -415,26 +422,11 @@ def update_proba(nclicks, red, blue, weightclass, no_of_rounds, fight_type):
                 "Error: Select different fighters",
             )
 
-        df = fighter_df.copy()
-
-        title_bout = {"Non Title": False, "Title": True}
-
-        cols_dict = {
-            df_weight_classes[k]: (1 if weightclass == k else 0)
-            for k in df_weight_classes.keys()
-        }
-        cols_dict.update(
-            {"title_bout": title_bout[fight_type], "no_of_rounds": no_of_rounds}
-        )
-        extra_cols = pd.DataFrame([list(cols_dict.values())], columns=cols_dict.keys())
-        df["age"] = df["DOB"].apply(get_age)
-        df.drop(columns=["DOB"], inplace=True)
-        r = df.loc[[red]].add_prefix("R_").reset_index(drop=True)
-        b = df.loc[[blue]].add_prefix("B_").reset_index(drop=True)
-        final = pd.concat([r, b, extra_cols], axis=1)[cols]
-        [blue_proba, red_proba] = model.predict_proba(
-            np.array(normalize(final, scaler))
+        df = with_age(fighter_df)
+        [blue_proba, red_proba] = predict_proba(
+            model, scaler, cols, df, [(red, blue, weightclass, no_of_rounds, fight_type)]
         )[0]
+        PREDICTIONS.labels(weightclass).inc()
 
         return (f"{red_proba*100:.2f}" + "%", f"{blue_proba*100:.2f}" + "%")
 
@@ -442,6 +434,57 @@ def update_proba(nclicks, red, blue, weightclass, no_of_rounds, fight_type):
         return ("Click Predict", "Click Predict")
 
 
+@app.callback(
+    Output("comparable-fighter", "options"), [Input("no_of_comparables", "value")]
+)
+@observed("set_comparable_fighter")
+def set_comparable_fighter(k):
+    return [{"label": i, "value": i} for i in sorted(current_comparables().fighters())]
+
+
+@app.callback(
+    Output("comparables", "children"),
+    [Input("comparable-fighter", "value"), Input("no_of_comparables", "value")],
+)
+@observed("set_comparables")
+def set_comparables(fighter, k):
+    if not fighter or not k:
+        return "Select a fighter"
+
+    try:
+        similar = current_comparables().similar(fighter, k)
+    except KeyError:
+        return "Select a fighter"
+    shares = ["HEAD_share", "DISTANCE_share", "GROUND_share"]
+    header = [
+        "Fighter",
+        "Style distance",
+        "Head strikes",
+        "At distance",
+        "On the ground",
+        "Takedowns",
+        "Control (s)",
+    ]
+    return html.Table(
+        [html.Tr([html.Th(column) for column in header])]
+        + [
+            html.Tr(
+                [html.Td(name), html.Td(f"{row.distance:.2f}")]
+                + [
+                    html.Td("–" if pd.isna(row[share]) else f"{row[share]*100:.0f}%")
+                    for share in shares
+                ]
+                + [
+                    html.Td(f"{row.avg_TD_att:.1f}"),
+                    html.Td(f"{row['avg_CTRL_time(seconds)']:.0f}"),
+                ]
+            )
+            for name, row in similar.iterrows()
+        ],
+        style={"width": "100%"},
+    )
+
+
 app.title = "UFC Predictions"
 
 if __name__ == "__main__":
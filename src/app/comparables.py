@@ -0,0 +1,102 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+# The style of a fighter: where their significant strikes land and from which
+# position, as shares of the strikes they land, and how much they strike,
+# wrestle and control per fight
+STRIKE_TARGETS = ["HEAD", "BODY", "LEG"]
+STRIKE_POSITIONS = ["DISTANCE", "CLINCH", "GROUND"]
+RATES = [
+    "avg_SIG_STR_landed",
+    "avg_TD_att",
+    "avg_TD_pct",
+    "avg_SUB_ATT",
+    "avg_CTRL_time(seconds)",
+]
+SOURCE_COLUMNS = [f"avg_{part}_landed" for part in STRIKE_TARGETS + STRIKE_POSITIONS] + RATES
+STYLE_COLUMNS = [f"{part}_share" for part in STRIKE_TARGETS + STRIKE_POSITIONS] + RATES
+
+
+def style_features(fighter_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The style features of every fighter of ``fighter_df`` (the latest stats of
+    every fighter), a share is NaN when the fighter never landed a strike.
+    """
+    features = {}
+    for parts in (STRIKE_TARGETS, STRIKE_POSITIONS):
+        landed = fighter_df[[f"avg_{part}_landed" for part in parts]].astype(np.float64)
+        total = landed.sum(axis=1)
+        for part, column in zip(parts, landed.columns):
+            features[f"{part}_share"] = landed[column] / total.where(total > 0)
+    for column in RATES:
+        features[column] = fighter_df[column].astype(np.float64)
+    return pd.DataFrame(features, index=fighter_df.index, columns=STYLE_COLUMNS)
+
+
+class ComparableFighters:
+    """
+    Finds the fighters who fight most like a fighter: the nearest neighbours
+    of their style features, every feature scaled to a mean of 0 and a
+    standard deviation of 1 over all fighters, in a KD-tree.
+
+    ``update`` takes the latest stats of every fighter again and only
+    computes the features of the fighters who are new or whose stats
+    changed, the tree is rebuilt when any did.
+    """
+
+    def __init__(self, fighter_df: pd.DataFrame, leaf_size: int = 40):
+        self.leaf_size = leaf_size
+        self.features = pd.DataFrame(columns=STYLE_COLUMNS, dtype=np.float64)
+        self._sources = pd.DataFrame(columns=SOURCE_COLUMNS, dtype=np.float64)
+        self.update(fighter_df)
+
+    def update(self, fighter_df: pd.DataFrame) -> int:
+        """Returns the number of fighters that were added, changed or removed."""
+        sources = fighter_df[SOURCE_COLUMNS].astype(np.float64)
+        kept = self._sources.reindex(sources.index)
+        changed = ~((kept == sources) | (kept.isna() & sources.isna())).all(axis=1)
+        removed = self._sources.index.difference(sources.index)
+        if not changed.any() and removed.empty:
+            return 0
+
+        unchanged = self.features.drop(index=removed.union(sources.index[changed]), errors="ignore")
+        self.features = pd.concat([unchanged, style_features(sources[changed])]).reindex(sources.index)
+        self._sources = sources
+        self._build()
+        return int(changed.sum()) + len(removed)
+
+    def _build(self):
+        values = self.features.to_numpy()
+        self.mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0)
+        self.std = np.where(std > 0, std, 1)
+        # A missing feature is the average one
+        self.vectors = np.nan_to_num((values - self.mean) / self.std)
+        self.tree = KDTree(self.vectors, leaf_size=self.leaf_size)
+        self._names = self.features.index.to_numpy()
+        self._positions = {name: position for position, name in enumerate(self._names)}
+        self._values = values
+
+    def fighters(self) -> List[str]:
+        return list(self.features.index)
+
+    def similar(self, fighter: str, k: int = 5) -> pd.DataFrame:
+        """
+        The ``k`` fighters closest in style to ``fighter``, closest first, with
+        their distance and style features. Raises a ``KeyError`` for unknown
+        fighters.
+        """
+        position = self._positions[fighter]
+        distances, positions = self.tree.query(
+            self.vectors[position : position + 1], k=min(k + 1, len(self.vectors))
+        )
+        others = positions[0] != position
+        distances, positions = distances[0][others][:k], positions[0][others][:k]
+        return pd.DataFrame(
+            np.column_stack([distances, self._values[positions]]),
+            index=pd.Index(self._names[positions], name=self.features.index.name),
+            columns=["distance"] + STYLE_COLUMNS,
+        )
@@ -0,0 +1,49 @@
+import functools
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, Counter, Histogram,
+                               generate_latest)
+
+# Gunicorn runs a single worker by default, with more workers every worker
+# would report its own counts on /metrics.
+
+CALLBACK_DURATION = Histogram(
+    "ufc_app_callback_duration_seconds",
+    "Time taken by the Dash callbacks, by callback",
+    ["callback"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+CALLBACK_ERRORS = Counter(
+    "ufc_app_callback_errors_total", "Dash callbacks that raised, by callback", ["callback"]
+)
+PREDICTIONS = Counter(
+    "ufc_app_predictions_total", "Bouts predicted, by weight class", ["weight_class"]
+)
+
+
+def observed(name):
+    """Decorator recording the duration and the errors of a Dash callback."""
+
+    def decorator(callback):
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return callback(*args, **kwargs)
+            except Exception:
+                CALLBACK_ERRORS.labels(name).inc()
+                raise
+            finally:
+                CALLBACK_DURATION.labels(name).observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def add_metrics_route(server):
+    """Serves the metrics in the Prometheus text format on ``/metrics``."""
+
+    @server.route("/metrics")
+    def metrics():
+        return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
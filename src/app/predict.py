@@ -0,0 +1,86 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+df_weight_classes = {
+    "Flyweight": "weight_class_Flyweight",
+    "Bantamweight": "weight_class_Bantamweight",
+    "Featherweight": "weight_class_Featherweight",
+    "Lightweight": "weight_class_Lightweight",
+    "Welterweight": "weight_class_Welterweight",
+    "Middleweight": "weight_class_Middleweight",
+    "Light Heavyweight": "weight_class_LightHeavyweight",
+    "Heavyweight": "weight_class_Heavyweight",
+    "Women's Strawweight": "weight_class_Women_Strawweight",
+    "Women's Flyweight": "weight_class_Women_Flyweight",
+    "Women's Bantamweight": "weight_class_Women_Bantamweight",
+    "Women's Featherweight": "weight_class_Women_Featherweight",
+    "Catch Weight": "weight_class_CatchWeight",
+    "Open Weight": "weight_class_OpenWeight",
+}
+
+title_bout = {"Non Title": False, "Title": True}
+
+# A bout to predict: red fighter, blue fighter, weight class, number of rounds
+# and fight type ("Title" or "Non Title")
+Bout = Tuple[str, str, str, int, str]
+
+
+def normalize(df: pd.DataFrame, scaler) -> pd.DataFrame:
+    # ``float``/``int`` select the float64/int64 columns the scaler was fit on
+    df_num = df.select_dtypes(include=[float, int])
+    df[list(df_num.columns)] = scaler.transform(df[list(df_num.columns)])
+    return df
+
+
+def get_age(X):
+
+    median_age = 29
+
+    DOB = pd.to_datetime(X)
+    today = pd.to_datetime("today")
+
+    if pd.isnull(DOB):
+        return median_age
+    else:
+        age = math.floor((today - DOB).days / 365.25)
+        return age
+
+
+def with_age(fighter_df: pd.DataFrame) -> pd.DataFrame:
+    """Replaces the date of birth of every fighter with their age today."""
+    df = fighter_df.copy()
+    df["age"] = df["DOB"].apply(get_age)
+    df.drop(columns=["DOB"], inplace=True)
+    return df
+
+
+def build_features(fighter_df: pd.DataFrame, bouts: List[Bout], cols: List[str]) -> pd.DataFrame:
+    """
+    One row of model features per bout. ``fighter_df`` holds the latest stats
+    of every fighter, with their age as returned by ``with_age``.
+    """
+    extra_cols = pd.DataFrame(
+        [
+            dict(
+                {
+                    column: (1 if weightclass == name else 0)
+                    for name, column in df_weight_classes.items()
+                },
+                title_bout=title_bout[fight_type],
+                no_of_rounds=no_of_rounds,
+            )
+            for _, _, weightclass, no_of_rounds, fight_type in bouts
+        ]
+    )
+    r = fighter_df.loc[[red for red, *_ in bouts]].add_prefix("R_").reset_index(drop=True)
+    b = fighter_df.loc[[blue for _, blue, *_ in bouts]].add_prefix("B_").reset_index(drop=True)
+    return pd.concat([r, b, extra_cols], axis=1)[cols]
+
+
+def predict_proba(model, scaler, cols: List[str], fighter_df: pd.DataFrame, bouts: List[Bout]) -> np.ndarray:
+    """Blue and red win probability of every bout, in one call of the model."""
+    final = build_features(fighter_df, bouts, cols)
+    return model.predict_proba(np.array(normalize(final, scaler)))
@@ -0,0 +1,113 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from src.benchmarks import suites
+from src.benchmarks.runner import ResultStore, compare, current_commit
+
+from src.createdata.data_files_path import PAGE_ARCHIVE  # isort:skip
+
+SUITES = ["parse", "preprocess", "memory", "fighter_features", "predict", "scrape"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.benchmarks",
+        description="Benchmark the scrape, parse, preprocess and predict stages and compare commits.",
+    )
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of each benchmark")
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100],
+        help="fighter_features: history sizes relative to the base dataset",
+    )
+    parser.add_argument(
+        "--archive",
+        type=Path,
+        default=PAGE_ARCHIVE,
+        help="parse: also benchmark the pages recorded in this archive, if it exists",
+    )
+    parser.add_argument(
+        "--replay-latency", type=float, default=0.0, help="scrape: seconds per replayed request"
+    )
+    parser.add_argument(
+        "--compare",
+        default=None,
+        help="commit to compare against (default: the last other benchmarked commit)",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="slowdown of the median reported as regression"
+    )
+    parser.add_argument(
+        "--fail-on-regression", action="store_true", help="exit with status 1 on a regression"
+    )
+    parser.add_argument(
+        "--max-memory-ratio",
+        type=float,
+        default=suites.MAX_MEMORY_RATIO,
+        help="memory: exit with status 1 when the peak memory of preprocessing is above this "
+        "multiple of the size of the raw files",
+    )
+    parser.add_argument("--no-save", action="store_true", help="don't store the results")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    time_start = time.time()
+    results = {}
+    for suite in args.suites:
+        print(f"Running {suite} benchmarks")
+        if suite == "parse":
+            results.update(suites.parse(repeat=args.repeat, archive_path=args.archive))
+        elif suite == "preprocess":
+            results.update(suites.preprocess(repeat=args.repeat))
+        elif suite == "memory":
+            results.update(
+                suites.memory(repeat=min(args.repeat, 3), max_ratio=args.max_memory_ratio)
+            )
+        elif suite == "fighter_features":
+            results.update(suites.fighter_features(scales=args.scales, repeat=args.repeat))
+        elif suite == "predict":
+            results.update(suites.predict(repeat=4 * args.repeat))
+        elif suite == "scrape":
+            results.update(
+                suites.scrape(repeat=args.repeat, replay_latency=args.replay_latency)
+            )
+
+    store = ResultStore()
+    commit = current_commit()
+    if not args.no_save:
+        store.save(commit, results)
+
+    baseline_commit = args.compare or store.previous_commit(exclude=commit)
+    regressions = []
+    if baseline_commit is None:
+        for name, result in results.items():
+            print(f"{name:<60} {result['median']:>10.4f}{result.get('unit', 's')}")
+    else:
+        print(f"Comparing the medians with {baseline_commit}")
+        regressions = compare(store.load(baseline_commit), results, threshold=args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks are more than {args.threshold:.0%} slower")
+    # Slow drift never shows as a regression against the previous commit
+    over_limit = [name for name, result in results.items() if result.get("exceeded")]
+    for name in over_limit:
+        result = results[name]
+        print(
+            f"{name} is {result['median']:.1f}{result['unit']}, "
+            f"above the limit of {result['max_ratio']:.1f}{result['unit']}"
+        )
+    print(f'elapsed seconds = {(time.time() - time_start):.2f}')
+
+    if over_limit or (regressions and args.fail_on_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.createdata.data_files_path import BENCHMARK_RESULTS  # isort:skip
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def measure(
+    func: Callable[[], object],
+    repeat: int = 5,
+    warmup: int = 1,
+    setup: Optional[Callable[[], None]] = None,
+    items: Optional[int] = None,
+) -> Dict:
+    """
+    Times ``repeat`` calls of ``func`` after ``warmup`` untimed calls.
+    ``setup`` runs before every call and is not timed. ``items`` is the
+    number of things (pages, fights, ...) a call processes, it adds the
+    per-item time to the result.
+    """
+    timings = []
+    for run in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if run >= warmup:
+            timings.append(elapsed)
+    return summarize(timings, items)
+
+
+def summarize(timings: List[float], items: Optional[int] = None) -> Dict:
+    result = {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "repeat": len(timings),
+    }
+    if items:
+        result["items"] = items
+        result["median_per_item"] = result["median"] / items
+    return result
+
+
+def current_commit() -> str:
+    """Short hash of ``HEAD``, with ``-dirty`` appended if the tree has changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if status else commit
+
+
+class ResultStore:
+    """
+    One JSON file of benchmark results per commit, so any two commits can be
+    compared.
+    """
+
+    def __init__(self, base_path: Path = BENCHMARK_RESULTS):
+        self.BASE_PATH = Path(base_path)
+
+    def save(self, commit: str, results: Dict[str, Dict]) -> Path:
+        self.BASE_PATH.mkdir(parents=True, exist_ok=True)
+        path = self.BASE_PATH / f"{commit}.json"
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "commit": commit,
+                    "created_at": time.time(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"Saved benchmark results to {path}")
+        return path
+
+    def load(self, commit: str) -> Dict[str, Dict]:
+        path = self.BASE_PATH / f"{commit}.json"
+        if not path.exists():
+            raise FileNotFoundError(f"No benchmark results for {commit} in {self.BASE_PATH}")
+        with open(path, "r") as f:
+            return json.load(f)["results"]
+
+    def previous_commit(self, exclude: str) -> Optional[str]:
+        """The most recently benchmarked commit other than ``exclude``."""
+        runs = []
+        for path in self.BASE_PATH.glob("*.json"):
+            with open(path, "r") as f:
+                run = json.load(f)
+            if run["commit"] != exclude:
+                runs.append((run["created_at"], run["commit"]))
+        return max(runs)[1] if runs else None
+
+
+def compare(
+    baseline: Dict[str, Dict], results: Dict[str, Dict], threshold: float = 0.1
+) -> List[str]:
+    """
+    Prints the change of the median time of every benchmark and returns the
+    benchmarks that got slower by more than ``threshold``.
+    """
+    regressions = []
+    print(f"{'benchmark':<60} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<60} {'-':>10} {result['median']:>10.4f} {'new':>8}")
+            continue
+        before, after = baseline[name]["median"], result["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <- slower"
+        print(f"{name:<60} {before:>10.4f} {after:>10.4f} {change:>+8.1%}{flag}")
+    return regressions
@@ -0,0 +1,398 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBClassifier
+
+from src.app.comparables import SOURCE_COLUMNS, ComparableFighters
+from src.app.predict import (build_features, df_weight_classes, normalize,
+                             predict_proba, with_age)
+from src.benchmarks.runner import REPO_ROOT, measure, summarize
+from src.benchmarks.synthetic import SyntheticUFC
+from src.createdata.archive import PageArchive
+from src.createdata.feature_cache import FighterFeatureCache
+from src.createdata.metrics import page_type
+from src.createdata.preprocess import Preprocessor
+from src.createdata.preprocess_fighter_data import FighterDetailProcessor
+from src.createdata.preprocess_state import PreprocessState
+from src.createdata.scrape_fight_data import FightDataScraper
+from src.createdata.scrape_fight_links import UFCLinks
+from src.createdata.scrape_fighter_details import FighterDetailsScraper
+
+
+def _parse_events(soup):
+    UFCLinks._get_event_links(soup)
+
+
+def _parse_event(soup):
+    UFCLinks._get_fight_links(soup)
+    UFCLinks._get_event_info(soup)
+
+
+def _parse_fight(soup):
+    FightDataScraper._get_fight_stats(soup)
+    FightDataScraper._get_fight_details(soup)
+    FightDataScraper._get_fight_result_data(soup)
+
+
+def _parse_fighters(soup):
+    FighterDetailsScraper._get_fighter_rows(soup)
+
+
+def _parse_fighter(soup):
+    FighterDetailsScraper._get_fighter_data(soup)
+
+
+PARSERS = {
+    "events": _parse_events,
+    "event": _parse_event,
+    "fight": _parse_fight,
+    "fighters": _parse_fighters,
+    "fighter": _parse_fighter,
+}
+
+
+def _pages_by_type(pages: Dict[str, str], sample: int) -> Dict[str, List[str]]:
+    by_type = defaultdict(list)
+    for url in sorted(pages):
+        if page_type(url) in PARSERS:
+            by_type[page_type(url)].append(pages[url])
+    rng = random.Random(0)
+    return {
+        type_: rng.sample(texts, min(sample, len(texts))) for type_, texts in by_type.items()
+    }
+
+
+def parse(repeat: int = 5, archive_path: Optional[Path] = None, sample: int = 50) -> Dict[str, Dict]:
+    """Building the soup and extracting the data of each type of page."""
+    datasets = {"synthetic": SyntheticUFC(n_fighters=200, n_events=20).pages()}
+    if archive_path is not None and Path(archive_path).exists():
+        archive = PageArchive(archive_path)
+        datasets["recorded"] = {url: archive.load(url) for url in archive.urls()}
+
+    results = {}
+    for dataset, pages in datasets.items():
+        for type_, texts in _pages_by_type(pages, sample).items():
+            parser = PARSERS[type_]
+
+            def parse_pages():
+                for text in texts:
+                    parser(BeautifulSoup(text, "html.parser"))
+
+            results[f"parse.{dataset}.{type_}"] = measure(
+                parse_pages, repeat=repeat, items=len(texts)
+            )
+    return results
+
+
+def _preprocessor(directory: Path, synthetic: Optional[SyntheticUFC] = None) -> Preprocessor:
+    """
+    A ``Preprocessor`` reading and writing every file in ``directory``, with
+    the raw data of ``synthetic`` (default: the raw files already there).
+    """
+    # Memory tracing would slow the steps down
+    preprocessor = Preprocessor(trace_memory=False)
+    preprocessor.TOTAL_EVENT_AND_FIGHTS_PATH = directory / "raw_total_fight_data.csv"
+    preprocessor.FIGHTER_DETAILS_PATH = directory / "raw_fighter_details.csv"
+    preprocessor.UFC_DATA_PATH = directory / "data.csv"
+    preprocessor.PREPROCESSED_DATA_PATH = directory / "preprocessed_data.csv"
+    preprocessor.recorder.LOG_PATH = directory / "preprocess_steps.jsonl"
+    preprocessor.FEATURE_STORE_PATH = directory / "feature_store.pkl"
+    preprocessor.feature_cache = FighterFeatureCache(directory / "feature_cache")
+    preprocessor.state = PreprocessState(directory / "preprocess_state.pkl")
+    if synthetic is not None:
+        synthetic.write_raw_data(
+            preprocessor.TOTAL_EVENT_AND_FIGHTS_PATH, preprocessor.FIGHTER_DETAILS_PATH
+        )
+    return preprocessor
+
+
+def preprocess(repeat: int = 5) -> Dict[str, Dict]:
+    """
+    ``Preprocessor.process_raw_data`` as a whole and step by step, and an
+    incremental run adding the newest event to the others. The warmup run
+    caches the fighter level features, they are benchmarked by
+    ``fighter_features``.
+    """
+    synthetic = SyntheticUFC(n_fighters=400, n_events=200)
+    previous = SyntheticUFC(n_fighters=400, n_events=200)
+    previous.events = previous.events[1:]  # without the newest event
+    step_timings = defaultdict(list)
+    totals = []
+    incremental = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for run in range(repeat + 1):
+            preprocessor = _preprocessor(Path(directory), synthetic)
+            start = time.perf_counter()
+            preprocessor.process_raw_data()
+            elapsed = time.perf_counter() - start
+            if run == 0:
+                continue  # warmup
+            totals.append(elapsed)
+
+            timings = defaultdict(float)
+            for record in preprocessor.recorder.records:
+                timings[record["step"]] += record["seconds"]
+            for step, seconds in timings.items():
+                step_timings[step].append(seconds)
+
+        for _ in range(repeat):
+            _preprocessor(Path(directory), previous).process_raw_data()
+            preprocessor = _preprocessor(Path(directory), synthetic)
+            preprocessor.incremental = True
+            start = time.perf_counter()
+            preprocessor.process_raw_data()
+            incremental.append(time.perf_counter() - start)
+
+    n_fights = len(synthetic.raw_fight_data())
+    results = {
+        "preprocess.total": summarize(totals, items=n_fights),
+        "preprocess.incremental": summarize(incremental, items=len(synthetic.events[0]["fights"])),
+    }
+    for step, timings in step_timings.items():
+        results[f"preprocess.step.{step}"] = summarize(timings)
+    return results
+
+
+_MEMORY_SCRIPT = """
+import sys, tracemalloc
+from pathlib import Path
+from src.benchmarks.suites import _preprocessor
+
+preprocessor = _preprocessor(Path(sys.argv[1]))
+tracemalloc.start()
+preprocessor.process_raw_data()
+print(tracemalloc.get_traced_memory()[1])
+"""
+
+
+# The peak memory of preprocessing allowed, as a multiple of the size of the
+# raw files: about 29x at the time it was set
+MAX_MEMORY_RATIO = 32.0
+
+
+def memory(repeat: int = 3, max_ratio: float = MAX_MEMORY_RATIO) -> Dict[str, Dict]:
+    """
+    Peak memory allocated by ``Preprocessor.process_raw_data`` in a fresh
+    process, as a multiple of the size of the raw files. The result has
+    ``exceeded`` set when the median is above ``max_ratio``. numpy and pandas
+    allocate their buffers through Python, so they are counted. The peak RSS
+    would mostly measure the interpreter and the imports. The fighter level
+    features are cached by a first run.
+    """
+    synthetic = SyntheticUFC(n_fighters=400, n_events=200)
+    ratios = []
+    with tempfile.TemporaryDirectory() as directory:
+        preprocessor = _preprocessor(Path(directory), synthetic)
+        preprocessor.process_raw_data()
+        input_bytes = (
+            preprocessor.TOTAL_EVENT_AND_FIGHTS_PATH.stat().st_size
+            + preprocessor.FIGHTER_DETAILS_PATH.stat().st_size
+        )
+
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", _MEMORY_SCRIPT, directory],
+                cwd=directory,
+                env=dict(os.environ, PYTHONPATH=str(REPO_ROOT)),
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            ratios.append(int(output.strip().splitlines()[-1]) / input_bytes)
+
+    result = dict(summarize(ratios), unit="x", input_bytes=input_bytes, max_ratio=max_ratio)
+    result["exceeded"] = result["median"] > max_ratio
+    return {"memory.preprocess.peak": result}
+
+
+def _fighter_processor_input(synthetic: SyntheticUFC):
+    """The fights and fighter details as ``FighterDetailProcessor`` expects them."""
+    with tempfile.TemporaryDirectory() as directory:
+        preprocessor = _preprocessor(Path(directory), synthetic)
+        preprocessor._read_files()
+        preprocessor._drop_future_fighter_details_columns()
+        preprocessor._replacing_winner_nans_draw()
+        preprocessor._get_total_time_fought()
+    return preprocessor.fights, preprocessor.fighter_details
+
+
+def fighter_features(scales=(1, 10, 100), repeat: int = 3) -> Dict[str, Dict]:
+    """
+    ``FighterDetailProcessor`` with the same fighters and ``scale`` times
+    longer fight histories (about 5 fights per fighter at ``1x``), and with
+    many fighters on one and on every core.
+    """
+    results = {}
+    for scale in scales:
+        synthetic = SyntheticUFC(n_fighters=20, n_events=4 * scale, fights_per_event=5)
+        fights, fighter_details = _fighter_processor_input(synthetic)
+        results[f"fighter_features.{scale}x"] = measure(
+            lambda: FighterDetailProcessor(fights.copy(), fighter_details.copy()),
+            repeat=max(1, repeat // scale),
+            warmup=0 if scale > 1 else 1,
+            items=len(fights),
+        )
+
+    fights, fighter_details = _fighter_processor_input(SyntheticUFC(n_fighters=400, n_events=200))
+    for name, workers in (("serial", 1), ("sharded", os.cpu_count())):
+        results[f"fighter_features.{name}"] = dict(
+            measure(
+                lambda: FighterDetailProcessor(fights.copy(), fighter_details.copy(), workers=workers),
+                repeat=1,
+                warmup=0,
+                items=len(fights),
+            ),
+            workers=workers,
+        )
+    return results
+
+
+def _prediction_fixture(n_fighters: int = 2000, n_stats: int = 60, seed: int = 0):
+    """A model, scaler, columns and fighter stats in the shape of ``app_data``."""
+    rng = np.random.RandomState(seed)
+    names = [f"Fighter {i}" for i in range(n_fighters)]
+    fighter_df = pd.DataFrame(
+        rng.normal(size=(n_fighters, n_stats)),
+        index=names,
+        columns=[f"avg_stat_{i}" for i in range(n_stats)],
+    )
+    fighter_df["DOB"] = pd.Series(
+        pd.date_range("1975-01-01", periods=n_fighters, freq="5D").strftime("%b %d, %Y"),
+        index=names,
+    )
+    fighter_columns = list(with_age(fighter_df).columns)
+    cols = (
+        [f"R_{column}" for column in fighter_columns]
+        + [f"B_{column}" for column in fighter_columns]
+        + list(df_weight_classes.values())
+        + ["title_bout", "no_of_rounds"]
+    )
+
+    bouts = _random_bouts(names, 1000, seed)
+    X = build_features(with_age(fighter_df), bouts, cols)
+    scaler = StandardScaler().fit(X.select_dtypes(include=[float, int]))
+    y = rng.randint(0, 2, size=len(X))
+    model = XGBClassifier(n_estimators=100, max_depth=3, n_jobs=1, random_state=seed)
+    model.fit(np.array(normalize(X, scaler)), y)
+    return model, scaler, cols, fighter_df, names
+
+
+def _random_bouts(names: List[str], n: int, seed: int = 0):
+    rng = random.Random(seed)
+    weight_classes = list(df_weight_classes)
+    bouts = []
+    for _ in range(n):
+        red, blue = rng.sample(names, 2)
+        rounds = rng.choice([3, 5])
+        bouts.append(
+            (red, blue, rng.choice(weight_classes), rounds, "Title" if rounds == 5 else "Non Title")
+        )
+    return bouts
+
+
+def predict(repeat: int = 20) -> Dict[str, Dict]:
+    """Latency of the app's prediction for one bout and for a batch of bouts."""
+    model, scaler, cols, fighter_df, names = _prediction_fixture()
+    aged_fighter_df = with_age(fighter_df)
+
+    single = _random_bouts(names, 1, seed=1)
+    batch = _random_bouts(names, 100, seed=2)
+    return {
+        # What a click on "predict" costs, ages are computed on every click
+        "predict.single_click": measure(
+            lambda: predict_proba(model, scaler, cols, with_age(fighter_df), single),
+            repeat=repeat,
+        ),
+        "predict.single": measure(
+            lambda: predict_proba(model, scaler, cols, aged_fighter_df, single), repeat=repeat
+        ),
+        "predict.batch_100": measure(
+            lambda: predict_proba(model, scaler, cols, aged_fighter_df, batch),
+            repeat=repeat,
+            items=len(batch),
+        ),
+        **comparables(repeat=repeat),
+    }
+
+
+def comparables(n_fighters: int = 4000, repeat: int = 20) -> Dict[str, Dict]:
+    """Building the comparable fighters index, updating it and a query of the app's panel."""
+    rng = np.random.RandomState(0)
+    names = [f"Fighter {i}" for i in range(n_fighters)]
+    fighter_df = pd.DataFrame(
+        rng.gamma(2.0, 10.0, size=(n_fighters, len(SOURCE_COLUMNS))), index=names, columns=SOURCE_COLUMNS
+    )
+    # The fighters of a new event changed
+    updated_df = fighter_df.copy()
+    updated_df.iloc[:20] += 1
+    index = ComparableFighters(fighter_df)
+
+    def update():
+        index.update(updated_df)
+        index.update(fighter_df)
+
+    queries = iter(names)
+    return {
+        "comparables.build": measure(lambda: ComparableFighters(fighter_df), repeat=repeat),
+        "comparables.update": measure(update, repeat=repeat, items=2),
+        "comparables.query": measure(lambda: index.similar(next(queries), 10), repeat=repeat),
+    }
+
+
+_SCRAPE_SCRIPT = """
+import time
+from src.createdata.scrape_fight_data import FightDataScraper
+from src.createdata.scrape_fighter_details import FighterDetailsScraper
+start = time.perf_counter()
+FightDataScraper().create_fight_data_csv()
+FighterDetailsScraper().create_fighter_data_csv()
+print(time.perf_counter() - start)
+"""
+
+
+def scrape(repeat: int = 3, replay_latency: float = 0.0) -> Dict[str, Dict]:
+    """
+    Both scrapers end-to-end against a replayed synthetic site. Each run
+    starts from an empty data folder in a fresh process.
+    """
+    synthetic = SyntheticUFC(n_fighters=200, n_events=20)
+    timings = []
+    with tempfile.TemporaryDirectory() as archive_path:
+        archive = PageArchive(archive_path)
+        pages = synthetic.pages()
+        for url, text in pages.items():
+            archive.save(url, text)
+
+        env = dict(
+            os.environ,
+            PYTHONPATH=str(REPO_ROOT),
+            UFC_SCRAPE_MODE="replay",
+            UFC_PAGE_ARCHIVE=archive_path,
+            UFC_REPLAY_LATENCY=str(replay_latency),
+        )
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as cwd:
+                (Path(cwd) / "data").mkdir()
+                output = subprocess.run(
+                    [sys.executable, "-c", _SCRAPE_SCRIPT],
+                    cwd=cwd,
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                timings.append(float(output.strip().splitlines()[-1]))
+
+    return {f"scrape.replay_{replay_latency:g}s": summarize(timings, items=len(pages))}
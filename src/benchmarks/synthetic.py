@@ -0,0 +1,430 @@
+import datetime
+import hashlib
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.createdata import fight_records
+from src.createdata.fighter_ids import REGISTRY
+
+BASE_URL = "http://ufcstats.com"
+
+FIRST_NAMES = ["Tom", "Jon", "Ana", "Max", "Leo", "Ivy", "Sam", "Kai", "Zoe", "Eli"]
+LAST_NAMES = ["Aaron", "Baker", "Cruz", "Diaz", "Evans", "Frost", "Green", "Hill", "Ito", "Jones"]
+
+# Every method must occur, ``FighterDetailProcessor`` expects all their dummies
+WIN_METHODS = [
+    "Decision - Majority",
+    "Decision - Split",
+    "Decision - Unanimous",
+    "KO/TKO",
+    "Submission",
+    "TKO - Doctor's Stoppage",
+]
+FIGHT_TYPES = [
+    "Lightweight Bout",
+    "UFC Welterweight Title Bout",
+    "Women's Strawweight Bout",
+    "Heavyweight Bout",
+    "Bantamweight Bout",
+    "Catch Weight Bout",
+]
+FORMATS = ["3 Rnd (5-5-5)", "5 Rnd (5-5-5-5-5)"]
+
+# The columns of the text of the fight pages, ``raw_fight_data`` types them
+FIGHT_DATA_HEADER = (
+    "R_fighter;B_fighter;R_KD;B_KD;R_SIG_STR.;B_SIG_STR.;R_SIG_STR_pct;B_SIG_STR_pct;"
+    "R_TOTAL_STR.;B_TOTAL_STR.;R_TD;B_TD;R_TD_pct;B_TD_pct;R_SUB_ATT;B_SUB_ATT;R_REV;B_REV;"
+    "R_CTRL;B_CTRL;R_HEAD;B_HEAD;R_BODY;B_BODY;R_LEG;B_LEG;R_DISTANCE;B_DISTANCE;R_CLINCH;"
+    "B_CLINCH;R_GROUND;B_GROUND;win_by;last_round;last_round_time;Format;Referee;date;"
+    "location;Fight_type;Winner"
+).split(";")
+
+
+class SyntheticUFC:
+    """
+    A made-up, reproducible history of fights in the shape of ufcstats.com.
+
+    The same history can be rendered as the raw csv files the scrapers write
+    (``raw_fight_data``/``raw_fighter_details``) or as the HTML pages they
+    scrape (``pages``), so every stage can be benchmarked without the site.
+    """
+
+    def __init__(
+        self,
+        n_fighters: int = 200,
+        n_events: int = 100,
+        fights_per_event: int = 10,
+        seed: int = 0,
+    ):
+        rng = random.Random(seed)
+        self.fighters = {}
+        while len(self.fighters) < n_fighters:
+            first = rng.choice(FIRST_NAMES)
+            last = f"{rng.choice(LAST_NAMES)}{rng.randint(1, 10 * n_fighters)}"
+            name = f"{first} {last}"
+            self.fighters[name] = {
+                "first": first,
+                "last": last,
+                "url": f"{BASE_URL}/fighter-details/{_url_hash(name)}",
+                "details": [
+                    f"{rng.randint(5, 6)}' {rng.randint(0, 11)}\"",
+                    f"{rng.randint(115, 265)} lbs.",
+                    rng.choice([f"{rng.randint(60, 84)}.0\"", "--"]),
+                    rng.choice(["Orthodox", "Southpaw", "Switch", ""]),
+                    rng.choice(
+                        [f"Jul {rng.randint(10, 28)}, {rng.randint(1970, 1998)}", "--"]
+                    ),
+                    f"{rng.uniform(1, 7):.2f}",
+                    f"{rng.randint(20, 70)}%",
+                    f"{rng.uniform(1, 7):.2f}",
+                    f"{rng.randint(20, 70)}%",
+                    f"{rng.uniform(0, 5):.2f}",
+                    f"{rng.randint(0, 100)}%",
+                    f"{rng.randint(0, 100)}%",
+                    f"{rng.uniform(0, 2):.1f}",
+                ],
+            }
+
+        names = list(self.fighters)
+        self.events = []
+        date = datetime.date(2000, 1, 1)
+        n_fight = 0
+        for event in range(n_events):
+            date += datetime.timedelta(days=7)
+            url = f"{BASE_URL}/event-details/{_url_hash(f'event {event}')}"
+            fights = []
+            for _ in range(fights_per_event):
+                red, blue = rng.sample(names, 2)
+                fights.append(
+                    {
+                        "url": f"{BASE_URL}/fight-details/{_url_hash(f'fight {n_fight}')}",
+                        "fighters": (red, blue),
+                        "stats": _random_fight_stats(rng),
+                        "win_by": WIN_METHODS[n_fight % len(WIN_METHODS)]
+                        if n_fight < len(WIN_METHODS)
+                        else rng.choice(WIN_METHODS),
+                        "last_round": rng.randint(1, 3),
+                        "last_round_time": f"{rng.randint(0, 4)}:{rng.randint(10, 59)}",
+                        "format": rng.choice(FORMATS),
+                        "referee": f"Referee {rng.randint(1, 20)}",
+                        "fight_type": rng.choice(FIGHT_TYPES),
+                        "winner": rng.choice([red, red, blue, ""]),
+                    }
+                )
+                n_fight += 1
+            self.events.append(
+                {
+                    "url": url,
+                    "name": f"UFC {event}",
+                    "date": date.strftime("%B %d, %Y"),
+                    "location": f"City {event % 20}, Nevada, USA",
+                    "fights": fights,
+                }
+            )
+        # Newest first, like the site and the scraped files
+        self.events.reverse()
+
+    def raw_fight_data(self) -> pd.DataFrame:
+        """The content of ``raw_total_fight_data.csv``, the records of the fight pages."""
+        rows = []
+        for event in self.events:
+            for fight in event["fights"]:
+                rows.append(
+                    list(fight["fighters"])
+                    + [value for pair in fight["stats"] for value in pair]
+                    + [
+                        fight["win_by"],
+                        fight["last_round"],
+                        fight["last_round_time"],
+                        fight["format"],
+                        fight["referee"],
+                        event["date"],
+                        event["location"],
+                        fight["fight_type"],
+                        fight["winner"] or np.nan,
+                    ]
+                )
+        fights = fight_records.from_legacy(pd.DataFrame(rows, columns=FIGHT_DATA_HEADER))
+        # The IDs of the profile links, like the scraper
+        for corner, index in (("R", 0), ("B", 1)):
+            fights[f"{corner}_fighter_id"] = REGISTRY.ids(
+                self.fighters[fight["fighters"][index]]["url"]
+                for event in self.events
+                for fight in event["fights"]
+            )
+        return fights
+
+    def raw_fighter_details(self) -> pd.DataFrame:
+        """The content of ``raw_fighter_details.csv``."""
+        df = pd.DataFrame(
+            {name: fighter["details"] for name, fighter in self.fighters.items()}
+        ).T.replace(["--", ""], np.nan)
+        df.columns = [
+            "Height",
+            "Weight",
+            "Reach",
+            "Stance",
+            "DOB",
+            "SLpM",
+            "Str_Acc",
+            "SApM",
+            "Str_Def",
+            "TD_Avg",
+            "TD_Acc",
+            "TD_Def",
+            "Sub_Avg",
+        ]
+        df.insert(0, "fighter_name", df.index)
+        df.index = pd.Index(
+            REGISTRY.ids(fighter["url"] for fighter in self.fighters.values()), name="fighter_id"
+        )
+        return df
+
+    def write_raw_data(self, fight_data_path, fighter_details_path) -> None:
+        fight_records.write_fight_data(self.raw_fight_data(), fight_data_path)
+        self.raw_fighter_details().to_csv(fighter_details_path)
+
+    def pages(self) -> Dict[str, str]:
+        """HTML of every page the scrapers fetch, by URL."""
+        pages = {f"{BASE_URL}/statistics/events/completed?page=all": self._events_page()}
+        for event in self.events:
+            pages[event["url"]] = self._event_page(event)
+            for fight in event["fights"]:
+                pages[fight["url"]] = self._fight_page(fight)
+        for char in "abcdefghijklmnopqrstuvwxyz":
+            url = f"{BASE_URL}/statistics/fighters?char={char}&page=all"
+            pages[url] = self._fighters_page(char)
+        for name, fighter in self.fighters.items():
+            pages[fighter["url"]] = self._fighter_page(name, fighter)
+        return pages
+
+    # The whitespace of the pages below mimics ufcstats.com, the parsers
+    # rely on it.
+
+    def _events_page(self) -> str:
+        rows = "".join(
+            f'<tr class="b-statistics__table-row"><td class="b-statistics__table-col">\n'
+            f'<i class="b-statistics__table-content">\n'
+            f'<a href="{event["url"]}" class="b-link b-link_style_black">\n'
+            f'          {event["name"]}\n        </a>\n'
+            f'<span class="b-statistics__date">\n          {event["date"]}\n        </span>\n'
+            f'</i>\n</td>\n<td class="b-statistics__table-col '
+            f'b-statistics__table-col_style_big-top-padding">\n'
+            f'          {event["location"]}\n        </td></tr>\n'
+            for event in self.events
+        )
+        return _html(
+            '<table class="b-statistics__table-events"><tbody>'
+            '<tr class="b-statistics__table-row">'
+            '<td class="b-statistics__table-col_type_clear" colspan="2"></td></tr>\n'
+            f"{rows}</tbody></table>"
+        )
+
+    def _event_page(self, event: Dict) -> str:
+        rows = "".join(
+            '<tr class="b-fight-details__table-row b-fight-details__table-row__hover '
+            f'js-fight-details-click" data-link="{fight["url"]}" '
+            f"onclick=\"doNav('{fight['url']}')\">"
+            + _fighter_links_cell(fight["fighters"], self.fighters)
+            + f'<td class="b-fight-details__table-col l-page_align_left">\n'
+            f'<p class="b-fight-details__table-text">\n          {fight["fight_type"]}\n'
+            f"        </p>\n</td></tr>\n"
+            for fight in event["fights"]
+        )
+        return _html(
+            f'<h2 class="b-content__title">\n<span class="b-content__title-highlight">\n'
+            f'          {event["name"]}\n        </span>\n</h2>\n'
+            '<ul class="b-list__box-list">'
+            + _list_item("Date:", event["date"], "b-list__box-list-item")
+            + _list_item("Location:", event["location"], "b-list__box-list-item")
+            + "</ul>\n"
+            '<table class="b-fight-details__table b-fight-details__table_style_margin-top">'
+            '<tbody class="b-fight-details__table-body">'
+            f"{rows}</tbody></table>"
+        )
+
+    def _fight_page(self, fight: Dict) -> str:
+        red, blue = fight["fighters"]
+        stats = fight["stats"]
+        totals = _stats_row(fight["fighters"], self.fighters, stats[:9])
+        significant = _stats_row(fight["fighters"], self.fighters, [stats[1], stats[2]] + stats[9:])
+
+        status = {red: "L", blue: "L"}
+        if fight["winner"]:
+            status[fight["winner"]] = "W"
+        else:
+            status = {red: "D", blue: "D"}
+        persons = "".join(
+            '<div class="b-fight-details__person">\n'
+            '<i class="b-fight-details__person-status b-fight-details__person-status_style_'
+            f'{"green" if status[name] == "W" else "gray"}">\n        {status[name]}\n      </i>\n'
+            '<div class="b-fight-details__person-text">\n'
+            '<h3 class="b-fight-details__person-name">\n'
+            f'<a class="b-link b-fight-details__person-link" href="{self.fighters[name]["url"]}">'
+            f"{name}</a> \n</h3>\n</div></div>\n"
+            for name in (red, blue)
+        )
+        details = (
+            '<div class="b-fight-details__content">\n<p class="b-fight-details__text">\n'
+            '<i class="b-fight-details__text-item_first">\n'
+            + _label("Method:")
+            + f'<i style="font-style: normal">\n          {fight["win_by"]}\n        </i>\n</i>\n'
+            + _detail_item("Round:", fight["last_round"])
+            + _detail_item("Time:", fight["last_round_time"])
+            + _detail_item("Time format:", fight["format"])
+            + _detail_item("Referee:", f'<span>{fight["referee"]}</span>')
+            + "</p>\n"
+            '<p class="b-fight-details__text">\n'
+            + _label("Details:")
+            + "\n          Synthetic fight\n        </p>\n</div>\n"
+        )
+        body = '<tbody class="b-fight-details__table-body">{}</tbody>'
+        return _html(
+            f'<div class="b-fight-details__persons">{persons}</div>\n'
+            f'<i class="b-fight-details__fight-title">\n        {fight["fight_type"]}\n      </i>\n'
+            + details
+            + f"<table>{body.format(totals)}</table>\n"
+            + f"<table>{body.format('')}</table>\n"
+            + f"<table>{body.format(significant)}</table>\n"
+            + f"<table>{body.format('')}</table>\n"
+        )
+
+    def _fighters_page(self, char: str) -> str:
+        rows = ""
+        for name, fighter in self.fighters.items():
+            if not fighter["last"].lower().startswith(char):
+                continue
+            link = (
+                '<td class="b-statistics__table-col">\n'
+                f'<a href="{fighter["url"]}" class="b-link b-link_style_black">{{}}</a>\n</td>'
+            )
+            height, weight, reach, stance = fighter["details"][:4]
+            cells = [height or "--", weight, reach, stance, "10", "2", "0", ""]
+            rows += (
+                '<tr class="b-statistics__table-row">'
+                + link.format(fighter["first"])
+                + link.format(fighter["last"])
+                + link.format("")
+                + "".join(
+                    f'<td class="b-statistics__table-col">\n          {cell}\n        </td>'
+                    for cell in cells
+                )
+                + "</tr>\n"
+            )
+        return _html(
+            '<table class="b-statistics__table"><tbody>'
+            '<tr class="b-statistics__table-row">'
+            '<td class="b-statistics__table-col_type_clear" colspan="11"></td></tr>\n'
+            f"{rows}</tbody></table>"
+        )
+
+    def _fighter_page(self, name: str, fighter: Dict) -> str:
+        labels = [
+            "Height:",
+            "Weight:",
+            "Reach:",
+            "STANCE:",
+            "DOB:",
+            "SLpM:",
+            "Str. Acc.:",
+            "SApM:",
+            "Str. Def:",
+            "TD Avg.:",
+            "TD Acc.:",
+            "TD Def.:",
+            "Sub. Avg.:",
+        ]
+        items = [
+            _list_item(label, value, "b-list__box-list-item b-list__box-list-item_type_block")
+            for label, value in zip(labels, fighter["details"])
+        ]
+        # The site has an empty item between the striking and grappling stats
+        items.insert(9, _list_item("", "", "b-list__box-list-item b-list__box-list-item_type_block"))
+        return _html(
+            f'<span class="b-content__title-highlight">\n      {name}\n    </span>\n'
+            f'<ul class="b-list__box-list">{"".join(items)}</ul>'
+        )
+
+
+def _url_hash(value: str) -> str:
+    return hashlib.md5(value.encode()).hexdigest()[:16]
+
+
+def _landed_of_attempted(rng: random.Random) -> str:
+    attempted = rng.randint(0, 120)
+    return f"{rng.randint(0, attempted)} of {attempted}"
+
+
+def _random_fight_stats(rng: random.Random) -> List[Tuple[str, str]]:
+    """Red and blue value of every stat column between the fighters and ``win_by``."""
+    pct = lambda: rng.choice(["---", f"{rng.randint(0, 100)}%"])
+    ctrl = lambda: rng.choice(["--", f"{rng.randint(0, 4)}:{rng.randint(10, 59)}"])
+    pairs = [
+        lambda: str(rng.randint(0, 2)),  # KD
+        lambda: _landed_of_attempted(rng),  # SIG_STR.
+        pct,  # SIG_STR_pct
+        lambda: _landed_of_attempted(rng),  # TOTAL_STR.
+        lambda: _landed_of_attempted(rng),  # TD
+        pct,  # TD_pct
+        lambda: str(rng.randint(0, 3)),  # SUB_ATT
+        lambda: str(rng.randint(0, 2)),  # REV
+        ctrl,  # CTRL
+    ] + [lambda: _landed_of_attempted(rng)] * 6  # HEAD, BODY, LEG, DISTANCE, CLINCH, GROUND
+    return [(value(), value()) for value in pairs]
+
+
+def _html(body: str) -> str:
+    return f"<!DOCTYPE html>\n<html>\n<head><title>UFC Stats</title></head>\n<body>\n{body}\n</body>\n</html>"
+
+
+def _list_item(label: str, value: str, css_class: str) -> str:
+    return (
+        f'<li class="{css_class}">\n'
+        '          <i class="b-list__box-item-title b-list__box-item-title_type_width">\n'
+        f"            {label}\n          </i>\n          {value}\n        </li>"
+    )
+
+
+def _label(label: str) -> str:
+    return f'<i class="b-fight-details__label">\n          {label}\n        </i>\n'
+
+
+def _detail_item(label: str, value) -> str:
+    return (
+        '<i class="b-fight-details__text-item">\n'
+        + _label(label)
+        + f"          {value}\n        </i>\n"
+    )
+
+
+def _two_values_cell(red: str, blue: str) -> str:
+    return (
+        '<td class="b-fight-details__table-col">\n'
+        f'<p class="b-fight-details__table-text">\n          {red}\n        </p>\n'
+        f'<p class="b-fight-details__table-text">\n          {blue}\n        </p>\n</td>'
+    )
+
+
+def _fighter_links_cell(names: Tuple[str, str], fighters: Dict) -> str:
+    return (
+        '<td class="b-fight-details__table-col l-page_align_left">\n'
+        + "".join(
+            '<p class="b-fight-details__table-text">\n'
+            f'          <a class="b-link b-link_style_black" href="{fighters[name]["url"]}">'
+            f"{name}</a>\n        </p>\n"
+            for name in names
+        )
+        + "</td>"
+    )
+
+
+def _stats_row(names: Tuple[str, str], fighters: Dict, stats: List[Tuple[str, str]]) -> str:
+    return (
+        '<tr class="b-fight-details__table-row">'
+        + _fighter_links_cell(names, fighters)
+        + "".join(_two_values_cell(red, blue) for red, blue in stats)
+        + "</tr>"
+    )
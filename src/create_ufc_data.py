@@ -1,22 +1,154 @@
+import argparse
 import time
+
+from src.createdata.archive import SCRAPE_MODES
+from src.createdata.metrics import save_metrics, serve_metrics
+from src.createdata.pipeline import Pipeline, Stage
 from src.createdata.preprocess import Preprocessor
+from src.createdata.preprocess_chunked import ChunkedPreprocessor
 from src.createdata.scrape_fight_data import FightDataScraper
 from src.createdata.scrape_fighter_details import FighterDetailsScraper
+from src.createdata.utils import MAX_CONNECTIONS, configure_http
+
+from src.createdata.data_files_path import (  # isort:skip
+    FIGHTER_DETAILS,
+    PREPROCESSED_DATA,
+    TOTAL_EVENT_AND_FIGHTS,
+    UFC_DATA,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.create_ufc_data",
+        description="Scrape ufcstats and preprocess the scraped data.",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="rerun every stage even if its inputs are unchanged"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted scrape, skipping every page it already scraped",
+    )
+    parser.add_argument(
+        "--listing-refresh",
+        action="store_true",
+        help="update the height, weight, reach and stance of every fighter from the fighter "
+        "listing pages, only fetching the profiles of new fighters",
+    )
+    parser.add_argument(
+        "--max-requests-per-second",
+        type=float,
+        default=None,
+        help="global request rate shared by both scrapers (default: unlimited)",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=MAX_CONNECTIONS,
+        help="simultaneous connections shared by both scrapers",
+    )
+    parser.add_argument(
+        "--scrape-mode",
+        choices=SCRAPE_MODES,
+        default=None,
+        help="record every fetched page to data/page_archive or replay them instead of "
+        "fetching ufcstats (default: $UFC_SCRAPE_MODE or live)",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=None,
+        help="seconds each replayed request takes (default: $UFC_REPLAY_LATENCY or 0)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only preprocess the fights added since the last run and the fights of fighters "
+        "whose details changed",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="processes computing the fighter level features (default: every core)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="preprocess the fights this many at a time, oldest first, for histories that don't "
+        "fit in memory (not with --incremental)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="serve the scrapers' Prometheus metrics on this port while the run lasts",
+    )
+    args = parser.parse_args()
+    if args.chunk_size and args.incremental:
+        parser.error("--chunk-size can't be combined with --incremental")
+    return args
+
+
+def main():
+    args = parse_args()
+    configure_http(
+        max_requests_per_second=args.max_requests_per_second,
+        max_connections=args.max_connections,
+        mode=args.scrape_mode,
+        replay_latency=args.replay_latency,
+    )
+    serve_metrics(args.metrics_port)
+
+    fight_data_scraper = FightDataScraper(resume=args.resume)
+    fighter_details_scraper = FighterDetailsScraper(
+        resume=args.resume, listing_refresh=args.listing_refresh
+    )
+    if args.chunk_size:
+        preprocessor = ChunkedPreprocessor(chunk_size=args.chunk_size, workers=args.workers)
+    else:
+        preprocessor = Preprocessor(incremental=args.incremental, workers=args.workers)
+
+    pipeline = Pipeline(
+        [
+            # Scrapes raw ufc fight data from website
+            Stage(
+                "fight data scraping",
+                fight_data_scraper.create_fight_data_csv,
+                outputs=[TOTAL_EVENT_AND_FIGHTS],
+            ),
+            # Scrapes raw ufc fighter data from website
+            Stage(
+                "fighter data scraping",
+                fighter_details_scraper.create_fighter_data_csv,
+                outputs=[FIGHTER_DETAILS],
+            ),
+            # Preprocesses the raw data and saves the csv files in data folder,
+            # the data the scrapers just scraped is handed over in memory
+            Stage(
+                "preprocessing",
+                lambda: preprocessor.process_raw_data(
+                    fights=fight_data_scraper.fight_data,
+                    fighter_details=fighter_details_scraper.fighter_details,
+                ),
+                inputs=[TOTAL_EVENT_AND_FIGHTS, FIGHTER_DETAILS],
+                outputs=[UFC_DATA, PREPROCESSED_DATA],
+                depends_on=["fight data scraping", "fighter data scraping"],
+            ),
+        ]
+    )
+
+    time_start = time.time()
+    try:
+        pipeline.run(force=args.force)
+    finally:
+        # Also the metrics of a failed run, they are the interesting ones
+        save_metrics()
+    print(f'elapsed seconds = {(time.time() - time_start):.2f}')
+
 
-time_start = time.time()
-print("Creating fight data \n")
-fight_data_scraper = FightDataScraper()
-fight_data_scraper.create_fight_data_csv()  # Scrapes raw ufc fight data from website
-print(f'elapsed seconds = {(time.time() - time_start):.2f}')
-
-time_start = time.time()
-print("Creating fighter data \n")
-fighter_details_scraper = FighterDetailsScraper()
-fighter_details_scraper.create_fighter_data_csv()  # Scrapes raw ufc fighter data from website
-print(f'elapsed seconds = {(time.time() - time_start):.2f}')
-
-time_start = time.time()
-print("Starting Preprocessing \n")
-preprocessor = Preprocessor()
-preprocessor.process_raw_data()  # Preprocesses the raw data and saves the csv files in data folder
-print(f'elapsed seconds = {(time.time() - time_start):.3f}')
+if __name__ == "__main__":
+    main()
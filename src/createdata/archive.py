@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+from requests.adapters import BaseAdapter
+
+from src.createdata.data_files_path import PAGE_ARCHIVE  # isort:skip
+from src.createdata.metrics import CACHE_LOOKUPS  # isort:skip
+
+# ``live`` fetches from ufcstats, ``record`` fetches from ufcstats and archives
+# every page, ``replay`` serves every page from the archive.
+SCRAPE_MODES = ("live", "record", "replay")
+
+
+class PageArchive:
+    """
+    Gzipped copies of fetched pages, indexed by URL.
+
+    Every page is stored in its own file named after the hash of its URL and
+    ``index.jsonl`` maps URLs to those files. Recording a URL again replaces
+    the stored page.
+    """
+
+    def __init__(self, path: Path = PAGE_ARCHIVE):
+        self.BASE_PATH = Path(path)
+        self.PAGES_PATH = self.BASE_PATH / "pages"
+        self.INDEX_PATH = self.BASE_PATH / "index.jsonl"
+        self._lock = threading.Lock()
+        self._index = None
+
+    def urls(self) -> List[str]:
+        return list(self._get_index())
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._get_index()
+
+    def save(self, url: str, text: str) -> None:
+        file_name = hashlib.sha1(url.encode()).hexdigest() + ".html.gz"
+        self.PAGES_PATH.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.PAGES_PATH / file_name, "wt", encoding="utf-8") as f:
+            f.write(text)
+
+        index = self._get_index()
+        with self._lock:
+            with open(self.INDEX_PATH, "a") as f:
+                f.write(json.dumps({"url": url, "file": file_name, "fetched_at": time.time()}) + "\n")
+            index[url] = file_name
+
+    def load(self, url: str) -> str:
+        file_name = self._get_index().get(url)
+        if file_name is None:
+            raise KeyError(f"{url} is not in the page archive {self.BASE_PATH}")
+        with gzip.open(self.PAGES_PATH / file_name, "rt", encoding="utf-8") as f:
+            return f.read()
+
+    def _get_index(self) -> Dict[str, str]:
+        with self._lock:
+            if self._index is None:
+                self._index = {}
+                if self.INDEX_PATH.exists():
+                    with open(self.INDEX_PATH, "r") as f:
+                        for line in f:
+                            try:
+                                entry = json.loads(line)
+                            except json.JSONDecodeError:
+                                continue
+                            self._index[entry["url"]] = entry["file"]
+            return self._index
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    ``requests`` transport that answers from a :class:`PageArchive` instead of
+    the network, after ``latency`` seconds. Pages missing from the archive are
+    answered with ``404``.
+
+    Requests still go through the fetch scheduler, so the rate and connection
+    limits behave as they would against ufcstats.
+    """
+
+    def __init__(self, archive: PageArchive, latency: float = 0.0):
+        super().__init__()
+        self.archive = archive
+        self.latency = latency
+
+    def send(self, request, **kwargs) -> requests.Response:
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        try:
+            response._content = self.archive.load(request.url).encode("utf-8")
+            response.status_code = 200
+            CACHE_LOOKUPS.labels("page_archive", "hit").inc()
+        except KeyError:
+            response._content = b""
+            response.status_code = 404
+            CACHE_LOOKUPS.labels("page_archive", "miss").inc()
+        return response
+
+    def close(self) -> None:
+        pass
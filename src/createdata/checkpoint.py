@@ -0,0 +1,96 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+from src.createdata.data_files_path import SCRAPE_CHECKPOINTS  # isort:skip
+
+
+class ScrapeCheckpoint:
+    """
+    Durable progress of a scrape, so a run that dies halfway can be resumed.
+
+    - ``pending``: the links the current run set out to scrape
+    - ``completed``: the result of every scraped URL, appended as soon as it
+      is available
+    - ``failed``: URLs that could not be scraped, retried first by the next run
+
+    ``finish`` is called once the results are safely written to the data
+    files. It clears ``pending`` and ``completed`` but keeps the failed URLs.
+    """
+
+    def __init__(self, name: str, base_path: Path = SCRAPE_CHECKPOINTS):
+        self.BASE_PATH = Path(base_path)
+        self.PENDING_PATH = self.BASE_PATH / f"{name}.pending.json"
+        self.COMPLETED_PATH = self.BASE_PATH / f"{name}.completed.jsonl"
+        self.FAILED_PATH = self.BASE_PATH / f"{name}.failed.json"
+        self._lock = threading.Lock()
+        self._failed = self._read_json(self.FAILED_PATH)
+
+    def pending(self) -> Dict[str, Any]:
+        return self._read_json(self.PENDING_PATH)
+
+    def completed(self) -> Dict[str, Any]:
+        completed = {}
+        if not self.COMPLETED_PATH.exists():
+            return completed
+
+        with open(self.COMPLETED_PATH, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line is cut short if the process was killed mid-write
+                    continue
+                completed[entry["url"]] = entry["result"]
+        return completed
+
+    def failed(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._failed)
+
+    def start(self, links: Dict[str, Any], resume: bool = False) -> Dict[str, Any]:
+        """Records the work of a new run and returns the results already scraped."""
+        self.BASE_PATH.mkdir(parents=True, exist_ok=True)
+        completed = self.completed() if resume else {}
+        if not resume and self.COMPLETED_PATH.exists():
+            self.COMPLETED_PATH.unlink()
+
+        self._write_json(self.PENDING_PATH, links)
+        return completed
+
+    def mark_completed(self, url: str, result: Any) -> None:
+        with self._lock:
+            with open(self.COMPLETED_PATH, "a") as f:
+                f.write(json.dumps({"url": url, "result": result}) + "\n")
+            if url in self._failed:
+                del self._failed[url]
+                self._write_json(self.FAILED_PATH, self._failed)
+
+    def mark_failed(self, url: str, context: Any) -> None:
+        with self._lock:
+            self._failed[url] = context
+            self._write_json(self.FAILED_PATH, self._failed)
+
+    def finish(self) -> None:
+        with self._lock:
+            for path in (self.PENDING_PATH, self.COMPLETED_PATH):
+                if path.exists():
+                    path.unlink()
+            if self._failed:
+                print(f"{len(self._failed)} urls failed, they will be retried on the next run")
+
+    @staticmethod
+    def _read_json(path: Path) -> Dict[str, Any]:
+        if not path.exists():
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _write_json(self, path: Path, data: Dict[str, Any]) -> None:
+        self.BASE_PATH.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves half a file
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        temp_path.replace(path)
@@ -10,4 +10,19 @@ NEW_EVENT_AND_FIGHTS = BASE_PATH / "new_fight_data.csv"
 TOTAL_EVENT_AND_FIGHTS = BASE_PATH / "raw_total_fight_data.csv"
 PREPROCESSED_DATA = BASE_PATH / "preprocessed_data.csv"
 FIGHTER_DETAILS = BASE_PATH / "raw_fighter_details.csv"
+FIGHTER_IDS = BASE_PATH / "fighter_ids.json"
 UFC_DATA = BASE_PATH / "data.csv"
+MODEL_ARTIFACTS = BASE_PATH / "models"
+TRAINING_CACHE = BASE_PATH / "training_cache"
+BACKTEST_CACHE = BASE_PATH / "backtest_cache"
+BACKTEST_RESULTS = BASE_PATH / "backtest"
+PIPELINE_STATE = BASE_PATH / "pipeline_state.json"
+SCRAPE_CHECKPOINTS = BASE_PATH / "checkpoints"
+PAGE_ARCHIVE = BASE_PATH / "page_archive"
+BENCHMARK_RESULTS = BASE_PATH / "benchmarks"
+PREPROCESS_METRICS = BASE_PATH / "preprocess_steps.jsonl"
+PROFILES = BASE_PATH / "profiles"
+SCRAPE_METRICS = BASE_PATH / "scrape_metrics.prom"
+FEATURE_CACHE = BASE_PATH / "feature_cache"
+FEATURE_STORE = BASE_PATH / "feature_store.pkl"
+PREPROCESS_STATE = BASE_PATH / "preprocess_state.pkl"
@@ -0,0 +1,153 @@
+import hashlib
+import inspect
+import pickle
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.createdata import preprocess_fighter_data
+from src.createdata.preprocess_fighter_data import FighterDetailProcessor
+
+from src.createdata.data_files_path import FEATURE_CACHE  # isort:skip
+
+# Cached features are only valid for the code that computed them, any change
+# to ``preprocess_fighter_data`` invalidates them
+CODE_VERSION = hashlib.sha256(inspect.getsource(preprocess_fighter_data).encode()).hexdigest()[:16]
+
+
+def _digest(*hashes: pd.Series) -> str:
+    sha = hashlib.sha256()
+    for values in hashes:
+        sha.update(values.to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+class FighterFeatureCache:
+    """
+    On-disk cache of the fighter level features of ``FighterDetailProcessor``.
+
+    - ``frame.pkl``: the whole feature frame, keyed by a hash of the fights,
+      the fighter details and the code version. It is returned as is when
+      none of them changed.
+    - ``fighter_rows.pkl``: the rows computed for every fighter, keyed by a
+      hash of the fighter's fight history. When new fights are scraped only
+      the fighters who fought in them are computed again.
+
+    Fights are identified by a hash of their content rather than by their
+    position, new fights are added at the top of the raw data.
+    """
+
+    def __init__(self, base_path: Path = FEATURE_CACHE):
+        self.BASE_PATH = Path(base_path)
+        self.FRAME_PATH = self.BASE_PATH / "frame.pkl"
+        self.ROWS_PATH = self.BASE_PATH / "fighter_rows.pkl"
+        self._row_hashes: Optional[pd.Series] = None
+        self._histories: Dict[int, str] = {}
+
+    def fighter_features(
+        self, fights: pd.DataFrame, fighter_details: pd.DataFrame, workers: int = 1
+    ) -> pd.DataFrame:
+        key = "-".join(
+            [
+                CODE_VERSION,
+                _digest(
+                    pd.util.hash_pandas_object(fights, index=False),
+                    pd.util.hash_pandas_object(fighter_details),
+                ),
+            ]
+        )
+        cached = self._read(self.FRAME_PATH)
+        if cached is not None and cached["key"] == key:
+            print("Fights and fighter details are unchanged, using the cached fighter level features")
+            return cached["frame"]
+
+        # ``FighterDetailProcessor`` adds columns to the fighter details it is given
+        frame = FighterDetailProcessor(
+            fights, fighter_details.copy(), cache=self, workers=workers
+        ).frame
+        self._write(self.FRAME_PATH, {"key": key, "frame": frame})
+        return frame
+
+    def lookup(
+        self, fights: pd.DataFrame, fighters: List[int]
+    ) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], List[int]]:
+        """
+        The cached red and blue rows of the fighters whose history is
+        unchanged and the fighters that have to be computed.
+        """
+        self._row_hashes = pd.util.hash_pandas_object(fights, index=False)
+        self._histories = self._history_hashes(fights, self._row_hashes)
+
+        cached = self._read(self.ROWS_PATH)
+        if cached is None or cached["code_version"] != CODE_VERSION:
+            return None, None, fighters
+        if not self._row_hashes.is_unique:
+            print("Some fights are duplicated, computing the features of every fighter")
+            return None, None, fighters
+
+        unchanged = {
+            fighter
+            for fighter in fighters
+            if cached["histories"].get(fighter) == self._histories[fighter]
+        }
+        print(f"Reusing the features of {len(unchanged)} fighters, computing {len(fighters) - len(unchanged)}")
+
+        index_of_fight = pd.Series(self._row_hashes.index, index=self._row_hashes.to_numpy())
+        rows = []
+        for frame in (cached["red"], cached["blue"]):
+            frame = frame[frame["hero_fighter"].isin(unchanged)]
+            frame.index = index_of_fight.loc[frame.index].to_numpy()
+            rows.append(frame)
+        return rows[0], rows[1], [fighter for fighter in fighters if fighter not in unchanged]
+
+    def update(self, red: pd.DataFrame, blue: pd.DataFrame) -> None:
+        """Stores the rows of every fighter, ``lookup`` must have been called before."""
+        if not self._row_hashes.is_unique:
+            return
+        rows = []
+        for frame in (red, blue):
+            frame = frame.copy()
+            frame.index = self._row_hashes.loc[frame.index].to_numpy()
+            rows.append(frame)
+        self._write(
+            self.ROWS_PATH,
+            {
+                "code_version": CODE_VERSION,
+                "histories": self._histories,
+                "red": rows[0],
+                "blue": rows[1],
+            },
+        )
+
+    @staticmethod
+    def _history_hashes(fights: pd.DataFrame, row_hashes: pd.Series) -> Dict[int, str]:
+        """A hash of the fights of every fighter, by ID, in the order of ``fights``."""
+        appearances = pd.DataFrame(
+            {
+                "fighter": pd.concat([fights["R_fighter_id"], fights["B_fighter_id"]]),
+                "row_hash": pd.concat([row_hashes, row_hashes]),
+            }
+        ).sort_index(kind="stable")
+        return {
+            fighter: _digest(history)
+            for fighter, history in appearances.groupby("fighter")["row_hash"]
+        }
+
+    @staticmethod
+    def _read(path: Path):
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError):
+            # A run killed while writing leaves a truncated file
+            return None
+
+    def _write(self, path: Path, obj) -> None:
+        self.BASE_PATH.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(obj, f)
+        tmp_path.replace(path)
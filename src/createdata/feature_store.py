@@ -0,0 +1,304 @@
+import pickle
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.createdata.preprocess_fighter_data import (FighterDetailProcessor,
+                                                    to_cms, to_pounds)
+
+from src.createdata.data_files_path import FEATURE_STORE  # isort:skip
+
+# The date of the snapshot before a fighter's first fight, before every date
+FIRST_DAY = np.iinfo(np.int32).min
+# Snapshots are searched by fighter and date at once, with keys of both
+_DAYS_SPAN = 2 ** 32
+
+DETAIL_COLUMNS = ["Stance", "Height_cms", "Reach_cms", "Weight_lbs"]
+
+
+def _days(dates) -> np.ndarray:
+    """Dates as days since 1970, like ``datetime64[D]``."""
+    return pd.to_datetime(pd.Series(dates).astype(object)).to_numpy("datetime64[D]").astype(np.int64)
+
+
+def feature_name(column: str) -> str:
+    """The name of the column of ``FighterDetailProcessor`` in ``data.csv``, without its corner."""
+    if column.startswith("hero_"):
+        return "avg_" + column[len("hero_") :].replace(".", "")
+    if column.startswith("opp_"):
+        return "avg_opp_" + column[len("opp_") :].replace(".", "")
+    if column.startswith("win_by"):
+        return column.replace(" ", "").replace("-", "_").replace("'s", "_")
+    return column
+
+
+class FighterFeatureStore:
+    """
+    The fighter level features of every fighter as of any date, e.g. to see
+    what the model would have said before a past event.
+
+    A snapshot of the features is taken after every fight of a fighter, the
+    same averages, streaks and counts ``FighterDetailProcessor`` computes
+    over the fights before a fight. Snapshots are stored in arrays sorted by
+    fighter ID and date, with one more snapshot before the first fight. The
+    features of a fighter as of a date are their last snapshot before that
+    date, found by binary search, for many fighters and dates at once.
+
+    The fighter details are their latest ones, the age is computed as of the
+    date. NaNs aren't filled, like in ``data.csv``.
+    """
+
+    COUNT_COLUMNS = (
+        ["total_rounds_fought", "total_title_bouts"]
+        + FighterDetailProcessor.RESULT_STATS
+        + FighterDetailProcessor.WIN_BY_COLUMNS
+    )
+    COLUMNS = [
+        feature_name(column)
+        for column in FighterDetailProcessor.NUMERICAL_COLUMNS + COUNT_COLUMNS
+    ]
+
+    def __init__(
+        self,
+        fighter_ids: np.ndarray,
+        offsets: np.ndarray,
+        dates: np.ndarray,
+        values: np.ndarray,
+        details: pd.DataFrame,
+    ):
+        """
+        The snapshots of the fighter ``fighter_ids[i]`` are the rows
+        ``offsets[i]:offsets[i + 1]`` of ``dates`` (days since 1970) and
+        ``values`` (in the order of ``COLUMNS``).
+        """
+        self.fighter_ids = fighter_ids
+        self.offsets = offsets
+        self.dates = dates
+        self.values = values
+        self.details = details
+        fighters = np.repeat(np.arange(len(fighter_ids), dtype=np.int64), np.diff(offsets))
+        self._keys = fighters * _DAYS_SPAN + (dates - FIRST_DAY)
+
+    @classmethod
+    def build(
+        cls, fights: pd.DataFrame, fighter_details: pd.DataFrame, fighters: Optional[Iterable] = None
+    ) -> "FighterFeatureStore":
+        """
+        The snapshots of every fighter of ``fights``, newest fight first and
+        with ``total_time_fought(seconds)``, or only of ``fighters``, whose
+        every fight ``fights`` must hold.
+        """
+        appearances = cls._appearances(fights)
+        if fighters is not None:
+            appearances = appearances[appearances["hero_fighter_id"].isin(np.asarray(list(fighters)))]
+            appearances = appearances.reset_index(drop=True)
+        fighter = appearances["hero_fighter_id"]
+        by_fighter = lambda series: series.groupby(fighter, sort=False)
+
+        # Averages of every fight up to the snapshot, in the order they were fought
+        averages = (
+            appearances[FighterDetailProcessor.NUMERICAL_COLUMNS]
+            .astype(np.float64)
+            .groupby(fighter, sort=False)
+            .ewm(span=3, adjust=False)
+            .mean()
+            .droplevel(0)
+            .sort_index()
+        )
+
+        # The winner is a name, the fighter won if it's their name in that fight
+        won = appearances["Winner"].astype(object) == appearances["hero_fighter"].astype(object)
+        lost = ~won
+        win_streak = won.groupby([fighter, by_fighter(lost).cumsum()]).cumsum()
+        counts = {
+            "total_rounds_fought": by_fighter(appearances["last_round"].astype(np.int64)).cumsum(),
+            "total_title_bouts": by_fighter(appearances["title_bout"] == True).cumsum(),
+            # ``FighterDetailProcessor._get_result_stats`` goes through the
+            # fights newest first, its current streaks are the streaks the
+            # fighter started their career with. The model learned those.
+            "current_win_streak": by_fighter(by_fighter(won.astype(np.int64)).cumprod()).cumsum(),
+            "current_lose_streak": by_fighter(by_fighter(lost.astype(np.int64)).cumprod()).cumsum(),
+            "longest_win_streak": by_fighter(win_streak).cummax(),
+            "wins": by_fighter(won).cumsum(),
+            "losses": by_fighter(lost).cumsum(),
+            # Draws are losses, like in ``FighterDetailProcessor``
+            "draw": pd.Series(0, index=appearances.index),
+        }
+        win_by = pd.get_dummies(appearances["win_by"], prefix="win_by")
+        for column in FighterDetailProcessor.WIN_BY_COLUMNS:
+            method = win_by[column] if column in win_by.columns else 0
+            counts[column] = by_fighter(won & (method == 1)).cumsum()
+
+        after_fights = np.column_stack(
+            [averages.to_numpy()] + [counts[column].to_numpy() for column in cls.COUNT_COLUMNS]
+        ).astype(np.float32)
+
+        # The snapshot before the first fight of every fighter: no averages, no counts
+        before = np.zeros((1, len(cls.COLUMNS)), dtype=np.float32)
+        before[:, : len(FighterDetailProcessor.NUMERICAL_COLUMNS)] = np.nan
+        fighter_ids, first = np.unique(fighter.to_numpy(), return_index=True)
+        n_fights = np.diff(np.append(first, len(appearances)))
+        is_first = np.zeros(len(appearances) + len(fighter_ids), dtype=bool)
+        is_first[first + np.arange(len(fighter_ids))] = True
+
+        values = np.empty((len(is_first), len(cls.COLUMNS)), dtype=np.float32)
+        values[is_first] = before
+        values[~is_first] = after_fights
+        dates = np.empty(len(is_first), dtype=np.int64)
+        dates[is_first] = FIRST_DAY
+        dates[~is_first] = cls._fight_days(appearances["date"], fighter)
+        offsets = np.append(0, np.cumsum(n_fights + 1))
+
+        # The name of a fighter in their newest fight
+        names = appearances.groupby(fighter)["hero_fighter"].last().astype(str)
+        return cls(
+            fighter_ids.astype(np.int32),
+            offsets,
+            dates,
+            values,
+            cls._details(fighter_details, names),
+        )
+
+    @staticmethod
+    def _appearances(fights: pd.DataFrame) -> pd.DataFrame:
+        """
+        Every fight of every fighter as ``hero`` against ``opp``, grouped by
+        fighter, oldest first, with the ``corner`` of the fighter.
+        """
+        corners = []
+        for hero, opp in (("R", "B"), ("B", "R")):
+            columns = {}
+            for column in fights.columns:
+                if column.startswith(f"{hero}_"):
+                    columns[column] = "hero_" + column[2:]
+                elif column.startswith(f"{opp}_"):
+                    columns[column] = "opp_" + column[2:]
+            corners.append(fights.rename(columns=columns).assign(corner=hero))
+        # Fights are newest first
+        return (
+            pd.concat(corners)
+            .rename_axis("fight")
+            .reset_index()
+            .sort_values(["hero_fighter_id", "fight"], ascending=[True, False], kind="mergesort")
+            .reset_index(drop=True)
+        )
+
+    @staticmethod
+    def _fight_days(dates: pd.Series, fighter: pd.Series) -> np.ndarray:
+        """Days of the fights, a missing date is the date of the fight before."""
+        days = pd.Series(_days(dates), index=dates.index).where(dates.notna())
+        days = days.groupby(fighter, sort=False).ffill().groupby(fighter, sort=False).bfill()
+        return days.fillna(FIRST_DAY + 1).to_numpy(np.int64)
+
+    @staticmethod
+    def _details(fighter_details: pd.DataFrame, names: pd.Series) -> pd.DataFrame:
+        details = fighter_details.reindex(names.index).astype(object)
+        return pd.DataFrame(
+            {
+                "fighter_name": names,
+                "Stance": details["Stance"],
+                "Height_cms": details["Height"].apply(to_cms).astype(np.float32),
+                "Reach_cms": details["Reach"].apply(to_cms).astype(np.float32),
+                "Weight_lbs": details["Weight"].apply(to_pounds).astype(np.float32),
+                "DOB": pd.to_datetime(details["DOB"], errors="coerce"),
+            },
+            index=names.index.rename("fighter_id"),
+        )
+
+    def update(self, other: "FighterFeatureStore") -> "FighterFeatureStore":
+        """This store with the snapshots and details of the fighters of ``other`` replaced."""
+        kept = ~np.isin(self.fighter_ids, other.fighter_ids)
+        n_snapshots = np.diff(self.offsets)
+        kept_rows = np.repeat(kept, n_snapshots)
+
+        fighter_ids = np.concatenate([self.fighter_ids[kept], other.fighter_ids])
+        counts = np.concatenate([n_snapshots[kept], np.diff(other.offsets)])
+
+        # Sorted by fighter again, the snapshots of a fighter keep their order
+        order = np.argsort(fighter_ids, kind="mergesort")
+        rows = np.argsort(np.repeat(fighter_ids, counts), kind="mergesort")
+        details = pd.concat([self.details[~self.details.index.isin(other.fighter_ids)], other.details])
+        return FighterFeatureStore(
+            fighter_ids[order],
+            np.append(0, np.cumsum(counts[order])),
+            np.concatenate([self.dates[kept_rows], other.dates])[rows],
+            np.concatenate([self.values[kept_rows], other.values])[rows],
+            details.sort_index(),
+        )
+
+    def as_of(self, fighter_ids, dates) -> pd.DataFrame:
+        """
+        The features of every fighter of ``fighter_ids`` before the date of
+        ``dates`` at the same position, i.e. without the fights on that day.
+        Unknown fighters are NaN, the store must hold one fighter at least.
+        """
+        fighter_ids = np.asarray(fighter_ids, dtype=np.int32)
+        days = np.broadcast_to(_days(np.atleast_1d(dates)), fighter_ids.shape)
+
+        fighters = np.minimum(
+            np.searchsorted(self.fighter_ids, fighter_ids), len(self.fighter_ids) - 1
+        )
+        known = self.fighter_ids[fighters] == fighter_ids
+        snapshots = (
+            np.searchsorted(self._keys, fighters * _DAYS_SPAN + (days - FIRST_DAY), side="left") - 1
+        )
+
+        values = self.values[snapshots]
+        values[~known] = np.nan
+        features = pd.DataFrame(values, columns=self.COLUMNS, index=pd.Index(fighter_ids, name="fighter_id"))
+        details = self.details.reindex(fighter_ids)
+        # Ages like ``Preprocessor._create_fighter_age``
+        dob = details["DOB"].to_numpy("datetime64[D]")
+        age_days = np.where(np.isnat(dob), np.nan, days - dob.astype(np.int64))
+        age = np.floor(np.where(age_days >= 0, age_days, np.nan) / 365.25)
+        return pd.concat(
+            [details["fighter_name"], features, details[DETAIL_COLUMNS]], axis=1
+        ).assign(age=age.astype(np.float32))
+
+    def features(self, fighter_id: int, as_of) -> pd.Series:
+        """The features of one fighter before ``as_of``, see ``as_of``."""
+        return self.as_of([fighter_id], [as_of]).iloc[0]
+
+    def latest(self) -> pd.DataFrame:
+        """The features of every fighter after all their fights, with their age today."""
+        return self.as_of(self.fighter_ids, pd.Timestamp.today().normalize() + pd.Timedelta(days=1))
+
+    def app_stats(self, ratings: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        ``latest_fighter_stats.csv`` of the app: the latest features of every
+        fighter by name, the one who fought last of namesakes, with the
+        stances one-hot like in ``preprocessed_data.csv`` and their DOB.
+        ``ratings`` are columns by fighter ID to add, e.g. their ratings.
+        """
+        latest = self.latest().drop(columns="age")
+        last_fight = self.dates[self.offsets[1:] - 1]
+        latest = latest.iloc[np.argsort(-last_fight, kind="mergesort")]
+        latest = latest.drop_duplicates("fighter_name").sort_index()
+        stances = pd.get_dummies(latest["Stance"].fillna("Orthodox"), prefix="Stance", dtype=np.uint8)
+        return (
+            pd.concat(
+                [
+                    latest.drop(columns="Stance"),
+                    stances,
+                    ratings.reindex(latest.index) if ratings is not None else None,
+                    self.details["DOB"].reindex(latest.index),
+                ],
+                axis=1,
+            )
+            .set_index("fighter_name")
+            .rename_axis("index")
+        )
+
+    def save(self, path: Path = FEATURE_STORE) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: Path = FEATURE_STORE) -> Optional["FighterFeatureStore"]:
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,244 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.createdata.metrics import (  # isort:skip
+    CONCURRENCY_LIMIT,
+    DOWNLOADED_BYTES,
+    FETCH_RETRIES,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+)
+
+# ``ufcstats.com`` answers with ``403`` when it is being hit too hard, so it is
+# treated like ``429``: a signal to slow down and try again later.
+RETRYABLE_STATUS_CODES = {403, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Circuit for {host} is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to ``capacity`` requests and ``rate`` requests per
+    second on average. ``rate=None`` disables the limit.
+    """
+
+    def __init__(self, rate: Optional[float] = None, capacity: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.configure(rate, capacity)
+
+    def configure(self, rate: Optional[float], capacity: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate = rate
+            self.capacity = capacity or max(1.0, rate or 1.0)
+            self._tokens = self.capacity
+            self._updated_at = time.monotonic()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on the number of requests in flight: every success raises the
+    limit by ``1 / limit`` (about one per round of requests), a throttling or
+    server error halves it. Decreases are applied at most once per
+    ``cooldown`` seconds so a burst of failures from the same round of
+    requests only counts once.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, cooldown: float = 2.0):
+        self._condition = threading.Condition()
+        self.min_limit = min_limit
+        self.cooldown = cooldown
+        self.configure(max_limit)
+
+    def configure(self, max_limit: int) -> None:
+        with self._condition:
+            self.max_limit = max_limit
+            self.limit = float(max_limit)
+            self._in_flight = 0
+            self._decreased_at = 0.0
+            CONCURRENCY_LIMIT.set(self.limit)
+            self._condition.notify_all()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= max(self.min_limit, int(self.limit)):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, success: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if success:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif time.monotonic() - self._decreased_at > self.cooldown:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._decreased_at = time.monotonic()
+            CONCURRENCY_LIMIT.set(self.limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after ``failure_threshold`` consecutive
+    failures. After ``reset_timeout`` seconds a single probe request is let
+    through; its success closes the circuit again, its failure reopens it.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = 10, reset_timeout: float = 30.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    def before_request(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.host, remaining)
+            if self._probing:
+                raise CircuitOpenError(self.host, 1.0)
+            self._probing = True
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"\nToo many failed requests to {self.host}, pausing for {self.reset_timeout}s")
+                self._opened_at = time.monotonic()
+
+
+class FetchScheduler:
+    """
+    Fetches pages under a global token bucket rate limit and an adaptive
+    concurrency limit, retrying transient failures with exponential backoff
+    and full jitter and failing fast while a host's circuit is open.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        max_requests_per_second: Optional[float] = None,
+        max_connections: int = 16,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 10.0,
+    ):
+        self.session = session
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.token_bucket = TokenBucket()
+        self.concurrency = AdaptiveConcurrencyLimit(max_connections)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self.configure(max_requests_per_second, max_connections)
+
+    def configure(
+        self, max_requests_per_second: Optional[float] = None, max_connections: int = 16
+    ) -> None:
+        self.token_bucket.configure(max_requests_per_second)
+        self.concurrency.configure(max_connections)
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=max_connections))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max_connections))
+
+    def fetch(self, url: str) -> str:
+        breaker = self._breaker(urlparse(url).netloc)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._attempt(url, breaker)
+            except CircuitOpenError as e:
+                error, retry_after = e, e.retry_after
+            except requests.HTTPError as e:
+                if e.response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise
+                error, retry_after = e, self._retry_after(e.response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error, retry_after = e, None
+
+            if attempt == self.max_retries:
+                break
+            FETCH_RETRIES.inc()
+            time.sleep(retry_after if retry_after is not None else self._backoff(attempt))
+
+        raise error
+
+    def _attempt(self, url: str, breaker: CircuitBreaker) -> str:
+        breaker.before_request()
+        self.token_bucket.acquire()
+        self.concurrency.acquire()
+        success = False
+        status = "error"
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, allow_redirects=True, timeout=self.timeout)
+            status = str(response.status_code)
+            DOWNLOADED_BYTES.inc(len(response.content))
+            # ``raise_for_status`` will throw an ``HTTPError`` for 4xx/5xx
+            # responses, so we never hand a "Forbidden" placeholder page to the
+            # parsers.
+            response.raise_for_status()
+            success = True
+            return response.text
+        except requests.HTTPError as e:
+            # A missing page is not a sign of an overloaded host
+            success = e.response.status_code not in RETRYABLE_STATUS_CODES
+            raise
+        finally:
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(status).inc()
+            self.concurrency.release(success)
+            breaker.record(success)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        try:
+            return min(self.backoff_max, float(response.headers["Retry-After"]))
+        except (KeyError, ValueError):
+            return None
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        with self._breakers_lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(host)
+            return self._breakers[host]
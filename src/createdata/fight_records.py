@@ -0,0 +1,199 @@
+import datetime
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.createdata.fighter_ids import REGISTRY
+
+# The typed content of ``raw_total_fight_data.csv``, in the order of the
+# columns of ``data.csv``. Strings repeated across fights are categoricals,
+# counts and durations the smallest integer type that holds them. Values the
+# pages don't show ("--", "---") are 0, as preprocessing always took them.
+# Fighters are keyed by their ID, see ``fighter_ids``, names are only shown.
+STATS = ["SIG_STR.", "TOTAL_STR.", "TD", "HEAD", "BODY", "LEG", "DISTANCE", "CLINCH", "GROUND"]
+FIGHT_SCHEMA: Dict[str, str] = {
+    "R_fighter": "category",
+    "B_fighter": "category",
+    "R_fighter_id": "int32",
+    "B_fighter_id": "int32",
+    "R_KD": "int8",
+    "B_KD": "int8",
+    "R_SIG_STR_pct": "float32",
+    "B_SIG_STR_pct": "float32",
+    "R_TD_pct": "float32",
+    "B_TD_pct": "float32",
+    "R_SUB_ATT": "int8",
+    "B_SUB_ATT": "int8",
+    "R_REV": "int8",
+    "B_REV": "int8",
+    "win_by": "category",
+    "last_round": "int8",
+    "last_round_time": "int16",  # seconds
+    "Format": "object",
+    "Referee": "category",
+    "date": "category",  # ISO 8601
+    "location": "category",
+    "Winner": "category",  # the name of the winner, empty for draws and no contests
+    **{
+        f"{corner}_{stat}{suffix}": "int16"
+        for stat in STATS
+        for corner in "RB"
+        for suffix in ("_att", "_landed")
+    },
+    "title_bout": "bool",
+    "weight_class": "category",
+    "R_CTRL_time(seconds)": "int16",
+    "B_CTRL_time(seconds)": "int16",
+}
+FIGHT_COLUMNS = list(FIGHT_SCHEMA)
+
+WEIGHT_CLASSES = {
+    "Women's Strawweight": "WomenStrawweight",
+    "Women's Bantamweight": "WomenBantamweight",
+    "Women's Featherweight": "WomenFeatherweight",
+    "Women's Flyweight": "WomenFlyweight",
+    "Lightweight": "Lightweight",
+    "Welterweight": "Welterweight",
+    "Middleweight": "Middleweight",
+    "Light Heavyweight": "LightHeavyweight",
+    "Heavyweight": "Heavyweight",
+    "Featherweight": "Featherweight",
+    "Bantamweight": "Bantamweight",
+    "Flyweight": "Flyweight",
+    "Open Weight": "OpenWeight",
+}
+
+_LANDED_OF_ATTEMPTED = re.compile(r"^\s*(\d+)\s*of\s*(\d+)\s*$")
+_MINUTES_AND_SECONDS = re.compile(r"^\s*(\d+):(\d+)\s*$")
+
+
+def count(text: str) -> int:
+    text = text.strip()
+    return int(text) if text.isdigit() else 0
+
+
+def landed_of_attempted(text: str) -> Tuple[int, int]:
+    """``"12 of 30"`` as ``(12, 30)``."""
+    match = _LANDED_OF_ATTEMPTED.match(text)
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+
+def fraction(text: str) -> float:
+    """``"45%"`` as ``0.45``."""
+    try:
+        return float(text.strip().rstrip("%")) / 100
+    except ValueError:
+        return 0.0
+
+
+def seconds(text: str) -> int:
+    """``"3:21"`` as ``201``."""
+    match = _MINUTES_AND_SECONDS.match(text)
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else 0
+
+
+def iso_date(text: str) -> str:
+    """``"March 14, 2020"`` as ``"2020-03-14"``, empty if it isn't a date."""
+    try:
+        return datetime.datetime.strptime(text.strip(), "%B %d, %Y").date().isoformat()
+    except ValueError:
+        return ""
+
+
+def is_title_bout(fight_title: str) -> bool:
+    return "Title Bout" in fight_title
+
+
+def weight_class(fight_title: str) -> str:
+    """The weight class of a fight title like ``"UFC Lightweight Title Bout"``."""
+    for name, weight_class in WEIGHT_CLASSES.items():
+        if name in fight_title:
+            return weight_class
+    if fight_title in ("Catch Weight Bout", "Catchweight Bout"):
+        return "CatchWeight"
+    return "OpenWeight"
+
+
+def to_row(record: Dict[str, Any]) -> List[Any]:
+    """The values of a record in the order of ``FIGHT_COLUMNS``."""
+    return [record[column] for column in FIGHT_COLUMNS]
+
+
+def to_frame(rows: List[List[Any]]) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=FIGHT_COLUMNS).replace({"": np.nan})
+    # Names are ASCII in every file, they are the keys of the fighter details
+    for column in frame.select_dtypes(include=object).columns:
+        frame[column] = frame[column].str.encode("ascii", errors="ignore").str.decode("ascii")
+    return frame.astype(FIGHT_SCHEMA)
+
+
+def write_fight_data(frame: pd.DataFrame, filepath: Path) -> None:
+    with open(filepath, "wb") as f:
+        f.write(frame.to_csv(sep=";", index=False).encode("ascii", errors="ignore"))
+
+
+def read_fight_data(filepath: Path) -> pd.DataFrame:
+    """
+    Reads a fight data file with the types of ``FIGHT_SCHEMA``, files of text
+    are converted and fighters of files without their IDs get them by name.
+    """
+    return parse_fight_data(filepath, pd.read_csv(filepath, sep=";", nrows=0).columns)
+
+
+def parse_fight_data(source, columns) -> pd.DataFrame:
+    """``read_fight_data`` of a file or a buffer whose header is ``columns``."""
+    if "Fight_type" in columns:
+        return from_legacy(pd.read_csv(source, sep=";", dtype=str))
+    if "R_fighter_id" not in columns:
+        frame = pd.read_csv(source, sep=";", dtype=FIGHT_SCHEMA)
+        return with_fighter_ids(frame)
+    return pd.read_csv(source, sep=";", dtype=FIGHT_SCHEMA, usecols=FIGHT_COLUMNS)[
+        FIGHT_COLUMNS
+    ]
+
+
+def with_fighter_ids(frame: pd.DataFrame) -> pd.DataFrame:
+    """The fights of a file written before the IDs, with the IDs of their fighters' names."""
+    for corner in "RB":
+        frame[f"{corner}_fighter_id"] = REGISTRY.ids_of_names(frame[f"{corner}_fighter"])
+    return frame[FIGHT_COLUMNS]
+
+
+def _map_unique(series: pd.Series, parse: Callable[[str], Any], missing: Any) -> np.ndarray:
+    """``parse`` of every value, computed once per distinct value."""
+    codes, uniques = pd.factorize(series)
+    parsed = np.empty(len(uniques) + 1, dtype=object)
+    for index, value in enumerate(uniques):
+        parsed[index] = parse(str(value))
+    parsed[-1] = missing
+    return parsed[codes]  # code -1, a NaN, is the last
+
+
+def from_legacy(legacy: pd.DataFrame) -> pd.DataFrame:
+    """The records of a file of the text the pages show, as written before."""
+    typed = {
+        column: legacy[column]
+        for column in ["R_fighter", "B_fighter", "win_by", "Format", "Referee", "Winner"]
+    }
+    for column in ["R_KD", "B_KD", "R_SUB_ATT", "B_SUB_ATT", "R_REV", "B_REV", "last_round"]:
+        typed[column] = _map_unique(legacy[column], count, 0)
+    for column in ["R_SIG_STR_pct", "B_SIG_STR_pct", "R_TD_pct", "B_TD_pct"]:
+        typed[column] = _map_unique(legacy[column], fraction, 0.0)
+    for stat in STATS:
+        for corner in "RB":
+            pairs = _map_unique(legacy[f"{corner}_{stat}"], landed_of_attempted, (0, 0))
+            typed[f"{corner}_{stat}_att"] = [attempted for _, attempted in pairs]
+            typed[f"{corner}_{stat}_landed"] = [landed for landed, _ in pairs]
+    typed["last_round_time"] = _map_unique(legacy["last_round_time"], seconds, 0)
+    for corner in "RB":
+        typed[f"{corner}_CTRL_time(seconds)"] = _map_unique(legacy[f"{corner}_CTRL"], seconds, 0)
+    typed["date"] = _map_unique(legacy["date"], iso_date, "")
+    typed["location"] = legacy["location"].str.strip()
+    typed["title_bout"] = _map_unique(legacy["Fight_type"], is_title_bout, False)
+    typed["weight_class"] = _map_unique(legacy["Fight_type"], weight_class, "OpenWeight")
+
+    frame = with_fighter_ids(pd.DataFrame(typed, index=legacy.index))
+    return frame.replace({"date": {"": np.nan}}).astype(FIGHT_SCHEMA)
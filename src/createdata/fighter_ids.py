@@ -0,0 +1,116 @@
+import hashlib
+import json
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.createdata.data_files_path import FIGHTER_IDS, PAST_FIGHTER_LINKS_PICKLE  # isort:skip
+
+# The largest ID, they fit in an int32
+MAX_ID = 2 ** 31 - 1
+
+
+def url_hash(url: str) -> str:
+    """``"http://ufcstats.com/fighter-details/93fe7332d16c6ad9"`` as ``"93fe7332d16c6ad9"``."""
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+class FighterRegistry:
+    """
+    The integer ID of every fighter, the key of the fights and the fighter
+    details instead of their name: namesakes have different IDs.
+
+    A fighter's ID is derived from the hash of their ufcstats URL, the few
+    IDs taken by another fighter already are moved to the next free one. IDs
+    are saved in ``fighter_ids.json`` once they are given out, so a fighter
+    keeps their ID even when it was moved.
+
+    Fighters of files written before the IDs are only known by name, they
+    get the ID of the fighter of that name in the fighter listing, or one
+    derived from their name if they aren't listed.
+    """
+
+    def __init__(self, path: Path = FIGHTER_IDS, links_path: Path = PAST_FIGHTER_LINKS_PICKLE):
+        self.PATH = Path(path)
+        self.LINKS_PATH = Path(links_path)
+        self._lock = threading.Lock()
+        # The ID of every key, an URL hash or ``"name:<name>"``
+        self._ids: Optional[Dict[str, int]] = None
+        self._taken = set()
+        self._links_by_name: Optional[Dict[str, str]] = None
+
+    def id_of(self, url: str) -> int:
+        return self._id_of_key(url_hash(url))
+
+    def ids(self, urls: Iterable[str]) -> np.ndarray:
+        return np.array([self.id_of(url) for url in urls], dtype=np.int32)
+
+    def ids_of_names(self, names: pd.Series) -> np.ndarray:
+        """The IDs of fighters known only by name, computed once per name."""
+        codes, uniques = pd.factorize(names)
+        ids = np.array([self._id_of_name(str(name)) for name in uniques] + [-1], dtype=np.int32)
+        return ids[codes]  # code -1, a missing name, is -1
+
+    def save(self) -> None:
+        with self._lock:
+            if self._ids is None:
+                return
+            self.PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.PATH.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self._ids, f)
+            tmp_path.replace(self.PATH)
+
+    def _id_of_name(self, name: str) -> int:
+        if self._links_by_name is None:
+            self._links_by_name = self._load_links_by_name()
+        link = self._links_by_name.get(name)
+        return self.id_of(link) if link is not None else self._id_of_key(f"name:{name}")
+
+    def _id_of_key(self, key: str) -> int:
+        with self._lock:
+            if self._ids is None:
+                self._load()
+            if key not in self._ids:
+                fighter_id = int(hashlib.md5(key.encode()).hexdigest()[:8], 16) & MAX_ID
+                while fighter_id in self._taken:
+                    fighter_id = (fighter_id + 1) & MAX_ID
+                self._ids[key] = fighter_id
+                self._taken.add(fighter_id)
+            return self._ids[key]
+
+    def _load(self) -> None:
+        self._ids = {}
+        if self.PATH.exists():
+            with open(self.PATH, "r") as f:
+                self._ids = json.load(f)
+        self._taken = set(self._ids.values())
+
+    def _load_links_by_name(self) -> Dict[str, str]:
+        if not self.LINKS_PATH.exists():
+            return {}
+        with open(self.LINKS_PATH, "rb") as f:
+            links = pickle.load(f)
+        # The fighter of every link, older versions saved the link of every name
+        return {name: link for link, name in links.items()} if is_links_by_url(links) else links
+
+
+def is_links_by_url(links: Dict[str, str]) -> bool:
+    return all(key.startswith("http") for key in links)
+
+
+def with_fighter_ids(fighter_details: pd.DataFrame) -> pd.DataFrame:
+    """Fighter details indexed by ``fighter_name``, as written before the IDs, indexed by ID."""
+    fighter_details = fighter_details.reset_index()
+    fighter_details.index = pd.Index(
+        REGISTRY.ids_of_names(fighter_details["fighter_name"]), name="fighter_id"
+    )
+    return fighter_details
+
+
+# One registry for every stage, the IDs of the fights and of the details must agree
+REGISTRY = FighterRegistry()
@@ -0,0 +1,129 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from src.createdata.data_files_path import PREPROCESS_METRICS, PROFILES  # isort:skip
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class StepRecorder:
+    """
+    Records the wall time, peak memory and output shape of every step of a
+    run as JSON lines, e.g.::
+
+        {"run_id": "...", "stage": "preprocess", "step": "rename_columns",
+         "seconds": 0.12, "peak_memory_bytes": 5242880, "frames": {"fights": [6000, 60]}}
+
+    Peak memory is the peak of the memory allocated by Python during the step
+    (``tracemalloc``), which slows the steps down; ``trace_memory=False``
+    records the time alone.
+
+    With ``UFC_PROFILE_STEPS=cprofile`` (or ``pyinstrument``) every step is
+    also profiled, the profiles are saved in ``data/profiles/<run_id>``.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        log_path: Path = PREPROCESS_METRICS,
+        trace_memory: bool = True,
+        profiler: Optional[str] = None,
+        profile_path: Path = PROFILES,
+    ):
+        self.stage = stage
+        self.LOG_PATH = Path(log_path)
+        self.trace_memory = trace_memory
+        self.profiler = profiler or os.environ.get("UFC_PROFILE_STEPS") or None
+        if self.profiler is not None and self.profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {self.profiler}, expected one of {PROFILERS}")
+        self.PROFILE_PATH = Path(profile_path)
+        self.run_id = None
+        self.records: List[Dict] = []
+
+    def start_run(self) -> None:
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.records = []
+
+    @contextmanager
+    def step(
+        self, name: str, frames: Optional[Callable[[], Dict[str, Optional[pd.DataFrame]]]] = None
+    ):
+        """
+        Measures the ``with`` block. ``frames`` returns the data frames whose
+        shape is recorded once the step is done.
+        """
+        if self.run_id is None:
+            self.start_run()
+
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        profiler = self._start_profiler()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stop_profiler(profiler, name)
+            peak = None
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+        record = {
+            "run_id": self.run_id,
+            "stage": self.stage,
+            "step": name,
+            "seconds": seconds,
+            "peak_memory_bytes": peak,
+            "frames": {
+                frame_name: list(frame.shape)
+                for frame_name, frame in (frames() if frames else {}).items()
+                if frame is not None
+            },
+            "timestamp": time.time(),
+        }
+        self.records.append(record)
+        self.LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _start_profiler(self):
+        if self.profiler == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ImportError("UFC_PROFILE_STEPS=pyinstrument requires pyinstrument to be installed")
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        return None
+
+    def _stop_profiler(self, profiler, name: str) -> None:
+        if profiler is None:
+            return
+        profile_path = self.PROFILE_PATH / self.run_id
+        profile_path.mkdir(parents=True, exist_ok=True)
+        # Steps can run more than once per run, the index keeps their profiles apart
+        file_name = f"{self.stage}.{len(self.records):02d}.{name}"
+        if self.profiler == "cprofile":
+            profiler.disable()
+            profiler.dump_stats(profile_path / f"{file_name}.prof")
+        else:
+            profiler.stop()
+            with open(profile_path / f"{file_name}.html", "w") as f:
+                f.write(profiler.output_html())
@@ -0,0 +1,75 @@
+from typing import Optional
+
+from prometheus_client import (REGISTRY, Counter, Gauge, Histogram,
+                               start_http_server, write_to_textfile)
+
+from src.createdata.data_files_path import SCRAPE_METRICS  # isort:skip
+
+# Metrics of the scrapers, in the default registry of ``prometheus_client``.
+# A run exposes them on ``--metrics-port`` while it is running and leaves a
+# snapshot in ``data/scrape_metrics.prom`` for the node exporter's textfile
+# collector when it is done.
+
+HTTP_REQUESTS = Counter(
+    "ufc_scraper_http_requests_total",
+    "HTTP requests sent to ufcstats, by response status ('error' for network errors)",
+    ["status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "ufc_scraper_http_request_duration_seconds",
+    "Duration of single HTTP requests, retries are separate requests",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DOWNLOADED_BYTES = Counter(
+    "ufc_scraper_downloaded_bytes_total", "Bytes of the pages downloaded from ufcstats"
+)
+FETCH_RETRIES = Counter(
+    "ufc_scraper_fetch_retries_total", "Requests that were retried after a transient failure"
+)
+CONCURRENCY_LIMIT = Gauge(
+    "ufc_scraper_concurrency_limit", "Current adaptive limit on the requests in flight"
+)
+PARSE_DURATION = Histogram(
+    "ufc_scraper_parse_duration_seconds",
+    "Time spent parsing the HTML of a page, by page type",
+    ["page_type"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+CACHE_LOOKUPS = Counter(
+    "ufc_scraper_cache_lookups_total",
+    "Pages looked up in a cache (checkpoint of a resumed scrape, page archive), by result",
+    ["cache", "result"],
+)
+SCRAPED_ITEMS = Counter(
+    "ufc_scraper_items_total", "Fights and fighters scraped successfully", ["scraper"]
+)
+SCRAPE_ERRORS = Counter(
+    "ufc_scraper_errors_total", "Fights and fighters that could not be scraped, by scraper", ["scraper"]
+)
+
+PAGE_TYPES = {
+    "events": "/statistics/events/",
+    "event": "/event-details/",
+    "fight": "/fight-details/",
+    "fighters": "/statistics/fighters",
+    "fighter": "/fighter-details/",
+}
+
+
+def page_type(url: str) -> str:
+    for name, pattern in PAGE_TYPES.items():
+        if pattern in url:
+            return name
+    return "other"
+
+
+def serve_metrics(port: Optional[int]) -> None:
+    """Exposes the metrics on ``http://localhost:<port>/metrics``, if a port is given."""
+    if port is not None:
+        start_http_server(port)
+        print(f"Serving metrics on port {port}")
+
+
+def save_metrics(path=SCRAPE_METRICS) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_to_textfile(str(path), REGISTRY)
@@ -0,0 +1,105 @@
+import concurrent.futures
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class BackgroundWriter:
+    """
+    Writes the files of the pipeline in a background thread, so that saving
+    the output of a stage overlaps with the work of the next one, which gets
+    the output in memory.
+
+    Tasks run one at a time in the order they were submitted, a task can rely
+    on the files submitted before it being written. Code reading a file waits
+    for its pending writes with ``wait``, which also raises the errors of the
+    writes.
+    """
+
+    def __init__(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="writer"
+        )
+        self._lock = threading.Lock()
+        self._futures: List[concurrent.futures.Future] = []
+        # The last write of every file
+        self._writes: Dict[Path, concurrent.futures.Future] = {}
+
+    def submit(
+        self,
+        task: Callable[[], None],
+        path: Optional[Path] = None,
+        after: Iterable[Path] = (),
+    ) -> None:
+        """
+        Runs ``task`` after the tasks submitted before, ``path`` is the file it
+        writes. ``task`` is skipped when a write of a file of ``after``
+        submitted before it failed, e.g. a checkpoint is only cleared once
+        the data it checkpoints is saved.
+        """
+
+        def run():
+            failed = [
+                str(dependency)
+                for dependency, write in dependencies
+                if write.exception() is not None
+            ]
+            if failed:
+                print(f"Skipping {path or task}, writing {', '.join(failed)} failed")
+                return
+            try:
+                task()
+            except Exception as e:
+                print(f"Error writing {path or task}: {e}")
+                raise
+
+        with self._lock:
+            dependencies = [
+                (Path(dependency), self._writes[Path(dependency)])
+                for dependency in after
+                if Path(dependency) in self._writes
+            ]
+            future = self._executor.submit(run)
+            # Failed writes are kept, ``wait`` raises their errors
+            self._futures = [
+                other
+                for other in self._futures
+                if not other.done() or other.exception() is not None
+            ] + [future]
+            if path is not None:
+                self._writes[Path(path)] = future
+
+    def write(self, path: Path, write: Callable[[Path], None]) -> None:
+        """
+        Writes ``path`` with ``write`` in the background. It writes a temporary
+        file that only replaces ``path`` once it is complete.
+        """
+        path = Path(path)
+
+        def task():
+            tmp_path = path.with_suffix(".tmp")
+            write(tmp_path)
+            tmp_path.replace(path)
+
+        self.submit(task, path)
+
+    def pending(self, paths: Iterable[Path]) -> bool:
+        """Whether a file of ``paths`` is still to be written."""
+        with self._lock:
+            return any(
+                not self._writes[Path(path)].done() for path in paths if Path(path) in self._writes
+            )
+
+    def wait(self, paths: Optional[Iterable[Path]] = None) -> None:
+        """Waits until ``paths``, or everything submitted, are written."""
+        with self._lock:
+            if paths is None:
+                futures = list(self._futures)
+            else:
+                futures = [self._writes[Path(path)] for path in paths if Path(path) in self._writes]
+        for future in futures:
+            future.result()
+
+
+# One writer for every stage, the preprocessing reads what the scrapers write
+WRITER = BackgroundWriter()
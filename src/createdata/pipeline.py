@@ -0,0 +1,158 @@
+import concurrent.futures
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from src.createdata.persist import WRITER
+from src.createdata.utils import set_progress_task
+
+from src.createdata.data_files_path import PIPELINE_STATE  # isort:skip
+
+
+class Stage:
+    """
+    A step of the data pipeline.
+
+    ``inputs`` and ``outputs`` are the files the stage reads and writes. A stage
+    with inputs is skipped when their content is unchanged since its last
+    successful run and all its outputs still exist. A stage without inputs
+    (e.g. a scraper, whose input is the website) always runs. Stages may
+    write their outputs in the background with ``persist.WRITER``, a stage
+    whose inputs are still being written runs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], None],
+        inputs: Sequence[Path] = (),
+        outputs: Sequence[Path] = (),
+        depends_on: Sequence[str] = (),
+    ):
+        self.name = name
+        self.run = run
+        self.inputs = [Path(path) for path in inputs]
+        self.outputs = [Path(path) for path in outputs]
+        self.depends_on = list(depends_on)
+
+
+class Pipeline:
+    """
+    Runs stages in dependency order. Stages whose dependencies are done run
+    concurrently in a thread pool.
+    """
+
+    def __init__(self, stages: List[Stage], state_path: Path = PIPELINE_STATE):
+        self.stages = {stage.name: stage for stage in stages}
+        self.PIPELINE_STATE_PATH = Path(state_path)
+
+        for stage in stages:
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dependency}")
+
+        self.state = self._load_state()
+        self._state_lock = threading.Lock()
+
+    def run(self, force: bool = False) -> None:
+        pending = dict(self.stages)
+        done = set()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.stages)) as executor:
+            running = {}
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dependency in done for dependency in stage.depends_on):
+                        running[executor.submit(self._run_stage, stage, force)] = name
+                        del pending[name]
+
+                if not running:
+                    raise ValueError(f"Circular dependencies between stages {list(pending)}")
+
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    # Re-raise failures, the state of a failed stage is not updated
+                    future.result()
+                    done.add(running.pop(future))
+
+        WRITER.wait()
+
+    def _run_stage(self, stage: Stage, force: bool) -> None:
+        # Inputs still being written were changed by the stages before, they
+        # are fingerprinted once they are written
+        changing = WRITER.pending(stage.inputs)
+        with self._state_lock:
+            fingerprint = self._fingerprint(stage.inputs) if stage.inputs and not changing else None
+
+        if (
+            not force
+            and fingerprint is not None
+            and self.state.get("stages", {}).get(stage.name) == fingerprint
+            and all(path.exists() for path in stage.outputs)
+        ):
+            print(f"Skipping {stage.name}, its inputs are unchanged since the last run\n")
+            return
+
+        time_start = time.time()
+        print(f"Starting {stage.name} \n")
+        # Concurrent stages share one progress line instead of overwriting each other's bars
+        set_progress_task(stage.name)
+        try:
+            stage.run()
+        finally:
+            set_progress_task(None)
+        print(f"\n{stage.name}: elapsed seconds = {(time.time() - time_start):.2f}")
+
+        if changing:
+            WRITER.wait(stage.inputs)
+            with self._state_lock:
+                fingerprint = self._fingerprint(stage.inputs)
+        if fingerprint is not None:
+            with self._state_lock:
+                self.state.setdefault("stages", {})[stage.name] = fingerprint
+                self._save_state()
+
+    def _fingerprint(self, paths: List[Path]) -> Optional[str]:
+        digest = hashlib.sha256()
+        for path in paths:
+            if not path.exists():
+                return None
+            digest.update(path.name.encode())
+            digest.update(self._file_hash(path).encode())
+        return digest.hexdigest()
+
+    def _file_hash(self, path: Path) -> str:
+        # Hashing is skipped for files whose size and mtime didn't change
+        stat = path.stat()
+        files = self.state.setdefault("files", {})
+        known = files.get(path.as_posix())
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+        files[path.as_posix()] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest.hexdigest(),
+        }
+        return digest.hexdigest()
+
+    def _load_state(self) -> Dict:
+        if not self.PIPELINE_STATE_PATH.exists():
+            return {}
+        with open(self.PIPELINE_STATE_PATH, "r") as f:
+            return json.load(f)
+
+    def _save_state(self) -> None:
+        self.PIPELINE_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.PIPELINE_STATE_PATH, "w") as f:
+            json.dump(self.state, f, indent=2)
@@ -1,79 +1,224 @@
-import math
+import hashlib
+import inspect
+import os
+import shutil
+import sys
+from typing import Optional
 
 import numpy as np
 import pandas as pd
 
+from src.createdata import feature_cache, fight_records, ratings
+from src.createdata.feature_cache import FighterFeatureCache
+from src.createdata.feature_store import FighterFeatureStore
+from src.createdata.fighter_ids import with_fighter_ids
+from src.createdata.instrumentation import StepRecorder
+from src.createdata.persist import WRITER
 from src.createdata.preprocess_fighter_data import FighterDetailProcessor
+from src.createdata.preprocess_state import PreprocessState, RunningMedians
+from src.createdata.ratings import RatingEngine
 
 from src.createdata.data_files_path import (  # isort:skip
+    FEATURE_STORE,
     FIGHTER_DETAILS,
     PREPROCESSED_DATA,
     TOTAL_EVENT_AND_FIGHTS,
     UFC_DATA,
 )
 
+# Dtype policy: strings repeated across fights are categoricals, counts and
+# durations use the smallest integer type that holds them, rates and ages are
+# float32 and one-hot columns are uint8. The fights are read with these types,
+# see ``fight_records.FIGHT_SCHEMA``. ``Format`` stays a string, ``apply`` on a
+# categorical skips its NaNs.
+CATEGORICAL_FIGHTER_DETAILS_COLUMNS = ["Height", "Weight", "Reach", "Stance", "DOB"]
+# Columns the NaNs of ``_fill_nas`` are not filled in
+UNFILLED_COLUMNS = ["total_time_fought(seconds)"]
+
+# The rows of an incremental run are only consistent with the rows of the
+# last run if both were computed by the same code
+CODE_VERSION = hashlib.sha256(
+    (
+        inspect.getsource(sys.modules[__name__])
+        + inspect.getsource(ratings)
+        + feature_cache.CODE_VERSION
+    ).encode()
+).hexdigest()[:16]
+
+
+def _downcast_integers(frame: pd.DataFrame, columns) -> None:
+    for column in columns:
+        frame[column] = pd.to_numeric(frame[column], downcast="integer")
+
+
+def _fill_category(series: pd.Series, value) -> pd.Series:
+    """``fillna`` that also works on a categorical missing ``value`` in its categories."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+
+def _fillable_columns(frame: pd.DataFrame):
+    """The numeric columns whose NaNs are filled with the median."""
+    return [
+        column
+        for column in frame.select_dtypes(include=np.number).columns
+        if column not in UNFILLED_COLUMNS
+    ]
+
+
+def _fillable_values(frame: pd.DataFrame):
+    """The fillable columns as ``_fill_nas`` sees them, a missing reach is the height."""
+    for column in _fillable_columns(frame):
+        values = frame[column]
+        height = column.replace("_Reach_cms", "_Height_cms")
+        if column.endswith("_Reach_cms") and height in frame.columns:
+            values = values.fillna(frame[height])
+        yield column, values
+
 
 class Preprocessor:
-    def __init__(self):
+    def __init__(
+        self, trace_memory: bool = True, incremental: bool = False, workers: Optional[int] = None
+    ):
+        """
+        With ``incremental`` only the fights that are new since the last run,
+        and the fights of the fighters whose details changed, are processed.
+        The other rows of ``data.csv`` are taken from the last run. Runs fall
+        back to processing every fight when the fights of the last run are
+        not unchanged at the end of the raw data, i.e. new fights can only
+        be added at the top.
+
+        The fighter level features are computed on ``workers`` processes
+        (default: every core).
+        """
         self.FIGHTER_DETAILS_PATH = FIGHTER_DETAILS
         self.TOTAL_EVENT_AND_FIGHTS_PATH = TOTAL_EVENT_AND_FIGHTS
         self.PREPROCESSED_DATA_PATH = PREPROCESSED_DATA
         self.UFC_DATA_PATH = UFC_DATA
+        self.FEATURE_STORE_PATH = FEATURE_STORE
         self.fights = None
         self.fighter_details = None
         self.store = None
+        # Time, peak memory and output shape of every step, see ``StepRecorder``
+        self.recorder = StepRecorder("preprocess", trace_memory=trace_memory)
+        # The fighter level features only change with the fights they are computed from
+        self.feature_cache = FighterFeatureCache()
+        self.incremental = incremental
+        self.workers = workers or os.cpu_count()
+        self.state = PreprocessState()
+        # Index of the fights to process, ``None`` for every fight
+        self.rows = None
+        self.row_hashes = None
+        self.detail_hashes = None
+        self.previous = None
+        self.medians = None
+        # The ``RatingEngine`` after every fight
+        self.ratings = None
+        self._replaced = None
+
+    def process_raw_data(
+        self, fights: Optional[pd.DataFrame] = None, fighter_details: Optional[pd.DataFrame] = None
+    ):
+        """
+        ``fights`` and ``fighter_details`` are the content of the raw files
+        as the scrapers just saved them, the files are only read when they
+        aren't given. The outputs are written in the background while the
+        steps after them run, they are all written when this returns.
+        """
+        self.recorder.start_run()
 
-    def process_raw_data(self):
         print("Reading Files")
-        self.fights, self.fighter_details = self._read_files()
+        self._step(self._read_files, fights=fights, fighter_details=fighter_details)
 
         print("Drop columns that contain information not yet occurred")
-        self._drop_future_fighter_details_columns()
-
-        print("Renaming Columns")
-        self._rename_columns()
-        self._replacing_winner_nans_draw()
-
-        print("Converting Percentages to Fractions")
-        self._convert_percentages_to_fractions()
-        self._create_title_bout_feature()
-        self._create_weight_classes()
-        self._convert_last_round_to_seconds()
-        self._convert_CTRL_to_seconds()
-        self._get_total_time_fought()
-        self.store = self._store_compiled_fighter_data_in_another_DF()
-        self._create_winner_feature()
-        self._create_fighter_attributes()
-        self._create_fighter_age()
-        self._save(filepath=self.UFC_DATA_PATH)
+        self._step(self._drop_future_fighter_details_columns)
+        self._step(self._select_rows)
+
+        # The fights are typed records, the strokes, fractions and seconds
+        # were parsed when they were scraped
+        if self.rows is None or len(self.rows):
+            self._step(self._replacing_winner_nans_draw)
+            self._step(self._get_total_time_fought)
+            self._step(self._update_feature_store)
+            self._step(self._store_compiled_fighter_data_in_another_DF)
+            self._step(self._create_winner_feature)
+            self._step(self._create_fighter_attributes)
+            self._step(self._create_fighter_age)
+            self._step(self._create_fighter_ratings)
+        self._step(self._merge_previous_rows)
+        self._step(self._save_ufc_data)
+        self._step(self._update_medians)
+        self._step(self._save_state)
 
         print("Fill NaNs")
-        self._fill_nas()
+        self._step(self._fill_nas)
         print("Dropping Non Essential Columns")
-        self._drop_non_essential_cols()
-        self._save(filepath=self.PREPROCESSED_DATA_PATH)
+        self._step(self._drop_non_essential_cols)
+        self._step(self._save, filepath=self.PREPROCESSED_DATA_PATH)
+        self._step(self._wait_for_writes)
+        print(f"Saved the metrics of every step to {self.recorder.LOG_PATH}")
         print("Successfully preprocessed and saved ufc data!\n")
 
-    def _read_files(self):
-        try:
-            fights_df = pd.read_csv(self.TOTAL_EVENT_AND_FIGHTS_PATH, sep=";")
+    def _step(self, method, *args, **kwargs):
+        """Runs a step, every step updates ``fights``, ``fighter_details`` or ``store``."""
+        with self.recorder.step(
+            method.__name__.lstrip("_"),
+            frames=lambda: {
+                "fights": self.fights,
+                "fighter_details": self.fighter_details,
+                "store": self.store,
+            },
+        ):
+            return method(*args, **kwargs)
+
+    def _read_files(self, fights=None, fighter_details=None):
+        # The frames of the scrapers are still written in the background, the
+        # steps change copies with the types the files are read with
+        if fights is not None:
+            fights_df = fights.astype(fight_records.FIGHT_SCHEMA).reset_index(drop=True)
+        else:
+            try:
+                WRITER.wait([self.TOTAL_EVENT_AND_FIGHTS_PATH])
+                fights_df = fight_records.read_fight_data(self.TOTAL_EVENT_AND_FIGHTS_PATH)
 
-        except Exception as e:
-            raise FileNotFoundError("Cannot find the data/total_fight_data.csv")
+            except Exception as e:
+                raise FileNotFoundError("Cannot find the data/total_fight_data.csv")
+
+        self.fights = fights_df
+        self._read_fighter_details(fighter_details)
+
+    def _read_fighter_details(self, fighter_details=None):
+        if fighter_details is not None:
+            self.fighter_details = fighter_details.astype(
+                {column: "category" for column in CATEGORICAL_FIGHTER_DETAILS_COLUMNS}
+            )
+            return
 
         try:
+            WRITER.wait([self.FIGHTER_DETAILS_PATH])
             fighter_details_df = pd.read_csv(
-                self.FIGHTER_DETAILS_PATH, index_col="fighter_name"
+                self.FIGHTER_DETAILS_PATH,
+                dtype={column: "category" for column in CATEGORICAL_FIGHTER_DETAILS_COLUMNS},
             )
 
         except Exception as e:
             raise FileNotFoundError("Cannot find the data/fighter_details.csv")
 
-        return fights_df, fighter_details_df
+        # Files written before the IDs get the IDs of their fighters' names
+        if "fighter_id" not in fighter_details_df.columns:
+            fighter_details_df = with_fighter_ids(fighter_details_df.set_index("fighter_name"))
+        else:
+            fighter_details_df.index = pd.Index(
+                fighter_details_df.pop("fighter_id").astype(np.int32), name="fighter_id"
+            )
+        self.fighter_details = fighter_details_df
 
     def _drop_future_fighter_details_columns(self):
+        # The name too, the details are joined by the fighters' IDs
         self.fighter_details.drop(
             columns=[
+                "fighter_name",
                 "SLpM",
                 "Str_Acc",
                 "SApM",
@@ -86,150 +231,66 @@ class Preprocessor:
             inplace=True,
         )
 
-    def _rename_columns(self):
-        columns = [
-            "R_SIG_STR.",
-            "B_SIG_STR.",
-            "R_TOTAL_STR.",
-            "B_TOTAL_STR.",
-            "R_TD",
-            "B_TD",
-            "R_HEAD",
-            "B_HEAD",
-            "R_BODY",
-            "B_BODY",
-            "R_LEG",
-            "B_LEG",
-            "R_DISTANCE",
-            "B_DISTANCE",
-            "R_CLINCH",
-            "B_CLINCH",
-            "R_GROUND",
-            "B_GROUND",
-        ]
-
-        attempt_suffix = "_att"
-        landed_suffix = "_landed"
-
-        for column in columns:
-            self.fights[column + attempt_suffix] = self.fights[column].apply(
-                lambda X: int(X.split("of")[1]) if pd.notna(X) and isinstance(X, str) and "of" in X else 0
-            )
-            self.fights[column + landed_suffix] = self.fights[column].apply(
-                lambda X: int(X.split("of")[0]) if pd.notna(X) and isinstance(X, str) and "of" in X else 0
-            )
-
-        self.fights.drop(columns, axis=1, inplace=True)
-
-    def _replacing_winner_nans_draw(self):
-        self.fights["Winner"].fillna("Draw", inplace=True)
-
-    def _convert_percentages_to_fractions(self):
-        pct_columns = ["R_SIG_STR_pct", "B_SIG_STR_pct", "R_TD_pct", "B_TD_pct"]
-
-        def pct_to_frac(X):
-            try:
-                if pd.isna(X) or X == "---":
-                    return 0
-                if isinstance(X, str):
-                    return float(X.replace("%", "")) / 100
-                return float(X)
-            except:
-                return 0
-
-        for column in pct_columns:
-            self.fights[column] = self.fights[column].apply(pct_to_frac)
-
-    def _create_title_bout_feature(self):
-        self.fights["title_bout"] = self.fights["Fight_type"].apply(
-            lambda X: "Title Bout" in X if pd.notna(X) and isinstance(X, str) else False
+    def _select_rows(self):
+        """
+        Hashes the raw fights and fighter details and, in an incremental run,
+        keeps only the fights needed to compute the new and changed rows: the
+        whole history of the fighters of these rows.
+        """
+        self.row_hashes = pd.util.hash_pandas_object(self.fights, index=False)
+        fighter_details = self.fighter_details[~self.fighter_details.index.duplicated()]
+        self.detail_hashes = dict(
+            zip(fighter_details.index, pd.util.hash_pandas_object(fighter_details, index=False))
         )
-
-    def _create_weight_classes(self):
-        def make_weight_class(X):
-            # Handle null/NaN values
-            if pd.isna(X) or not isinstance(X, str):
-                return "Open Weight"
-            
-            weight_classes = [
-                "Women's Strawweight",
-                "Women's Bantamweight", 
-                "Women's Featherweight",
-                "Women's Flyweight",
-                "Lightweight",
-                "Welterweight",
-                "Middleweight",
-                "Light Heavyweight",
-                "Heavyweight",
-                "Featherweight",
-                "Bantamweight",
-                "Flyweight",
-                "Open Weight",
+        self.rows = None
+        self.previous = None
+        if not self.incremental:
+            return
+
+        previous = self.state.load()
+        if previous is None:
+            print("No previous run to update, processing every fight")
+            return
+        if previous["code_version"] != CODE_VERSION:
+            print("The preprocessing changed since the last run, processing every fight")
+            return
+        n_new = len(self.row_hashes) - len(previous["row_hashes"])
+        if (
+            n_new < 0
+            or not self.row_hashes.is_unique
+            or not np.array_equal(self.row_hashes.to_numpy()[n_new:], previous["row_hashes"])
+        ):
+            print("The fights of the last run changed, processing every fight")
+            return
+
+        changed_fighters = np.array(
+            [
+                fighter
+                for fighter, digest in self.detail_hashes.items()
+                if previous["detail_hashes"].get(fighter) != digest
             ]
-
-            for weight_class in weight_classes:
-                if weight_class in X:
-                    return weight_class
-
-            # Fix the logical error in the original condition
-            if X == "Catch Weight Bout" or X == "Catchweight Bout":
-                return "Catch Weight"
-            else:
-                return "Open Weight"
-
-        self.fights["weight_class"] = self.fights["Fight_type"].apply(make_weight_class)
-
-        renamed_weight_classes = {
-            "Flyweight": "Flyweight",
-            "Bantamweight": "Bantamweight",
-            "Featherweight": "Featherweight",
-            "Lightweight": "Lightweight",
-            "Welterweight": "Welterweight",
-            "Middleweight": "Middleweight",
-            "Light Heavyweight": "LightHeavyweight",
-            "Heavyweight": "Heavyweight",
-            "Women's Strawweight": "WomenStrawweight",
-            "Women's Flyweight": "WomenFlyweight",
-            "Women's Bantamweight": "WomenBantamweight",
-            "Women's Featherweight": "WomenFeatherweight",
-            "Catch Weight": "CatchWeight",
-            "Open Weight": "OpenWeight",
-        }
-
-        self.fights["weight_class"] = self.fights["weight_class"].apply(
-            lambda weight: renamed_weight_classes[weight]
+            + list(previous["detail_hashes"].keys() - self.detail_hashes.keys()),
+            dtype=np.int32,
         )
-
-    def _convert_last_round_to_seconds(self):
-        self.fights["last_round_time"] = self.fights["last_round_time"].apply(
-            lambda X: int(X.split(":")[0]) * 60 + int(X.split(":")[1]) 
-            if pd.notna(X) and isinstance(X, str) and ":" in X 
-            else 0
+        rows = self.fights.index[:n_new].union(
+            self.fights.index[
+                self.fights["R_fighter_id"].isin(changed_fighters)
+                | self.fights["B_fighter_id"].isin(changed_fighters)
+            ]
         )
+        fighters = np.union1d(
+            self.fights.loc[rows, "R_fighter_id"], self.fights.loc[rows, "B_fighter_id"]
+        )
+        print(f"Processing {len(rows)} new or changed fights of {len(fighters)} fighters")
 
-    def _convert_CTRL_to_seconds(self):
-    # Converting to seconds
-        CTRL_columns = ["R_CTRL", "B_CTRL"]
-
-        def conv_to_sec(X):
-            try:
-                if pd.isna(X) or not isinstance(X, str):
-                    return 0
-                if X == "--":
-                    return 0
-                # Handle the time conversion
-                parts = X.split(":")
-                if len(parts) == 2:
-                    return int(parts[0]) * 60 + int(parts[1])
-                return 0
-            except (ValueError, AttributeError, IndexError):
-                return 0
-
-        for column in CTRL_columns:
-            self.fights[column + "_time(seconds)"] = self.fights[column].apply(conv_to_sec)
+        self.fights = self.fights[
+            self.fights["R_fighter_id"].isin(fighters) | self.fights["B_fighter_id"].isin(fighters)
+        ]
+        self.rows = rows
+        self.previous = previous
 
-        # drop original columns
-        self.fights.drop(["R_CTRL", "B_CTRL"], axis=1, inplace=True)
+    def _replacing_winner_nans_draw(self):
+        self.fights["Winner"] = _fill_category(self.fights["Winner"], "Draw")
 
     def _get_total_time_fought(self):
         # '1 Rnd + 2OT (15-3-3)' and '1 Rnd + 2OT (24-3-3)' is not included because it has 3 uneven timed rounds.
@@ -293,6 +354,7 @@ class Preprocessor:
                 return 0
 
         self.fights["total_time_fought(seconds)"] = self.fights.apply(get_total_time, axis=1)
+        _downcast_integers(self.fights, ["total_time_fought(seconds)"])
         
         # Only drop columns if they exist
         columns_to_drop = ["Format", "Fight_type", "last_round_time"]
@@ -300,12 +362,31 @@ class Preprocessor:
         if existing_columns:
             self.fights.drop(existing_columns, axis=1, inplace=True)
 
+    def _update_feature_store(self):
+        """
+        Saves the features of every fighter as of any date in the background,
+        see ``FighterFeatureStore``. Incremental runs only compute the
+        fighters of the processed rows again, ``fights`` holds their every fight.
+        """
+        if self.rows is None:
+            feature_store = FighterFeatureStore.build(self.fights, self.fighter_details)
+        else:
+            WRITER.wait([self.FEATURE_STORE_PATH])
+            previous = FighterFeatureStore.load(self.FEATURE_STORE_PATH)
+            if previous is None:
+                print(f"No {self.FEATURE_STORE_PATH} to update, run without --incremental to create it")
+                return
+            fights = self.fights.loc[self.rows]
+            fighters = np.union1d(fights["R_fighter_id"], fights["B_fighter_id"])
+            feature_store = previous.update(
+                FighterFeatureStore.build(self.fights, self.fighter_details, fighters=fighters)
+            )
+        WRITER.write(self.FEATURE_STORE_PATH, feature_store.save)
+
     def _store_compiled_fighter_data_in_another_DF(self):
-        store = self.fights.copy()
-        
         # Only drop columns that exist in the DataFrame
         columns_to_drop = [
-            "R_KD", "B_KD", "R_SIG_STR_pct", "B_SIG_STR_pct", "R_TD_pct", "B_TD_pct",
+            "R_fighter_id", "B_fighter_id", "R_KD", "B_KD", "R_SIG_STR_pct", "B_SIG_STR_pct", "R_TD_pct", "B_TD_pct",
             "R_SUB_ATT", "B_SUB_ATT", "R_REV", "B_REV", "R_CTRL_time(seconds)", "B_CTRL_time(seconds)",
             "win_by", "last_round", "R_SIG_STR._att", "R_SIG_STR._landed", "B_SIG_STR._att", "B_SIG_STR._landed",
             "R_TOTAL_STR._att", "R_TOTAL_STR._landed", "B_TOTAL_STR._att", "B_TOTAL_STR._landed",
@@ -316,11 +397,9 @@ class Preprocessor:
             "R_GROUND_att", "R_GROUND_landed", "B_GROUND_att", "B_GROUND_landed", "total_time_fought(seconds)",
         ]
         
-        existing_columns = [col for col in columns_to_drop if col in store.columns]
-        if existing_columns:
-            store.drop(existing_columns, axis=1, inplace=True)
-        
-        return store
+        # Copies the kept columns only, not the whole of ``fights``
+        existing_columns = [col for col in columns_to_drop if col in self.fights.columns]
+        self.store = self.fights.drop(columns=existing_columns)
 
     def _create_winner_feature(self):
         def get_renamed_winner(row):
@@ -348,35 +427,32 @@ class Preprocessor:
         # Ensure the columns exist before applying
         required_columns = ["R_fighter", "B_fighter", "Winner"]
         if all(col in self.store.columns for col in required_columns):
-            self.store["Winner"] = self.store[required_columns].apply(get_renamed_winner, axis=1)
+            self.store["Winner"] = (
+                self.store[required_columns].apply(get_renamed_winner, axis=1).astype("category")
+            )
 
     def _create_fighter_attributes(self):
         """
-        Create fighter attributes by joining with fighter details data
+        Joins the fighter level features (averaged stats, streaks, win
+        methods and the fighter details) of ``FighterDetailProcessor``,
+        computed again only for the fighters whose fights changed. Fighters
+        are grouped and joined with their details by ID.
         """
         try:
-            # Create a mapping of fighter names to their attributes
-            fighter_attrs = self.fighter_details.copy()
-            
-            # Create separate DataFrames for Red and Blue fighters
-            red_attrs = fighter_attrs.add_prefix('R_')
-            blue_attrs = fighter_attrs.add_prefix('B_')
-            
-            # Merge with the store DataFrame
-            self.store = self.store.merge(
-                red_attrs, 
-                left_on='R_fighter', 
-                right_index=True, 
-                how='left'
-            )
-            
-            self.store = self.store.merge(
-                blue_attrs, 
-                left_on='B_fighter', 
-                right_index=True, 
-                how='left'
-            )
-            
+            fighter_details = self.fighter_details
+            if not fighter_details.index.is_unique:
+                fighter_details = fighter_details[~fighter_details.index.duplicated()]
+            if self.rows is None:
+                frame = self.feature_cache.fighter_features(
+                    self.fights, fighter_details, workers=self.workers
+                )
+            else:
+                frame = FighterDetailProcessor(
+                    self.fights, fighter_details.copy(), rows=self.rows, workers=self.workers
+                ).frame
+                # The other fights are only the history of the fighters of these rows
+                self.store = self.store.loc[self.rows]
+            self.store = self.store.join(frame, how="outer")
             print("Successfully created fighter attributes")
             
         except Exception as e:
@@ -386,44 +462,23 @@ class Preprocessor:
     def _create_fighter_age(self):
         try:
             # Convert to datetime with error handling
-            self.store["R_DOB"] = pd.to_datetime(self.store["R_DOB"], errors='coerce')
-            self.store["B_DOB"] = pd.to_datetime(self.store["B_DOB"], errors='coerce')
-            self.store["date"] = pd.to_datetime(self.store["date"], errors='coerce')
-
-            def get_age(row):
-                try:
-                    # Handle missing dates
-                    if pd.isna(row["date"]) or pd.isna(row["B_DOB"]) or pd.isna(row["R_DOB"]):
-                        return pd.Series([np.nan, np.nan], index=["B_age", "R_age"])
-                    
-                    fight_date = row["date"]
-                    b_dob = row["B_DOB"]
-                    r_dob = row["R_DOB"]
-                    
-                    # Calculate ages
-                    b_age = (fight_date - b_dob).days
-                    r_age = (fight_date - r_dob).days
-                    
-                    # Convert to years, handle negative ages
-                    if not pd.isna(b_age) and b_age >= 0:
-                        b_age = math.floor(b_age / 365.25)
-                    else:
-                        b_age = np.nan
-                        
-                    if not pd.isna(r_age) and r_age >= 0:
-                        r_age = math.floor(r_age / 365.25)
-                    else:
-                        r_age = np.nan
+            # (``to_datetime`` of a categorical would keep it categorical)
+            self.store["R_DOB"] = pd.to_datetime(self.store["R_DOB"].astype(object), errors='coerce')
+            self.store["B_DOB"] = pd.to_datetime(self.store["B_DOB"].astype(object), errors='coerce')
+            self.store["date"] = pd.to_datetime(self.store["date"].astype(object), errors='coerce')
 
-                    return pd.Series([b_age, r_age], index=["B_age", "R_age"])
-                    
-                except Exception:
-                    return pd.Series([np.nan, np.nan], index=["B_age", "R_age"])
+            def get_age(dob):
+                # Ages are only known when the date and both birth dates are
+                days = (self.store["date"] - self.store[dob]).dt.days.where(known_dates)
+                # Negative ages are birth dates scraped wrong
+                return np.floor(days.where(days >= 0) / 365.25).astype(np.float32)
 
             # Only apply if required columns exist
             required_columns = ["date", "R_DOB", "B_DOB"]
             if all(col in self.store.columns for col in required_columns):
-                self.store[["B_age", "R_age"]] = self.store[required_columns].apply(get_age, axis=1)
+                known_dates = self.store[required_columns].notna().all(axis=1)
+                self.store["B_age"] = get_age("B_DOB")
+                self.store["R_age"] = get_age("R_DOB")
                 
                 # Drop original DOB columns if they exist
                 dob_columns = ["R_DOB", "B_DOB"]
@@ -434,7 +489,120 @@ class Preprocessor:
         except Exception as e:
             print(f"Warning: Could not create fighter age features: {e}")
 
+    def _create_fighter_ratings(self):
+        """
+        The Glicko ratings of both fighters before every fight, see
+        ``RatingEngine``. Incremental runs rate the new fights from the
+        ratings after the last run, the other processed rows keep theirs.
+        """
+        if self.rows is None:
+            self.ratings = RatingEngine()
+            pre_fight = self.ratings.rate(self.fights)
+        else:
+            self.ratings = self.previous["ratings"]
+            n_new = len(self.row_hashes) - len(self.previous["row_hashes"])
+            new, old = self.rows[self.rows < n_new], self.rows[self.rows >= n_new]
+            columns = [f"{corner}_{column}" for corner in "RB" for column in RatingEngine.COLUMNS]
+            pre_fight = pd.concat(
+                [
+                    self.ratings.rate(self.fights.loc[new]),
+                    self.previous["ufc_data"].loc[old - n_new, columns].set_axis(old),
+                ]
+            )
+        self.store = self.store.join(pre_fight)
+
+    def _merge_previous_rows(self):
+        """
+        Incremental runs only: the processed rows replace or are added to the
+        rows of the last run, which are shifted by the fights added on top.
+        """
+        if self.rows is None:
+            return
+
+        previous = self.previous["ufc_data"]
+        previous.index = previous.index + (len(self.row_hashes) - len(previous))
+        computed = (
+            self.store.reindex(columns=previous.columns) if len(self.rows) else previous.iloc[:0]
+        )
+        replaced = computed.index.intersection(previous.index)
+        self._replaced = previous.loc[replaced]
+        self.store = pd.concat([computed, previous.drop(index=replaced)]).sort_index()
+
+        # Categoricals with other categories and all NaN columns are upcast by ``concat``
+        for column, dtype in previous.dtypes.items():
+            if self.store[column].dtype != dtype and (
+                dtype == np.float32 or isinstance(dtype, pd.CategoricalDtype)
+            ):
+                self.store[column] = self.store[column].astype(
+                    "category" if isinstance(dtype, pd.CategoricalDtype) else dtype
+                )
+
+    def _save_ufc_data(self):
+        """
+        Writes ``data.csv`` in the background. An incremental run that only
+        added fights writes their rows and copies the rows of the last run
+        from ``data.csv`` as they are.
+        """
+        store, rows, replaced, previous = self.store, self.rows, self._replaced, self.previous
+        path = self.UFC_DATA_PATH
+
+        def write(tmp_path):
+            # Checked once the writes submitted before are done
+            if (
+                rows is None
+                or len(replaced)
+                or not path.exists()
+                or path.stat().st_size != previous["ufc_data_size"]
+            ):
+                store.to_csv(tmp_path, index=False)
+                print(f"Successfully saved data to {path}")
+                return
+
+            with open(tmp_path, "w") as f, open(path, "r") as previous_rows:
+                f.write(store.loc[rows].to_csv(index=False))
+                previous_rows.readline()  # the header
+                shutil.copyfileobj(previous_rows, f)
+            print(f"Successfully added {len(rows)} rows to {path}")
+
+        WRITER.write(path, write)
+
+    def _update_medians(self):
+        """
+        The medians of ``_fill_nas``, from the counts of the values of the
+        last run updated with the replaced and processed rows.
+        """
+        if self.rows is None:
+            self.medians = RunningMedians()
+            self.medians.update(_fillable_values(self.store))
+        else:
+            self.medians = self.previous["medians"]
+            self.medians.update(
+                _fillable_values(self.store.loc[self.rows]), removed=_fillable_values(self._replaced)
+            )
+
+    def _save_state(self):
+        """Saves what the next incremental run needs, ``store`` is not filled yet."""
+        state = {
+            "code_version": CODE_VERSION,
+            "row_hashes": self.row_hashes.to_numpy(),
+            "detail_hashes": self.detail_hashes,
+            "ufc_data": self.store,
+            "medians": self.medians,
+            # Runs without new fights don't rate any
+            "ratings": self.ratings if self.ratings is not None else self.previous["ratings"],
+        }
+
+        def save():
+            # ``data.csv`` is written by the task before, the state isn't
+            # saved when that failed
+            state["ufc_data_size"] = self.UFC_DATA_PATH.stat().st_size
+            self.state.save(state)
+
+        WRITER.submit(save, path=self.state.PATH, after=[self.UFC_DATA_PATH])
+
     def _fill_nas(self):
+        # ``data.csv`` and the state may still be written from ``store``
+        self.store = self.store.copy()
         try:
             # Fill reach with height if missing
             if "R_Reach_cms" in self.store.columns and "R_Height_cms" in self.store.columns:
@@ -442,20 +610,19 @@ class Preprocessor:
             if "B_Reach_cms" in self.store.columns and "B_Height_cms" in self.store.columns:
                 self.store["B_Reach_cms"].fillna(self.store["B_Height_cms"], inplace=True)
 
-            # Select numeric columns (excluding specific columns)
-            numeric_columns = self.store.select_dtypes(include=np.number).columns
-            exclude_columns = ['total_time_fought(seconds)']
-            numeric_columns = [col for col in numeric_columns if col not in exclude_columns]
+            numeric_columns = _fillable_columns(self.store)
 
-            # Fill NaN values for numeric columns using median
+            # Fill NaN values for numeric columns using median, see ``_update_medians``
             if numeric_columns:
-                self.store[numeric_columns] = self.store[numeric_columns].fillna(self.store[numeric_columns].median())
+                self.store[numeric_columns] = self.store[numeric_columns].fillna(
+                    self.medians.medians(numeric_columns)
+                )
 
             # Fill stance columns
             if "R_Stance" in self.store.columns:
-                self.store["R_Stance"].fillna("Orthodox", inplace=True)
+                self.store["R_Stance"] = _fill_category(self.store["R_Stance"], "Orthodox")
             if "B_Stance" in self.store.columns:
-                self.store["B_Stance"].fillna("Orthodox", inplace=True)
+                self.store["B_Stance"] = _fill_category(self.store["B_Stance"], "Orthodox")
                 
         except Exception as e:
             print(f"Warning: Could not fill all NaN values: {e}")
@@ -470,26 +637,43 @@ class Preprocessor:
             categorical_columns = ["weight_class", "B_Stance", "R_Stance"]
             existing_categorical = [col for col in categorical_columns if col in self.store.columns]
             
+            dummies = None
             if existing_categorical:
-                dummies = pd.get_dummies(self.store[existing_categorical])
-                self.store = pd.concat([self.store, dummies], axis=1)
+                # Categories of the dropped draws would otherwise get all-zero columns
+                dummies = pd.get_dummies(
+                    self.store[existing_categorical].apply(
+                        lambda column: column.astype("category").cat.remove_unused_categories()
+                    ),
+                    dtype=np.uint8,
+                )
             
-            # Drop original columns if they exist
+            # Drop original columns if they exist, the table is built with a single concat
             columns_to_drop = [
                 "weight_class", "B_Stance", "R_Stance", "Referee", 
                 "location", "date", "R_fighter", "B_fighter"
             ]
             existing_columns = [col for col in columns_to_drop if col in self.store.columns]
-            if existing_columns:
-                self.store.drop(columns=existing_columns, inplace=True)
+            self.store = pd.concat([self.store.drop(columns=existing_columns), dummies], axis=1)
                 
         except Exception as e:
             print(f"Warning: Could not drop all non-essential columns: {e}")
 
     def _save(self, filepath):
-        try:
-            self.store.to_csv(filepath, index=False)
+        """Writes ``store`` to ``filepath`` in the background."""
+        store = self.store
+
+        def write(tmp_path):
+            store.to_csv(tmp_path, index=False)
             print(f"Successfully saved data to {filepath}")
-        except Exception as e:
-            print(f"Error saving file: {e}")
-            raise
\ No newline at end of file
+
+        WRITER.write(filepath, write)
+
+    def _wait_for_writes(self):
+        WRITER.wait(
+            [
+                self.UFC_DATA_PATH,
+                self.state.PATH,
+                self.PREPROCESSED_DATA_PATH,
+                self.FEATURE_STORE_PATH,
+            ]
+        )
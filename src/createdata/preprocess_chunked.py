@@ -0,0 +1,368 @@
+import concurrent.futures
+import copy
+import io
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.createdata import fight_records
+from src.createdata.feature_store import FighterFeatureStore, feature_name
+from src.createdata.persist import WRITER
+from src.createdata.preprocess import (Preprocessor, _fill_category,
+                                       _fillable_values)
+from src.createdata.preprocess_fighter_data import (FighterDetailProcessor,
+                                                    to_cms, to_pounds)
+from src.createdata.preprocess_state import RunningMedians
+from src.createdata.ratings import RatingEngine
+
+AVERAGES = FighterDetailProcessor.NUMERICAL_COLUMNS
+# Counted over the fights before every fight, in the order of ``data.csv``
+TOTALS = ["total_rounds_fought", "total_title_bouts"]
+STREAKS = ["current_win_streak", "current_lose_streak", "longest_win_streak"]
+RESULTS = ["wins", "losses", "draw"]
+# What is kept of a fighter between chunks, besides their averages
+COUNTS = TOTALS + STREAKS + RESULTS + FighterDetailProcessor.WIN_BY_COLUMNS + ["fights", "win_streak"]
+# One-hot encoded in ``preprocessed_data.csv``
+DUMMY_COLUMNS = ["weight_class", "B_Stance", "R_Stance"]
+
+
+def _chunk_bounds(path: Path, chunk_size: int) -> Tuple[bytes, List[Tuple[int, int, int]]]:
+    """
+    The header of a fight data file and the byte range and the first row of
+    every chunk of ``chunk_size`` fights. Fields never hold line breaks.
+    """
+    bounds = []
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = position = len(header)
+        first_row = n_rows = 0
+        for line in f:
+            position += len(line)
+            n_rows += 1
+            if n_rows % chunk_size == 0:
+                bounds.append((start, position, first_row))
+                start, first_row = position, n_rows
+        if position > start:
+            bounds.append((start, position, first_row))
+    return header, bounds
+
+
+def _read_chunk(path: Path, header: bytes, start: int, end: int, first_row: int) -> pd.DataFrame:
+    """The fights of a chunk, typed like ``read_fight_data`` and indexed by their row."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    columns = pd.read_csv(io.BytesIO(header), sep=";", nrows=0).columns
+    fights = fight_records.parse_fight_data(io.BytesIO(header + data), columns)
+    fights.index = pd.RangeIndex(first_row, first_row + len(fights))
+    return fights
+
+
+class ChunkedPreprocessor(Preprocessor):
+    """
+    ``Preprocessor`` for fight histories that don't fit in memory, it writes
+    the same ``data.csv`` and ``preprocessed_data.csv``.
+
+    The raw fights are read from disk ``chunk_size`` fights at a time, the
+    oldest chunk first. Every fighter level feature is a running one (the
+    averages, counts and streaks of ``FighterDetailProcessor`` and the
+    ratings), the features of a chunk are computed from its fights and what
+    is kept of every fighter after the chunks before: their averages and
+    counts. The averages continue exactly from the kept ones, the stats of
+    the fights have no NaNs.
+
+    The rows of every chunk are saved to a temporary file, a second pass
+    fills their NaNs with the medians of all rows and one-hot encodes them
+    with the categories of all rows. The next chunk is read and the rows are
+    saved on other threads while a chunk is processed, the second pass runs
+    on ``workers`` threads.
+
+    Every fight is processed, there is no incremental mode and the feature
+    store isn't updated.
+    """
+
+    def __init__(self, chunk_size: int = 50_000, trace_memory: bool = True, workers: Optional[int] = None):
+        super().__init__(trace_memory=trace_memory, workers=workers)
+        self.chunk_size = chunk_size
+        # The averages and counts of every fighter after the chunks so far
+        self.fighter_state = pd.DataFrame(
+            {
+                **{column: pd.Series(dtype=np.float64) for column in AVERAGES},
+                **{column: pd.Series(dtype=np.int64) for column in COUNTS},
+            },
+            index=pd.Index([], dtype=np.int32, name="fighter_id"),
+        )
+        self._categories = {column: {} for column in DUMMY_COLUMNS}
+
+    def process_raw_data(
+        self, fights: Optional[pd.DataFrame] = None, fighter_details: Optional[pd.DataFrame] = None
+    ):
+        """
+        ``fighter_details`` as in ``Preprocessor.process_raw_data``, the
+        fights are always read from ``TOTAL_EVENT_AND_FIGHTS_PATH`` in chunks.
+        """
+        self.recorder.start_run()
+
+        print("Reading Files")
+        WRITER.wait([self.TOTAL_EVENT_AND_FIGHTS_PATH])
+        self._step(self._read_fighter_details, fighter_details)
+        print("Drop columns that contain information not yet occurred")
+        self._step(self._drop_future_fighter_details_columns)
+        self._step(self._convert_fighter_details)
+
+        with tempfile.TemporaryDirectory(dir=self.UFC_DATA_PATH.parent) as parts:
+            self._step(self._process_chunks, Path(parts))
+            print("Fill NaNs and dropping Non Essential Columns")
+            self._step(self._save_chunks, Path(parts))
+        print(f"Saved the metrics of every step to {self.recorder.LOG_PATH}")
+        print("Successfully preprocessed and saved ufc data!\n")
+
+    def _convert_fighter_details(self):
+        """The fighter details as ``FighterDetailProcessor`` joins them."""
+        fighter_details = self.fighter_details[~self.fighter_details.index.duplicated()].copy()
+        fighter_details["Height_cms"] = fighter_details["Height"].apply(to_cms).astype(np.float32)
+        fighter_details["Reach_cms"] = fighter_details["Reach"].apply(to_cms).astype(np.float32)
+        fighter_details["Weight_lbs"] = fighter_details["Weight"].apply(to_pounds).astype(np.float32)
+        self.fighter_details = fighter_details.drop(["Height", "Weight", "Reach"], axis=1)
+
+    def _process_chunks(self, parts: Path):
+        """Saves the rows of ``data.csv`` of every chunk to ``parts``, oldest chunk first."""
+        header, bounds = _chunk_bounds(self.TOTAL_EVENT_AND_FIGHTS_PATH, self.chunk_size)
+        print(f"Processing {len(bounds)} chunks of {self.chunk_size} fights")
+        self.ratings = RatingEngine()
+        self.medians = RunningMedians()
+
+        bounds = bounds[::-1]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as reader:
+            read = lambda chunk: reader.submit(
+                _read_chunk, self.TOTAL_EVENT_AND_FIGHTS_PATH, header, *bounds[chunk]
+            )
+            next_chunk = read(0) if bounds else None
+            for chunk in range(len(bounds)):
+                self.fights = next_chunk.result()
+                if chunk + 1 < len(bounds):
+                    next_chunk = read(chunk + 1)
+                self._process_chunk()
+
+                store, path = self.store, parts / f"{len(bounds) - 1 - chunk}.pkl"
+                WRITER.write(path, lambda tmp_path, store=store: store.to_pickle(tmp_path))
+        WRITER.wait()
+
+    def _process_chunk(self):
+        """The steps of ``Preprocessor`` that make the rows of ``data.csv``, for a chunk."""
+        self._replacing_winner_nans_draw()
+        self._get_total_time_fought()
+        self._store_compiled_fighter_data_in_another_DF()
+        self._create_winner_feature()
+        self._create_fighter_attributes()
+        self._create_fighter_age()
+        self._create_fighter_ratings()
+        self._update_medians()
+        self._collect_categories()
+
+    def _create_fighter_attributes(self):
+        """
+        Joins the fighter level features of ``FighterDetailProcessor``,
+        computed from the fights of the chunk and the state of the fighters.
+        """
+        appearances = FighterFeatureStore._appearances(self.fights)
+        fighter = appearances["hero_fighter_id"]
+        state = self.fighter_state.reindex(pd.unique(fighter))
+        averages, last_averages = self._running_averages(appearances, state)
+        counts, last_counts = self._running_counts(appearances, state)
+        self.fighter_state = pd.concat(
+            [
+                self.fighter_state.drop(index=state.index, errors="ignore"),
+                pd.concat([last_averages, last_counts], axis=1),
+            ]
+        )
+
+        features = pd.concat([averages, counts], axis=1)
+        features.columns = [feature_name(column) for column in features.columns]
+        corners = []
+        for corner in "BR":
+            rows = appearances["corner"].to_numpy() == corner
+            corners.append(
+                features[rows]
+                .set_axis(appearances.loc[rows, "fight"].to_numpy())
+                .join(self.fighter_details, on=fighter[rows].to_numpy())
+                .add_prefix(f"{corner}_")
+            )
+        self.store = self.store.join(corners[0].join(corners[1], how="outer"), how="outer")
+
+    @staticmethod
+    def _running_averages(appearances: pd.DataFrame, state: pd.DataFrame):
+        """
+        The averages of every fighter before every fight, and after their
+        last one. The kept averages are the first observation of a fighter.
+        """
+        kept = state[AVERAGES].astype(np.float64).dropna(how="all")
+        observations = pd.concat(
+            [
+                kept.rename_axis("hero_fighter_id").reset_index().assign(position=-1),
+                appearances[["hero_fighter_id"] + AVERAGES]
+                .astype({column: np.float64 for column in AVERAGES})
+                .assign(position=np.arange(len(appearances))),
+            ]
+        ).sort_values(["hero_fighter_id", "position"], kind="mergesort")
+        observations.index = pd.RangeIndex(len(observations))
+        fighter = observations["hero_fighter_id"]
+
+        after = (
+            observations[AVERAGES]
+            .groupby(fighter, sort=False)
+            .ewm(span=3, adjust=False)
+            .mean()
+            .droplevel(0)
+            .sort_index()
+        )
+        before = after.groupby(fighter, sort=False).shift(1)
+        is_fight = (observations["position"] >= 0).to_numpy()
+        last = after.groupby(fighter, sort=False).tail(1)
+        return (
+            before[is_fight].astype(np.float32).set_axis(appearances.index),
+            last.set_axis(fighter[last.index].to_numpy()),
+        )
+
+    @staticmethod
+    def _running_counts(appearances: pd.DataFrame, state: pd.DataFrame):
+        """
+        The counts and streaks of every fighter before every fight, and after
+        their last one, like ``FighterDetailProcessor._get_result_stats``.
+        """
+        fighter = appearances["hero_fighter_id"]
+        by_fighter = lambda frame: frame.groupby(fighter, sort=False)
+        kept = state[COUNTS].fillna(0).astype(np.int64).reindex(fighter.to_numpy())
+        kept.index = appearances.index
+
+        # The winner is a name, the fighter won if it's their name in that fight
+        won = (
+            appearances["Winner"].astype(object) == appearances["hero_fighter"].astype(object)
+        ).astype(np.int64)
+        lost = 1 - won
+        win_by = pd.get_dummies(appearances["win_by"], prefix="win_by")
+        increments = pd.DataFrame(
+            {
+                "total_rounds_fought": appearances["last_round"].astype(np.int64),
+                "total_title_bouts": (appearances["title_bout"] == True).astype(np.int64),
+                "wins": won,
+                "losses": lost,
+                "draw": 0,
+                **{
+                    column: won * (win_by[column] if column in win_by.columns else 0)
+                    for column in FighterDetailProcessor.WIN_BY_COLUMNS
+                },
+                "fights": 1,
+            },
+            index=appearances.index,
+        )
+        after = by_fighter(increments).cumsum() + kept[increments.columns]
+
+        # The current streaks of ``FighterDetailProcessor`` are the streaks a
+        # fighter started their career with, they only grow while every fight
+        # of the fighter so far was won (lost)
+        for streak, results in (("current_win_streak", won), ("current_lose_streak", lost)):
+            growing = (kept[streak] == kept["fights"]).astype(np.int64)
+            after[streak] = kept[streak] + growing * by_fighter(by_fighter(results).cumprod()).cumsum()
+        # The streak of wins up to every fight, the first one continues the kept streak
+        since_loss = by_fighter(lost).cumsum()
+        after["win_streak"] = won.groupby([fighter, since_loss]).cumsum() + kept["win_streak"].where(
+            since_loss == 0, 0
+        )
+        after["longest_win_streak"] = np.maximum(
+            kept["longest_win_streak"], by_fighter(after["win_streak"]).cummax()
+        )
+
+        before = by_fighter(after[COUNTS]).shift(1).fillna(kept[COUNTS]).astype(np.int64)
+        last = after[COUNTS].groupby(fighter, sort=False).tail(1)
+        counts = before[TOTALS + STREAKS + RESULTS + FighterDetailProcessor.WIN_BY_COLUMNS]
+        # Like ``FighterDetailProcessor``, whose first fights have no win methods to sum
+        counts = counts.astype({column: np.float64 for column in FighterDetailProcessor.WIN_BY_COLUMNS})
+        return counts, last.set_axis(fighter[last.index].to_numpy())
+
+    def _create_fighter_ratings(self):
+        self.store = self.store.join(self.ratings.rate(self.fights))
+
+    def _update_medians(self):
+        self.medians.update(_fillable_values(self.store))
+
+    def _collect_categories(self):
+        """The categories of the rows of ``preprocessed_data.csv``, filled like ``_fill_nas``."""
+        played = self.store[self.store["Winner"] != "Draw"]
+        for column in DUMMY_COLUMNS:
+            values = played[column]
+            if column != "weight_class":
+                values = _fill_category(values, "Orthodox")
+            used = set(values.dropna())
+            # In the order of the categories, of every chunk
+            self._categories[column].update(
+                dict.fromkeys(category for category in values.cat.categories if category in used)
+            )
+
+    def _save_chunks(self, parts: Path):
+        """
+        Writes ``data.csv`` and ``preprocessed_data.csv`` from the rows of
+        every chunk, newest first, filled and encoded on ``workers`` threads.
+        """
+        paths = sorted(parts.glob("*.pkl"), key=lambda path: int(path.stem))
+        # The categories of the fights are sorted, the stances' those of the fighter details
+        self._categories["weight_class"] = dict.fromkeys(sorted(self._categories["weight_class"]))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            headers = list(executor.map(self._save_chunk, paths))[0]
+
+        for path, header, suffix in zip(
+            (self.UFC_DATA_PATH, self.PREPROCESSED_DATA_PATH), headers, (".data.csv", ".preprocessed.csv")
+        ):
+
+            def write(tmp_path, header=header, suffix=suffix):
+                with open(tmp_path, "w") as f:
+                    f.write(header)
+                    for part in paths:
+                        with open(part.with_suffix(suffix), "r") as rows:
+                            shutil.copyfileobj(rows, f)
+                print(f"Successfully saved data to {path}")
+
+            WRITER.write(path, write)
+        WRITER.wait([self.UFC_DATA_PATH, self.PREPROCESSED_DATA_PATH])
+
+    def _save_chunk(self, path: Path) -> Tuple[str, str]:
+        """
+        Writes the rows of a chunk of ``data.csv`` and of
+        ``preprocessed_data.csv`` next to ``path``, returns their headers.
+        """
+        chunk = copy.copy(self)
+        chunk.store = pd.read_pickle(path)
+        headers = [chunk.store.iloc[:0].to_csv(index=False)]
+        chunk.store.to_csv(path.with_suffix(".data.csv"), index=False, header=False)
+
+        chunk._fill_nas()
+        chunk._drop_non_essential_cols()
+        headers.append(chunk.store.iloc[:0].to_csv(index=False))
+        chunk.store.to_csv(path.with_suffix(".preprocessed.csv"), index=False, header=False)
+        return headers
+
+    def _drop_non_essential_cols(self):
+        """``Preprocessor._drop_non_essential_cols`` with the categories of every chunk."""
+        self.store = self.store.drop(self.store.index[self.store["Winner"] == "Draw"])
+        dummies = pd.get_dummies(
+            pd.DataFrame(
+                {
+                    column: pd.Categorical(self.store[column], categories=list(self._categories[column]))
+                    for column in DUMMY_COLUMNS
+                },
+                index=self.store.index,
+            ),
+            dtype=np.uint8,
+        )
+        columns_to_drop = [
+            "weight_class", "B_Stance", "R_Stance", "Referee",
+            "location", "date", "R_fighter", "B_fighter"
+        ]
+        self.store = pd.concat([self.store.drop(columns=columns_to_drop), dummies], axis=1)
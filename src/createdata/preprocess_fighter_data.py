@@ -1,14 +1,163 @@
+import concurrent.futures
+import heapq
 import re
+from typing import List
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
 
+def to_cms(X):
+    """A height like ``5' 11"`` or a reach like ``72.0"`` in centimeters."""
+    if X is np.NaN:
+        return X
+
+    elif len(X.split("'")) == 2:
+        feet = float(X.split("'")[0])
+        inches = int(X.split("'")[1].replace(" ", "").replace('"', ""))
+        return (feet * 30.48) + (inches * 2.54)
+
+    else:
+        return float(X.replace('"', "")) * 2.54
+
+
+def to_pounds(X):
+    return float(X.replace(" lbs.", "")) if X is not np.NaN else X
+
+
+# Fewer fighters per worker aren't worth starting the worker processes
+MIN_FIGHTERS_PER_WORKER = 50
+
+# Shared, read-only state of the shard worker processes, sent once per worker
+_worker_processor = None
+
+
+def _init_worker(fights, rows):
+    global _worker_processor
+    _worker_processor = FighterDetailProcessor.__new__(FighterDetailProcessor)
+    _worker_processor.fights = fights
+    _worker_processor.rows = rows
+    _worker_processor._group_fights()
+
+
+def _calculate_shard(fighters):
+    """The red and blue rows of the fighters of a shard, ``None`` if there are none."""
+    red_rows, blue_rows = _worker_processor._calculate_rows(fighters)
+    return (
+        pd.concat(red_rows) if red_rows else None,
+        pd.concat(blue_rows) if blue_rows else None,
+        len(fighters),
+    )
+
+
+def balanced_shards(fight_counts: pd.Series, n_shards: int) -> List[list]:
+    """
+    The fighters of ``fight_counts`` in at most ``n_shards`` shards of about
+    as many fights: the fighter with the most fights goes to the shard with
+    the fewest fights so far.
+    """
+    shards = [[] for _ in range(n_shards)]
+    loads = [(0, shard) for shard in range(n_shards)]
+    for fighter, count in fight_counts.sort_values(ascending=False, kind="mergesort").items():
+        load, shard = heapq.heappop(loads)
+        shards[shard].append(fighter)
+        heapq.heappush(loads, (load + count, shard))
+    return [shard for shard in shards if shard]
+
+
 class FighterDetailProcessor:
-    def __init__(self, fights, fighter_details):
+    WIN_BY_COLUMNS = [
+        "win_by_Decision - Majority",
+        "win_by_Decision - Split",
+        "win_by_Decision - Unanimous",
+        "win_by_KO/TKO",
+        "win_by_Submission",
+        "win_by_TKO - Doctor's Stoppage",
+    ]
+
+    RESULT_STATS = [
+        "current_win_streak",
+        "current_lose_streak",
+        "longest_win_streak",
+        "wins",
+        "losses",
+        "draw",
+    ]
+    # Averaged over the fights before every fight
+    NUMERICAL_COLUMNS = [
+        "hero_KD",
+        "opp_KD",
+        "hero_SIG_STR_pct",
+        "opp_SIG_STR_pct",
+        "hero_TD_pct",
+        "opp_TD_pct",
+        "hero_SUB_ATT",
+        "opp_SUB_ATT",
+        "hero_REV",
+        "opp_REV",
+        "hero_SIG_STR._att",
+        "hero_SIG_STR._landed",
+        "opp_SIG_STR._att",
+        "opp_SIG_STR._landed",
+        "hero_TOTAL_STR._att",
+        "hero_TOTAL_STR._landed",
+        "opp_TOTAL_STR._att",
+        "opp_TOTAL_STR._landed",
+        "hero_TD_att",
+        "hero_TD_landed",
+        "opp_TD_att",
+        "opp_TD_landed",
+        "hero_HEAD_att",
+        "hero_HEAD_landed",
+        "opp_HEAD_att",
+        "opp_HEAD_landed",
+        "hero_BODY_att",
+        "hero_BODY_landed",
+        "opp_BODY_att",
+        "opp_BODY_landed",
+        "hero_LEG_att",
+        "hero_LEG_landed",
+        "opp_LEG_att",
+        "opp_LEG_landed",
+        "hero_DISTANCE_att",
+        "hero_DISTANCE_landed",
+        "opp_DISTANCE_att",
+        "opp_DISTANCE_landed",
+        "hero_CLINCH_att",
+        "hero_CLINCH_landed",
+        "opp_CLINCH_att",
+        "opp_CLINCH_landed",
+        "hero_GROUND_att",
+        "hero_GROUND_landed",
+        "opp_GROUND_att",
+        "opp_GROUND_landed",
+        "hero_CTRL_time(seconds)",
+        "opp_CTRL_time(seconds)",
+        "total_time_fought(seconds)",
+    ]
+
+    def __init__(self, fights, fighter_details, cache=None, rows=None, workers=1):
+        """
+        ``cache`` is a :class:`~src.createdata.feature_cache.FighterFeatureCache`
+        providing the rows of the fighters whose fight history didn't change.
+
+        ``rows`` restricts the features to these fights, by default they are
+        computed for every fight. ``fights`` must still hold every fight of
+        the fighters of these fights.
+
+        Fighters are grouped by ``R_fighter_id``/``B_fighter_id`` and the
+        ``fighter_details`` are indexed by fighter ID, namesakes are
+        different fighters.
+
+        With ``workers`` processes the fighters are computed in shards of
+        about as many fights, one per worker, the features are the same.
+        """
         self.fights = fights
         self.fighter_details = fighter_details
+        self.cache = cache
+        self.rows = None if rows is None else set(rows)
+        self.workers = workers
         self._one_hot_encode_win()
         self.temp_red_frame, self.temp_blue_frame = self._calculate_fighter_data()
         self._convert_height_reach_to_cms()
@@ -18,102 +167,94 @@ class FighterDetailProcessor:
 
     def _one_hot_encode_win(self):
 
-        self.fights = pd.concat(
-            [self.fights, pd.get_dummies(self.fights["win_by"], prefix="win_by")],
-            axis=1,
-        )
-        self.fights.drop(["win_by"], axis=1, inplace=True)
+        dummies = pd.get_dummies(self.fights["win_by"], prefix="win_by", dtype=np.uint8)
+        # Methods that don't occur in these fights still get their column
+        missing = [column for column in self.WIN_BY_COLUMNS if column not in dummies.columns]
+        dummies = dummies.reindex(columns=list(dummies.columns) + missing, fill_value=0)
+        self.fights = pd.concat([self.fights.drop(columns=["win_by"]), dummies], axis=1)
 
     def _get_fighters(self):
 
-        red_fighters = self.fights["R_fighter"].value_counts().index
-        blue_fighters = self.fights["B_fighter"].value_counts().index
+        return list(np.union1d(self.fights["R_fighter_id"], self.fights["B_fighter_id"]))
+
+    def _get_fighters_of_rows(self):
 
-        return list(set(red_fighters) | set(blue_fighters))
+        fights = self.fights.loc[sorted(self.rows)]
+        return list(np.union1d(fights["R_fighter_id"], fights["B_fighter_id"]))
 
     def _calculate_fighter_data(self):
 
-        temp_blue_frame = pd.DataFrame()
-        temp_red_frame = pd.DataFrame()
-
-        fighters = self._get_fighters()
-        self.red = self.fights.groupby("R_fighter")
-        self.blue = self.fights.groupby("B_fighter")
-
-        result_stats = [
-            "current_win_streak",
-            "current_lose_streak",
-            "longest_win_streak",
-            "wins",
-            "losses",
-            "draw",
-        ]
-
-        win_by_columns = [
-            "win_by_Decision - Majority",
-            "win_by_Decision - Split",
-            "win_by_Decision - Unanimous",
-            "win_by_KO/TKO",
-            "win_by_Submission",
-            "win_by_TKO - Doctor's Stoppage",
-        ]
-
-        Numerical_columns = [
-            "hero_KD",
-            "opp_KD",
-            "hero_SIG_STR_pct",
-            "opp_SIG_STR_pct",
-            "hero_TD_pct",
-            "opp_TD_pct",
-            "hero_SUB_ATT",
-            "opp_SUB_ATT",
-            "hero_REV",
-            "opp_REV",
-            "hero_SIG_STR._att",
-            "hero_SIG_STR._landed",
-            "opp_SIG_STR._att",
-            "opp_SIG_STR._landed",
-            "hero_TOTAL_STR._att",
-            "hero_TOTAL_STR._landed",
-            "opp_TOTAL_STR._att",
-            "opp_TOTAL_STR._landed",
-            "hero_TD_att",
-            "hero_TD_landed",
-            "opp_TD_att",
-            "opp_TD_landed",
-            "hero_HEAD_att",
-            "hero_HEAD_landed",
-            "opp_HEAD_att",
-            "opp_HEAD_landed",
-            "hero_BODY_att",
-            "hero_BODY_landed",
-            "opp_BODY_att",
-            "opp_BODY_landed",
-            "hero_LEG_att",
-            "hero_LEG_landed",
-            "opp_LEG_att",
-            "opp_LEG_landed",
-            "hero_DISTANCE_att",
-            "hero_DISTANCE_landed",
-            "opp_DISTANCE_att",
-            "opp_DISTANCE_landed",
-            "hero_CLINCH_att",
-            "hero_CLINCH_landed",
-            "opp_CLINCH_att",
-            "opp_CLINCH_landed",
-            "hero_GROUND_att",
-            "hero_GROUND_landed",
-            "opp_GROUND_att",
-            "opp_GROUND_landed",
-            "hero_CTRL_time(seconds)",
-            "opp_CTRL_time(seconds)",
-            "total_time_fought(seconds)",
-        ]
+        # One row per fight of every fighter, concatenated once at the end
+        blue_rows = []
+        red_rows = []
+
+        if self.rows is not None:
+            fighters = self._get_fighters_of_rows()
+        else:
+            fighters = self._get_fighters()
+        if self.rows is None and self.cache is not None:
+            cached_red, cached_blue, fighters = self.cache.lookup(self.fights, fighters)
+            red_rows += [cached_red] if cached_red is not None else []
+            blue_rows += [cached_blue] if cached_blue is not None else []
 
         print("Creating Fighter Level Features")
-        for fighter_name in tqdm(fighters):
-            fighter_red = self._get_fighter_red(fighter_name)
-            fighter_blue = self._get_fighter_blue(fighter_name)
+        n_workers = min(self.workers, len(fighters) // MIN_FIGHTERS_PER_WORKER)
+        if n_workers > 1:
+            red_rows, blue_rows = self._calculate_sharded(fighters, n_workers, red_rows, blue_rows)
+        else:
+            self._group_fights()
+            computed_red, computed_blue = self._calculate_rows(tqdm(fighters))
+            red_rows += computed_red
+            blue_rows += computed_blue
+
+        temp_red_frame = pd.concat(red_rows) if red_rows else pd.DataFrame()
+        temp_blue_frame = pd.concat(blue_rows) if blue_rows else pd.DataFrame()
+        if self.rows is None and self.cache is not None:
+            self.cache.update(temp_red_frame, temp_blue_frame)
+        return temp_red_frame, temp_blue_frame
+
+    def _group_fights(self):
+        self.red = self.fights.groupby("R_fighter_id")
+        self.blue = self.fights.groupby("B_fighter_id")
+
+    def _calculate_sharded(self, fighters, n_workers, red_rows, blue_rows):
+        """
+        The rows of ``fighters`` computed on ``n_workers`` processes, added
+        to ``red_rows`` and ``blue_rows`` and sorted by fight.
+        """
+        fights = pd.concat([self.fights["R_fighter_id"], self.fights["B_fighter_id"]])
+        shards = balanced_shards(fights.value_counts().reindex(fighters), n_workers)
+
+        with tqdm(total=len(fighters)) as progress, concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(self.fights, self.rows),
+        ) as executor:
+            futures = [executor.submit(_calculate_shard, shard) for shard in shards]
+            for future in concurrent.futures.as_completed(futures):
+                progress.update(future.result()[2])
+
+        # Merged in the order of the fights, whichever shard finished first
+        for future in futures:
+            shard_red, shard_blue, _ = future.result()
+            red_rows += [shard_red] if shard_red is not None else []
+            blue_rows += [shard_blue] if shard_blue is not None else []
+        red_rows = [pd.concat(red_rows).sort_index(kind="mergesort")] if red_rows else []
+        blue_rows = [pd.concat(blue_rows).sort_index(kind="mergesort")] if blue_rows else []
+        return red_rows, blue_rows
+
+    def _calculate_rows(self, fighters):
+        """The rows of every fight of ``fighters``, in ``rows`` if it is given."""
+        blue_rows = []
+        red_rows = []
+
+        result_stats = self.RESULT_STATS
+        win_by_columns = self.WIN_BY_COLUMNS
+        Numerical_columns = self.NUMERICAL_COLUMNS
+
+        for fighter_id in fighters:
+            fighter_red = self._get_fighter_red(fighter_id)
+            fighter_blue = self._get_fighter_blue(fighter_id)
             fighter_index = None
 
             if fighter_red is None:
@@ -125,11 +266,16 @@ class FighterDetailProcessor:
             else:
                 fighter = pd.concat([fighter_red, fighter_blue]).sort_index()
 
-            fighter["Winner"] = fighter["Winner"].apply(
-                lambda X: "hero" if X == fighter_name else "opp"
+            # The winner is a name, the fighter won if it's their name in that fight
+            fighter["Winner"] = np.where(
+                fighter["Winner"].astype(object) == fighter["hero_fighter"].astype(object),
+                "hero",
+                "opp",
             )
 
             for i, index in enumerate(fighter.index):
+                if self.rows is not None and index not in self.rows:
+                    continue
 
                 fighter_slice = fighter[(i + 1) :].sort_index(ascending=False)
                 s = (
@@ -137,38 +283,41 @@ class FighterDetailProcessor:
                     .ewm(span=3, adjust=False)
                     .mean()
                     .tail(1)
+                    # Averages are rates, float32 like the rates they average
+                    .astype(np.float32)
                 )
                 if len(s) != 0:
                     pass
                 else:
                     s.loc[len(s)] = [np.NaN for _ in s.columns]
-                s["total_rounds_fought"] = fighter_slice["last_round"].sum()
-                s["total_title_bouts"] = fighter_slice[
-                    fighter_slice["title_bout"] == True
-                ]["title_bout"].count()
-                s["hero_fighter"] = fighter_name
                 results = self._get_result_stats(list(fighter_slice["Winner"]))
-                for result_stat, result in zip(result_stats, results):
-                    s[result_stat] = result
                 win_by_results = fighter_slice[fighter_slice["Winner"] == "hero"][
                     win_by_columns
                 ].sum()
-                for win_by_column, win_by_result in zip(win_by_columns, win_by_results):
-                    s[win_by_column] = win_by_result
+                # Added at once, every column added to ``s`` on its own copies it
+                s = s.assign(
+                    total_rounds_fought=fighter_slice["last_round"].sum(),
+                    total_title_bouts=fighter_slice[fighter_slice["title_bout"] == True][
+                        "title_bout"
+                    ].count(),
+                    hero_fighter=fighter_id,
+                    **dict(zip(result_stats, results)),
+                    **dict(zip(win_by_columns, win_by_results)),
+                )
 
                 s.index = [index]
 
                 if fighter_index is None:
                     if index in fighter_blue.index:
-                        temp_blue_frame = pd.concat([temp_blue_frame, s])
+                        blue_rows.append(s)
                     elif index in fighter_red.index:
-                        temp_red_frame = pd.concat([temp_red_frame, s])
+                        red_rows.append(s)
                 elif fighter_index == "blue":
-                    temp_blue_frame = pd.concat([temp_blue_frame, s])
+                    blue_rows.append(s)
                 elif fighter_index == "red":
-                    temp_red_frame = pd.concat([temp_red_frame, s])
+                    red_rows.append(s)
 
-        return temp_red_frame, temp_blue_frame
+        return red_rows, blue_rows
 
     @staticmethod
     def lreplace(pattern, sub, string):
@@ -177,10 +326,10 @@ class FighterDetailProcessor:
         """
         return re.sub("^%s" % pattern, sub, string)
 
-    def _get_fighter_red(self, fighter_name):
+    def _get_fighter_red(self, fighter_id):
 
         try:
-            fighter_red = self.red.get_group(fighter_name)
+            fighter_red = self.red.get_group(fighter_id)
         except:
             return None
 
@@ -196,10 +345,10 @@ class FighterDetailProcessor:
         fighter_red = fighter_red.rename(rename_columns, axis="columns")
         return fighter_red
 
-    def _get_fighter_blue(self, fighter_name):
+    def _get_fighter_blue(self, fighter_id):
 
         try:
-            fighter_blue = self.blue.get_group(fighter_name)
+            fighter_blue = self.blue.get_group(fighter_id)
         except:
             return None
 
@@ -253,56 +402,26 @@ class FighterDetailProcessor:
         )
 
     def _convert_height_reach_to_cms(self):
-        def convert_to_cms(X):
-
-            if X is np.NaN:
-                return X
-
-            elif len(X.split("'")) == 2:
-                feet = float(X.split("'")[0])
-                inches = int(X.split("'")[1].replace(" ", "").replace('"', ""))
-                return (feet * 30.48) + (inches * 2.54)
-
-            else:
-                return float(X.replace('"', "")) * 2.54
-
-        self.fighter_details["Height_cms"] = self.fighter_details["Height"].apply(
-            convert_to_cms
+        # ``apply`` of a categorical column returns a categorical
+        self.fighter_details["Height_cms"] = (
+            self.fighter_details["Height"].apply(to_cms).astype(np.float32)
         )
-        self.fighter_details["Reach_cms"] = self.fighter_details["Reach"].apply(
-            convert_to_cms
+        self.fighter_details["Reach_cms"] = (
+            self.fighter_details["Reach"].apply(to_cms).astype(np.float32)
         )
 
     def _convert_weight_to_pounds(self):
-        self.fighter_details["Weight_lbs"] = self.fighter_details["Weight"].apply(
-            lambda X: float(X.replace(" lbs.", "")) if X is not np.NaN else X
+        self.fighter_details["Weight_lbs"] = (
+            self.fighter_details["Weight"].apply(to_pounds).astype(np.float32)
         )
         self.fighter_details.drop(["Height", "Weight", "Reach"], axis=1, inplace=True)
 
     def _merge_frames(self):
 
-        self.fighter_details.reset_index(inplace=True)
-        self.temp_red_frame.reset_index(inplace=True)
-        self.temp_blue_frame.reset_index(inplace=True)
-
-        self.temp_blue_frame = self.temp_blue_frame.merge(
-            self.fighter_details,
-            left_on="hero_fighter",
-            right_on="fighter_name",
-            how="left",
-        )
-        self.temp_blue_frame.set_index("index", inplace=True)
-
-        self.temp_red_frame = self.temp_red_frame.merge(
-            self.fighter_details,
-            left_on="hero_fighter",
-            right_on="fighter_name",
-            how="left",
-        )
-        self.temp_red_frame.set_index("index", inplace=True)
-
-        self.temp_blue_frame.drop("fighter_name", axis=1, inplace=True)
-        self.temp_red_frame.drop("fighter_name", axis=1, inplace=True)
+        # Joining on the index of ``fighter_details`` keeps the index of the
+        # fights without resetting and setting it again
+        self.temp_blue_frame = self.temp_blue_frame.join(self.fighter_details, on="hero_fighter")
+        self.temp_red_frame = self.temp_red_frame.join(self.fighter_details, on="hero_fighter")
 
         blue_frame = self.temp_blue_frame.add_prefix("B_")
         red_frame = self.temp_red_frame.add_prefix("R_")
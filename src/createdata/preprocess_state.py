@@ -0,0 +1,97 @@
+import pickle
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.createdata.data_files_path import PREPROCESS_STATE  # isort:skip
+
+
+class RunningMedians:
+    """
+    Exact medians of the columns of a table that rows are added to and
+    removed from, maintained from the count of every value of every column.
+    """
+
+    def __init__(self):
+        # The distinct values of every column, sorted, and their counts
+        self.counts: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.dtypes: Dict[str, np.dtype] = {}
+
+    def update(
+        self,
+        added: Iterable[Tuple[str, pd.Series]],
+        removed: Iterable[Tuple[str, pd.Series]] = (),
+    ) -> None:
+        """
+        Counts the values of ``added`` and discounts the values of
+        ``removed``, both pairs of a column name and its values.
+        """
+        changes = defaultdict(list)
+        for sign, columns in ((1, added), (-1, removed)):
+            for column, values in columns:
+                self.dtypes[column] = values.dtype
+                values = values.dropna().to_numpy(dtype=np.float64)
+                changes[column].append((values, np.full(len(values), sign, dtype=np.int64)))
+
+        for column, changed in changes.items():
+            values, counts = self.counts.get(column, (np.empty(0), np.empty(0, dtype=np.int64)))
+            values, inverse = np.unique(
+                np.concatenate([values] + [values for values, _ in changed]), return_inverse=True
+            )
+            counts = np.bincount(
+                inverse, weights=np.concatenate([counts] + [signs for _, signs in changed])
+            ).astype(np.int64)
+            self.counts[column] = (values[counts > 0], counts[counts > 0])
+
+    def medians(self, columns: Iterable[str]) -> pd.Series:
+        return pd.Series({column: self._median(column) for column in columns}, dtype=np.float64)
+
+    def _median(self, column: str) -> float:
+        values, counts = self.counts.get(column, (np.empty(0), np.empty(0)))
+        if not len(values):
+            return np.nan
+        cumulative = np.cumsum(counts)
+        # Averaged in the dtype of float columns like ``Series.median``, a float64
+        # median of a float32 column would upcast it when filled in
+        values = values.astype(np.result_type(self.dtypes[column], np.float32))
+        n = cumulative[-1]
+        # The values at the positions (n - 1) // 2 and n // 2 of the sorted column
+        lower = values[np.searchsorted(cumulative, (n - 1) // 2, side="right")]
+        upper = values[np.searchsorted(cumulative, n // 2, side="right")]
+        return (lower + upper) / 2
+
+
+class PreprocessState:
+    """
+    What an incremental run of the ``Preprocessor`` needs from the last run:
+
+    - ``code_version``: the version of the preprocessing code of the last run.
+    - ``ufc_data``: the content of ``data.csv``, indexed by a hash of the raw
+      fight every row was computed from.
+    - ``detail_hashes``: a hash of the details of every fighter.
+    - ``medians``: the ``RunningMedians`` of the numeric columns.
+    - ``ratings``: the ``RatingEngine`` after the last fight.
+    """
+
+    def __init__(self, path: Path = PREPROCESS_STATE):
+        self.PATH = Path(path)
+
+    def load(self) -> Optional[Dict]:
+        if not self.PATH.exists():
+            return None
+        try:
+            with open(self.PATH, "rb") as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError):
+            # A run killed while writing leaves a truncated file
+            return None
+
+    def save(self, state: Dict) -> None:
+        self.PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.PATH.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(self.PATH)
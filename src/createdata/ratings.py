@@ -0,0 +1,249 @@
+import concurrent.futures
+import itertools
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Glicko-1 parameters: new fighters start at ``initial_rating`` with a
+# deviation of ``initial_deviation``, every year without a fight adds
+# ``deviation_growth`` to it (in quadrature) and a fight never leaves it
+# below ``min_deviation``
+DEFAULT_PARAMS = {
+    "initial_rating": 1500.0,
+    "initial_deviation": 350.0,
+    "deviation_growth": 100.0,
+    "min_deviation": 30.0,
+}
+# Methods of the fights without a winner that aren't draws, they aren't rated
+NO_CONTEST_METHODS = ["Overturned", "Could Not Continue", "Other"]
+
+_Q = math.log(10) / 400
+_NEVER = np.iinfo(np.int64).min
+
+
+def _g(deviation: np.ndarray) -> np.ndarray:
+    return 1 / np.sqrt(1 + 3 * _Q ** 2 * deviation ** 2 / math.pi ** 2)
+
+
+def win_probability(rating, deviation, opp_rating, opp_deviation) -> np.ndarray:
+    """The probability that the fighter beats the opponent, by Glicko."""
+    return 1 / (
+        1
+        + 10
+        ** (
+            -_g(np.sqrt(np.square(deviation) + np.square(opp_deviation)))
+            * (np.asarray(rating) - opp_rating)
+            / 400
+        )
+    )
+
+
+def _fight_arrays(fights: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    The IDs, days, red score and whether it is rated of every fight, oldest
+    first: the raw fights are newest first.
+    """
+    fights = fights.iloc[::-1]
+    winner = fights["Winner"].astype(object)
+    red_won = (winner == fights["R_fighter"].astype(object)).to_numpy()
+    blue_won = (winner == fights["B_fighter"].astype(object)).to_numpy() & ~red_won
+    dates = pd.to_datetime(fights["date"].astype(object), errors="coerce")
+    return {
+        "index": fights.index.to_numpy(),
+        "red": fights["R_fighter_id"].to_numpy(np.int64),
+        "blue": fights["B_fighter_id"].to_numpy(np.int64),
+        "days": np.where(dates.notna(), dates.to_numpy("datetime64[D]").astype(np.int64), _NEVER),
+        "score": np.where(red_won, 1.0, np.where(blue_won, 0.0, 0.5)),
+        "rated": (red_won | blue_won | ~fights["win_by"].isin(NO_CONTEST_METHODS)).to_numpy(),
+    }
+
+
+def _levels(red: np.ndarray, blue: np.ndarray) -> np.ndarray:
+    """
+    The step every fight is rated in: the step after the last fight of
+    both its fighters. The fights of a step have no fighter in common and
+    are rated at once, rating them in steps is rating them one by one.
+    """
+    last: Dict[int, int] = {}
+    levels = np.empty(len(red), dtype=np.int64)
+    for fight, (r, b) in enumerate(zip(red.tolist(), blue.tolist())):
+        level = max(last.get(r, -1), last.get(b, -1)) + 1
+        last[r] = last[b] = levels[fight] = level
+    return levels
+
+
+def _rate(
+    fights: Dict[str, np.ndarray],
+    red: np.ndarray,
+    blue: np.ndarray,
+    rating: np.ndarray,
+    deviation: np.ndarray,
+    last_day: np.ndarray,
+    params: Dict[str, np.ndarray],
+) -> Tuple[np.ndarray, ...]:
+    """
+    Rates ``fights`` for every parameter set at once. ``red`` and ``blue``
+    are the positions of the fighters in ``rating`` and ``deviation``, one
+    row per parameter set, and ``last_day``, which are all updated. The
+    parameters are columns of one row per parameter set. Returns the red
+    and blue ratings and deviations before every fight.
+    """
+    shape = (rating.shape[0], len(red))
+    pre = tuple(np.empty(shape) for _ in range(4))
+    levels = _levels(red, blue)
+    order = np.argsort(levels, kind="mergesort")
+    bounds = np.flatnonzero(np.diff(levels[order])) + 1
+
+    for step in np.split(order, bounds):
+        fighters = (red[step], blue[step])
+        days = fights["days"][step]
+        # The deviation grows with the time since the last fight
+        for fighter in fighters:
+            years = np.where(
+                (days != _NEVER) & (last_day[fighter] != _NEVER),
+                (days - last_day[fighter]) / 365.25,
+                0.0,
+            )
+            deviation[:, fighter] = np.minimum(
+                np.sqrt(deviation[:, fighter] ** 2 + params["deviation_growth"] ** 2 * years),
+                params["initial_deviation"],
+            )
+        (r, r_dev), (b, b_dev) = [(rating[:, f], deviation[:, f]) for f in fighters]
+        for values, array in zip((r, r_dev, b, b_dev), pre):
+            array[:, step] = values
+
+        score = fights["score"][step]
+        rated = fights["rated"][step]
+        for fighter, (own, own_dev), (opp, opp_dev), own_score in (
+            (fighters[0], (r, r_dev), (b, b_dev), score),
+            (fighters[1], (b, b_dev), (r, r_dev), 1 - score),
+        ):
+            g = _g(opp_dev)
+            expected = 1 / (1 + 10 ** (-g * (own - opp) / 400))
+            precision = 1 / own_dev ** 2 + _Q ** 2 * g ** 2 * expected * (1 - expected)
+            rating[:, fighter] = np.where(rated, own + _Q / precision * g * (own_score - expected), own)
+            deviation[:, fighter] = np.where(
+                rated, np.maximum(np.sqrt(1 / precision), params["min_deviation"]), own_dev
+            )
+            last_day[fighter] = np.where(days != _NEVER, days, last_day[fighter])
+    return pre
+
+
+class RatingEngine:
+    """
+    Glicko ratings of every fighter over the fight history, the rating of
+    Elo with a deviation that shrinks with every fight and grows with the
+    time without one.
+
+    ``rate`` goes through the fights once, oldest first, and returns the
+    ratings of both fighters before every fight. The engine keeps the
+    ratings after the last fight it rated, it is pickled with the state of
+    the ``Preprocessor`` and the fights of a new event are rated from there.
+    """
+
+    COLUMNS = ["rating", "rating_deviation"]
+
+    def __init__(self, params: Optional[Dict[str, float]] = None):
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        # The position of every fighter ID in the arrays of their ratings
+        self.positions: Dict[int, int] = {}
+        self.rating = np.empty(0)
+        self.deviation = np.empty(0)
+        self.last_day = np.empty(0, dtype=np.int64)
+
+    def rate(self, fights: pd.DataFrame) -> pd.DataFrame:
+        """
+        The red and blue ratings before every fight of ``fights``, newest
+        first, which are then added to the ratings. ``Winner`` is a name.
+        """
+        arrays = _fight_arrays(fights)
+        red, blue = self._positions(arrays["red"]), self._positions(arrays["blue"])
+        params = {name: np.array([[value]]) for name, value in self.params.items()}
+        rating, deviation = self.rating[np.newaxis], self.deviation[np.newaxis]
+        pre = _rate(arrays, red, blue, rating, deviation, self.last_day, params)
+        self.rating, self.deviation = rating[0], deviation[0]
+
+        columns = [f"{corner}_{column}" for corner in "RB" for column in self.COLUMNS]
+        return pd.DataFrame(
+            {column: values[0].astype(np.float32) for column, values in zip(columns, pre)},
+            index=arrays["index"],
+        ).sort_index()
+
+    def ratings(self, as_of=None) -> pd.DataFrame:
+        """
+        The rating and deviation of every fighter by ID, with the deviation
+        grown until ``as_of`` (default: today).
+        """
+        day = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.today()).to_datetime64()
+        years = np.where(
+            self.last_day != _NEVER,
+            (day.astype("datetime64[D]").astype(np.int64) - self.last_day) / 365.25,
+            0.0,
+        )
+        deviation = np.minimum(
+            np.sqrt(self.deviation ** 2 + self.params["deviation_growth"] ** 2 * np.maximum(years, 0)),
+            self.params["initial_deviation"],
+        )
+        return pd.DataFrame(
+            {"rating": self.rating, "rating_deviation": deviation},
+            index=pd.Index(list(self.positions), name="fighter_id", dtype=np.int32),
+        ).astype(np.float32)
+
+    def _positions(self, fighter_ids: np.ndarray) -> np.ndarray:
+        """The positions of fighters, new fighters are added with the initial rating."""
+        for fighter_id in pd.unique(fighter_ids).tolist():
+            if fighter_id not in self.positions:
+                self.positions[fighter_id] = len(self.positions)
+        n_new = len(self.positions) - len(self.rating)
+        self.rating = np.append(self.rating, np.full(n_new, self.params["initial_rating"]))
+        self.deviation = np.append(self.deviation, np.full(n_new, self.params["initial_deviation"]))
+        self.last_day = np.append(self.last_day, np.full(n_new, _NEVER))
+        return np.array([self.positions[fighter_id] for fighter_id in fighter_ids.tolist()], dtype=np.int64)
+
+
+def replay(fights: pd.DataFrame, param_sets: List[Dict[str, float]]) -> np.ndarray:
+    """
+    Rates every fight with every parameter set at once and returns the log
+    loss of the win probabilities before the fights with a winner, one per
+    parameter set.
+    """
+    arrays = _fight_arrays(fights)
+    fighter_ids, positions = np.unique(np.concatenate([arrays["red"], arrays["blue"]]), return_inverse=True)
+    red, blue = np.split(positions, 2)
+    params = {
+        name: np.array([[{**DEFAULT_PARAMS, **param_set}[name]] for param_set in param_sets])
+        for name in DEFAULT_PARAMS
+    }
+    rating = np.repeat(params["initial_rating"], len(fighter_ids), axis=1)
+    deviation = np.repeat(params["initial_deviation"], len(fighter_ids), axis=1)
+    last_day = np.full(len(fighter_ids), _NEVER)
+    r, r_dev, b, b_dev = _rate(arrays, red, blue, rating, deviation, last_day, params)
+
+    decided = arrays["rated"] & (arrays["score"] != 0.5)
+    probability = np.clip(win_probability(r, r_dev, b, b_dev)[:, decided], 1e-15, 1 - 1e-15)
+    red_won = arrays["score"][decided]
+    return -np.mean(red_won * np.log(probability) + (1 - red_won) * np.log(1 - probability), axis=1)
+
+
+def tune(
+    fights: pd.DataFrame,
+    param_grid: Dict[str, List[float]],
+    max_workers: Optional[int] = None,
+    chunk_size: int = 64,
+) -> Tuple[Dict[str, float], pd.DataFrame]:
+    """
+    The parameter set of ``param_grid`` with the lowest ``replay`` log loss,
+    and the log loss of every set. Chunks of ``chunk_size`` sets are
+    replayed on a pool of ``max_workers`` processes.
+    """
+    names = list(param_grid)
+    param_sets = [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+    chunks = [param_sets[start : start + chunk_size] for start in range(0, len(param_sets), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        losses = np.concatenate(list(executor.map(replay, itertools.repeat(fights), chunks)))
+
+    results = pd.DataFrame(param_sets).assign(log_loss=losses).sort_values("log_loss", kind="mergesort")
+    return param_sets[int(np.argmin(losses))], results.reset_index(drop=True)
@@ -1,29 +1,53 @@
-import os
 import concurrent.futures
 import threading
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 from bs4 import BeautifulSoup
 
+from src.createdata import fight_records
+from src.createdata.checkpoint import ScrapeCheckpoint
+from src.createdata.fighter_ids import REGISTRY
+from src.createdata.metrics import CACHE_LOOKUPS, SCRAPE_ERRORS, SCRAPED_ITEMS
+from src.createdata.persist import WRITER
 from src.createdata.scrape_fight_links import UFCLinks
 from src.createdata.utils import make_soup, print_progress
 
-from src.createdata.data_files_path import (  # isort:skip
-    NEW_EVENT_AND_FIGHTS,
-    TOTAL_EVENT_AND_FIGHTS,
-)
+from src.createdata.data_files_path import TOTAL_EVENT_AND_FIGHTS  # isort:skip
 
 class FightDataScraper:
-    def __init__(self):
-        self.HEADER: str = "R_fighter;B_fighter;R_KD;B_KD;R_SIG_STR.;B_SIG_STR.\
-;R_SIG_STR_pct;B_SIG_STR_pct;R_TOTAL_STR.;B_TOTAL_STR.;R_TD;B_TD;R_TD_pct\
-;B_TD_pct;R_SUB_ATT;B_SUB_ATT;R_REV;B_REV;R_CTRL;B_CTRL;R_HEAD;B_HEAD;R_BODY\
-;B_BODY;R_LEG;B_LEG;R_DISTANCE;B_DISTANCE;R_CLINCH;B_CLINCH;R_GROUND;B_GROUND\
-;win_by;last_round;last_round_time;Format;Referee;date;location;Fight_type;Winner\n"
-
-        self.NEW_EVENT_AND_FIGHTS_PATH = NEW_EVENT_AND_FIGHTS
+    # The cells of the first row of the totals and of the significant strikes
+    # table of a fight page, each with the value of the red and the blue corner
+    TOTALS_CELLS = [
+        "fighter",
+        "KD",
+        "SIG_STR.",
+        "SIG_STR_pct",
+        "TOTAL_STR.",
+        "TD",
+        "TD_pct",
+        "SUB_ATT",
+        "REV",
+        "CTRL",
+    ]
+    SIGNIFICANT_STRIKES_CELLS = [
+        "fighter",
+        "SIG_STR.",
+        "SIG_STR_pct",
+        "HEAD",
+        "BODY",
+        "LEG",
+        "DISTANCE",
+        "CLINCH",
+        "GROUND",
+    ]
+
+    def __init__(self, resume: bool = False):
         self.TOTAL_EVENT_AND_FIGHTS_PATH = TOTAL_EVENT_AND_FIGHTS
+        self.resume = resume
+        self.checkpoint = ScrapeCheckpoint("fight_data")
+        # The typed fights of ``raw_total_fight_data.csv``, once they are scraped
+        self.fight_data: Optional[pd.DataFrame] = None
 
     def create_fight_data_csv(self) -> None:
         print("Scraping links!")
@@ -33,6 +57,10 @@ class FightDataScraper:
             ufc_links.get_event_and_fight_links()
         )
         print("Successfully scraped and saved event and fight links!\n")
+
+        if self.TOTAL_EVENT_AND_FIGHTS_PATH.exists():
+            new_events_and_fight_links = self._add_unfinished_fights(new_events_and_fight_links)
+
         print("Now, scraping event and fight data!\n")
 
         if not new_events_and_fight_links:
@@ -40,64 +68,91 @@ class FightDataScraper:
                 print(f'No new fight data to scrape at the moment, loaded existing data from {self.TOTAL_EVENT_AND_FIGHTS_PATH}.')
                 return
             else:
-                self._scrape_raw_fight_data(
-                    all_events_and_fight_links,
-                    filepath=self.TOTAL_EVENT_AND_FIGHTS_PATH,
+                latest_total_fight_data = self._scrape_raw_fight_data(
+                    all_events_and_fight_links, event_info=ufc_links.event_info
                 )
         else:
-            self._scrape_raw_fight_data(
-                new_events_and_fight_links, filepath=self.NEW_EVENT_AND_FIGHTS_PATH
-            )
-
-            new_event_and_fights_data = pd.read_csv(self.NEW_EVENT_AND_FIGHTS_PATH)
-            old_event_and_fights_data = pd.read_csv(self.TOTAL_EVENT_AND_FIGHTS_PATH)
-
-            assert len(new_event_and_fights_data.columns) == len(
-                old_event_and_fights_data.columns
+            new_event_and_fights_data = self._scrape_raw_fight_data(
+                new_events_and_fight_links, event_info=ufc_links.event_info
             )
 
-            new_event_and_fights_data = new_event_and_fights_data[
-                list(old_event_and_fights_data.columns)
-            ]
-
-            latest_total_fight_data = new_event_and_fights_data.append(
-                old_event_and_fights_data, ignore_index=True
+            # Files of the text of the pages, written by older versions, are typed here
+            WRITER.wait([self.TOTAL_EVENT_AND_FIGHTS_PATH])
+            old_event_and_fights_data = fight_records.read_fight_data(self.TOTAL_EVENT_AND_FIGHTS_PATH)
+
+            latest_total_fight_data = pd.concat(
+                [new_event_and_fights_data, old_event_and_fights_data], ignore_index=True
+            ).drop_duplicates()
+            # Retried fights can be older than the newest events, the file has
+            # to stay sorted newest first for the Preprocessor.
+            event_dates = pd.to_datetime(
+                latest_total_fight_data["date"].astype(object), errors="coerce"
             )
-            latest_total_fight_data.to_csv(self.TOTAL_EVENT_AND_FIGHTS_PATH, index=None)
-
-            os.remove(self.NEW_EVENT_AND_FIGHTS_PATH)
-            print("Removed new event and fight files")
-
-        print("Successfully scraped and saved ufc fight data!\n")
+            # (a stable sort, the fights of an event keep the order of its page)
+            latest_total_fight_data = latest_total_fight_data.iloc[
+                event_dates.reset_index(drop=True)
+                .sort_values(ascending=False, kind="mergesort", na_position="last")
+                .index
+            ].reset_index(drop=True)
+
+        # The preprocessing takes the fights from here while they are written,
+        # the checkpoint is only cleared once they are
+        self.fight_data = latest_total_fight_data
+        WRITER.submit(REGISTRY.save, path=REGISTRY.PATH)
+        WRITER.write(
+            self.TOTAL_EVENT_AND_FIGHTS_PATH,
+            lambda path: fight_records.write_fight_data(latest_total_fight_data, path),
+        )
+        WRITER.submit(self.checkpoint.finish, after=[self.TOTAL_EVENT_AND_FIGHTS_PATH])
+        print("Successfully scraped ufc fight data, saving it in the background!\n")
+
+    def _add_unfinished_fights(
+        self, event_and_fight_links: Dict[str, List[str]]
+    ) -> Dict[str, List[str]]:
+        """
+        Adds the fights that failed on previous runs and, when resuming, the
+        fights of an interrupted run to the links to scrape.
+        """
+        unfinished = {}
+        if self.resume:
+            unfinished.update(self.checkpoint.pending())
+        for fight, event in self.checkpoint.failed().items():
+            unfinished.setdefault(event, []).append(fight)
+
+        if not unfinished:
+            return event_and_fight_links
+
+        print(f"Retrying {sum(len(fights) for fights in unfinished.values())} unfinished fights first")
+        event_and_fight_links = dict(event_and_fight_links)
+        for event, fights in unfinished.items():
+            merged = event_and_fight_links.get(event, [])
+            event_and_fight_links[event] = merged + [fight for fight in fights if fight not in merged]
+        return event_and_fight_links
 
     def _scrape_raw_fight_data(
-        self, event_and_fight_links: Dict[str, List[str]], filepath
-    ):
-        if filepath.exists():
-            print(f'File {filepath} already exists, overwriting.')
-
-        total_stats = FightDataScraper._get_total_fight_stats(event_and_fight_links)
-        with open(filepath.as_posix(), "wb") as file:
-            file.write(bytes(self.HEADER, encoding="ascii", errors="ignore"))
-            file.write(bytes(total_stats, encoding="ascii", errors="ignore"))
+        self,
+        event_and_fight_links: Dict[str, List[str]],
+        event_info: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        rows = FightDataScraper._get_total_fight_stats(
+            event_and_fight_links,
+            checkpoint=self.checkpoint,
+            resume=self.resume,
+            event_info=event_info,
+        )
+        return fight_records.to_frame(rows)
 
-    def _get_fight_stats_task(self, fight, event_info):
+    def _get_fight_stats_task(self, fight, event_info, event=None, checkpoint=None):
         #print(threading.get_native_id())
-        total_fight_stats = ""
+        total_fight_stats = None
         try:
             fight_soup = make_soup(fight)
-            fight_stats = FightDataScraper._get_fight_stats(fight_soup)
-            fight_details = FightDataScraper._get_fight_details(fight_soup)
-            result_data = FightDataScraper._get_fight_result_data(fight_soup)
-            total_fight_stats = (
-                fight_stats
-                + ";"
-                + fight_details
-                + ";"
-                + event_info
-                + ";"
-                + result_data
-            )
+            record = FightDataScraper._get_fight_stats(fight_soup)
+            record.update(FightDataScraper._get_fight_details(fight_soup))
+            record.update(FightDataScraper._get_event_data(event_info))
+            record.update(FightDataScraper._get_fight_result_data(fight_soup))
+            # The row of the record, the results of the checkpoint are JSON
+            total_fight_stats = fight_records.to_row(record)
         except Exception as e:  # pragma: no cover - network errors are non-deterministic
             # Previously any exception was silently swallowed which made debugging
             # scraping issues extremely difficult and resulted in rows missing
@@ -105,40 +160,113 @@ class FightDataScraper:
             # visibility into failures while still allowing the scraper to
             # continue processing other fights.
             print(f"Error getting fight stats for {fight}: {e}")
-            total_fight_stats = ""
-
+            SCRAPE_ERRORS.labels("fight_data").inc()
+            total_fight_stats = None
+            if checkpoint is not None:
+                checkpoint.mark_failed(fight, event)
+            return total_fight_stats
+
+        SCRAPED_ITEMS.labels("fight_data").inc()
+        if checkpoint is not None:
+            checkpoint.mark_completed(fight, total_fight_stats)
         return total_fight_stats
 
     @classmethod
-    def _get_total_fight_stats(cls, event_and_fight_links: Dict[str, List[str]]) -> str:
-        total_stats = ""
+    def _get_total_fight_stats(
+        cls,
+        event_and_fight_links: Dict[str, List[str]],
+        checkpoint: Optional[ScrapeCheckpoint] = None,
+        resume: bool = False,
+        event_info: Optional[Dict[str, str]] = None,
+    ) -> List[List[Any]]:
+        """
+        The rows of ``fight_records.FIGHT_COLUMNS`` of the fights.
+        ``event_info`` is the date and location of the events, as scraped with
+        their fight links. The pages of the events missing from it are fetched.
+        """
+        completed = checkpoint.start(event_and_fight_links, resume=resume) if checkpoint else {}
+        # Fights checkpointed as text or without the fighter IDs by older
+        # versions are scraped again
+        completed = {
+            fight: row
+            for fight, row in completed.items()
+            if isinstance(row, list) and len(row) == len(fight_records.FIGHT_COLUMNS)
+        }
+        if completed:
+            print(f"Resuming, {len(completed)} fights were already scraped")
+        n_fights = sum(len(fights) for fights in event_and_fight_links.values())
+        CACHE_LOOKUPS.labels("checkpoint", "hit").inc(len(completed))
+        CACHE_LOOKUPS.labels("checkpoint", "miss").inc(n_fights - len(completed))
+
+        fight_stats = dict(completed)
 
         l = len(event_and_fight_links)
         print(f'Scraping data for {l} fights: ')
         print_progress(0, l, prefix="Progress:", suffix="Complete")
 
         for index, (event, fights) in enumerate(event_and_fight_links.items()):
-            event_soup = make_soup(event)
-            event_info = FightDataScraper._get_event_info(event_soup)
+            fights = [fight for fight in fights if fight not in completed]
+            if not fights:
+                print_progress(index + 1, l, prefix="Progress:", suffix="Complete")
+                continue
+
+            info = (event_info or {}).get(event)
+            if info is None:
+                try:
+                    info = UFCLinks._get_event_info(make_soup(event))
+                except Exception as e:  # pragma: no cover - network errors are non-deterministic
+                    print(f"Error getting event info for {event}: {e}")
+                    SCRAPE_ERRORS.labels("fight_data").inc(len(fights))
+                    for fight in fights:
+                        if checkpoint is not None:
+                            checkpoint.mark_failed(fight, event)
+                    print_progress(index + 1, l, prefix="Progress:", suffix="Complete")
+                    continue
 
             # Get data for each fight in the event in parallel.
             with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                futures = []
+                futures = {}
                 for fight in fights:
-                    futures.append(executor.submit(FightDataScraper._get_fight_stats_task, self=cls, fight=fight, event_info=event_info))
+                    futures[executor.submit(FightDataScraper._get_fight_stats_task, self=cls, fight=fight, event_info=info, event=event, checkpoint=checkpoint)] = fight
                 for future in concurrent.futures.as_completed(futures):
-                    fighter_stats = future.result()
-                    if fighter_stats != "":
-                        if total_stats == "":
-                            total_stats = fighter_stats
-                        else:
-                            total_stats = total_stats + "\n" + fighter_stats
+                    fight_stats[futures[future]] = future.result()
                     print_progress(index + 1, l, prefix="Progress:", suffix="Complete")
 
-        return total_stats
+        # Rows follow the order of the events and of the fights on the event
+        # pages, whatever order the threads finished in.
+        return [
+            fight_stats[fight]
+            for fights in event_and_fight_links.values()
+            for fight in fights
+            if fight_stats.get(fight)
+        ]
+
+    @staticmethod
+    def _get_first_row(table) -> List[Tuple[str, str]]:
+        """The values of the red and the blue corner of every cell of the first row."""
+        row = table.find("tr")
+        if row is None:
+            raise ValueError("Could not find table row containing fight stats")
+
+        cells = []
+        for cell in row.findAll("td"):
+            values = [p.get_text(strip=True) for p in cell.findAll("p")]
+            if len(values) != 2:
+                raise ValueError(f"Expected the values of both fighters in a cell, found {values}")
+            cells.append(tuple(values))
+        return cells
+
+    @staticmethod
+    def _get_fighter_links(table) -> List[str]:
+        """The profile links of the red and the blue fighter, in the first cell of the first row."""
+        cell = table.find("tr").find("td")
+        links = [link["href"] for link in cell.findAll("a", href=True)]
+        if len(links) != 2:
+            raise ValueError(f"Expected the links of both fighters, found {links}")
+        return links
 
     @classmethod
-    def _get_fight_stats(cls, fight_soup: BeautifulSoup) -> str:
+    def _get_fight_stats(cls, fight_soup: BeautifulSoup) -> Dict[str, Any]:
         tables = fight_soup.findAll("tbody")
 
         # The UFC statistics page contains multiple tables; historically the
@@ -152,81 +280,65 @@ class FightDataScraper:
                 f"Expected at least 3 <tbody> elements in fight page, found {len(tables)}"
             )
 
-        total_fight_data = [tables[0], tables[2]]
-        fight_stats = []
-        for table in total_fight_data:
-            row = table.find("tr")
-            if row is None:
-                raise ValueError("Could not find table row containing fight stats")
-
-            stats = ""
-            for data in row.findAll("td"):
-                if stats == "":
-                    stats = data.text
-                else:
-                    stats = stats + "," + data.text
-            fight_stats.append(
-                stats.replace("  ", "")
-                .replace("\n\n", "")
-                .replace("\n", ",")
-                .replace(", ", ",")
-                .replace(" ,", ",")
-            )
-
-        fight_stats[1] = ";".join(fight_stats[1].split(",")[6:])
-        fight_stats[0] = ";".join(fight_stats[0].split(","))
-        fight_stats = ";".join(fight_stats)
-        return fight_stats
-
-    @classmethod
-    def _get_fight_details(cls, fight_soup: BeautifulSoup) -> str:
-        columns = ""
-        for div in fight_soup.findAll("div", {"class": "b-fight-details__content"}):
-            for col in div.findAll("p", {"class": "b-fight-details__text"}):
-                if columns == "":
-                    columns = col.text
-                else:
-                    columns = columns + "," + (col.text)
-
-        columns = (
-            columns.replace("  ", "")
-            .replace("\n\n\n\n", ",")
-            .replace("\n", "")
-            .replace(", ", ",")
-            .replace(" ,", ",")
-            .replace("Method: ", "")
-            .replace("Round:", "")
-            .replace("Time:", "")
-            .replace("Time format:", "")
-            .replace("Referee:", "")
+        totals = cls._get_first_row(tables[0])
+        significant_strikes = cls._get_first_row(tables[2])
+        if len(totals) < len(cls.TOTALS_CELLS) or len(significant_strikes) < len(
+            cls.SIGNIFICANT_STRIKES_CELLS
+        ):
+            raise ValueError("Could not find all the fight stats in the tables")
+
+        cells = dict(zip(cls.TOTALS_CELLS, totals))
+        # The strikes by target and position are only in the second table
+        cells.update(
+            (stat, values)
+            for stat, values in zip(cls.SIGNIFICANT_STRIKES_CELLS, significant_strikes)
+            if stat not in cells
         )
 
-        fight_details = ";".join(columns.split(",")[:5])
-
-        return fight_details
+        links = cls._get_fighter_links(tables[0])
+
+        record = {}
+        for corner, index in (("R", 0), ("B", 1)):
+            record[f"{corner}_fighter"] = cells["fighter"][index]
+            record[f"{corner}_fighter_id"] = REGISTRY.id_of(links[index])
+            for stat in ["KD", "SUB_ATT", "REV"]:
+                record[f"{corner}_{stat}"] = fight_records.count(cells[stat][index])
+            for stat in ["SIG_STR_pct", "TD_pct"]:
+                record[f"{corner}_{stat}"] = fight_records.fraction(cells[stat][index])
+            for stat in fight_records.STATS:
+                landed, attempted = fight_records.landed_of_attempted(cells[stat][index])
+                record[f"{corner}_{stat}_att"] = attempted
+                record[f"{corner}_{stat}_landed"] = landed
+            record[f"{corner}_CTRL_time(seconds)"] = fight_records.seconds(cells["CTRL"][index])
+        return record
 
     @classmethod
-    def _get_event_info(cls, event_soup: BeautifulSoup) -> str:
-        event_info = ""
-        for info in event_soup.findAll("li", {"class": "b-list__box-list-item"}):
-            if event_info == "":
-                event_info = info.text
-            else:
-                event_info = event_info + ";" + info.text
-
-        event_info = ";".join(
-            event_info.replace("Date:", "")
-            .replace("Location:", "")
-            .replace("Attendance:", "")
-            .replace("\n", "")
-            .replace("  ", "")
-            .split(";")[:2]
-        )
-
-        return event_info
+    def _get_fight_details(cls, fight_soup: BeautifulSoup) -> Dict[str, Any]:
+        # Every detail is the text of an item after its label, like
+        # <i><i class="b-fight-details__label">Round:</i> 3</i>
+        details = {}
+        text = fight_soup.find("p", {"class": "b-fight-details__text"})
+        if text is None:
+            raise ValueError("Could not find the details of the fight")
+        for label in text.findAll("i", {"class": "b-fight-details__label"}):
+            name = label.get_text(strip=True)
+            details[name] = label.parent.get_text(" ", strip=True)[len(name) :].strip()
+
+        return {
+            "win_by": details.get("Method:", ""),
+            "last_round": fight_records.count(details.get("Round:", "")),
+            "last_round_time": fight_records.seconds(details.get("Time:", "")),
+            "Format": details.get("Time format:", ""),
+            "Referee": details.get("Referee:", ""),
+        }
+
+    @staticmethod
+    def _get_event_data(event_info: str) -> Dict[str, Any]:
+        date, _, location = event_info.partition(";")
+        return {"date": fight_records.iso_date(date), "location": location.strip()}
 
     @classmethod
-    def _get_fight_result_data(cls, fight_soup: BeautifulSoup) -> str:
+    def _get_fight_result_data(cls, fight_soup: BeautifulSoup) -> Dict[str, Any]:
         winner = ""
         for div in fight_soup.findAll("div", {"class": "b-fight-details__person"}):
             if (
@@ -238,16 +350,16 @@ class FightDataScraper:
                 )
                 is not None
             ):
-                winner = (
-                    div.find("h3", {"class": "b-fight-details__person-name"})
-                    .text.replace(" \n", "")
-                    .replace("\n", "")
+                winner = div.find("h3", {"class": "b-fight-details__person-name"}).get_text(
+                    strip=True
                 )
 
-        fight_type = (
-            fight_soup.find("i", {"class": "b-fight-details__fight-title"})
-            .text.replace("  ", "")
-            .replace("\n", "")
+        fight_type = fight_soup.find("i", {"class": "b-fight-details__fight-title"}).get_text(
+            strip=True
         )
 
-        return fight_type + ";" + winner
+        return {
+            "Winner": winner,
+            "title_bout": fight_records.is_title_bout(fight_type),
+            "weight_class": fight_records.weight_class(fight_type),
+        }
@@ -1,6 +1,8 @@
 import pickle
 from typing import Dict, List, Tuple
 
+from bs4 import BeautifulSoup
+
 from src.createdata.utils import make_soup, print_progress
 
 from src.createdata.data_files_path import (  # isort:skip
@@ -16,16 +18,12 @@ class UFCLinks:
         self.all_events_url = all_events_url
         self.PAST_EVENT_LINKS_PICKLE_PATH = PAST_EVENT_LINKS_PICKLE
         self.EVENT_AND_FIGHT_LINKS_PICKLE_PATH = EVENT_AND_FIGHT_LINKS_PICKLE
+        # The date and location of every event, see ``get_event_and_fight_links``
+        self.event_info: Dict[str, str] = {}
         self.new_event_links, self.all_event_links = self._get_updated_event_links()
 
     def _get_updated_event_links(self) -> Tuple[List[str], List[str]]:
-        all_event_links = []
-        soup = make_soup(self.all_events_url)
-
-        for link in soup.findAll("td", {"class": "b-statistics__table-col"}):
-            for href in link.findAll("a"):
-                foo = href.get("href")
-                all_event_links.append(foo)
+        all_event_links = self._get_event_links(make_soup(self.all_events_url))
 
         if not self.PAST_EVENT_LINKS_PICKLE_PATH.exists():
             # if no past event links are present, then there are no new event links
@@ -44,45 +42,91 @@ class UFCLinks:
 
         return new_event_links, all_event_links
 
-    def get_event_and_fight_links(self) -> (Dict, Dict):
-        def get_fight_links(event_links: List[str]) -> Dict[str, List[str]]:
-            event_and_fight_links = {}
+    @staticmethod
+    def _get_event_links(events_soup: BeautifulSoup) -> List[str]:
+        all_event_links = []
+        for link in events_soup.findAll("td", {"class": "b-statistics__table-col"}):
+            for href in link.findAll("a"):
+                foo = href.get("href")
+                all_event_links.append(foo)
+        return all_event_links
+
+    @staticmethod
+    def _get_fight_links(event_soup: BeautifulSoup) -> List[str]:
+        event_fights = []
+        for row in event_soup.findAll(
+            "tr",
+            {
+                "class": "b-fight-details__table-row b-fight-details__table-row__hover js-fight-details-click"
+            },
+        ):
+            href = row.get("data-link")
+            event_fights.append(href)
+        return event_fights
+
+    @staticmethod
+    def _get_event_info(event_soup: BeautifulSoup) -> str:
+        event_info = ""
+        for info in event_soup.findAll("li", {"class": "b-list__box-list-item"}):
+            if event_info == "":
+                event_info = info.text
+            else:
+                event_info = event_info + ";" + info.text
+
+        event_info = ";".join(
+            event_info.replace("Date:", "")
+            .replace("Location:", "")
+            .replace("Attendance:", "")
+            .replace("\n", "")
+            .replace("  ", "")
+            .split(";")[:2]
+        )
 
+        return event_info
+
+    def get_event_and_fight_links(self) -> (Dict, Dict):
+        """
+        The fight links of the new events and of all events. Every event page
+        is fetched once, for its fight links and its date and location, which
+        are kept in ``event_info`` for ``FightDataScraper``. Only the pages of
+        events that are not saved yet are fetched.
+        """
+
+        def get_event_pages(event_links: List[str]) -> None:
             l = len(event_links)
             print("Scraping event and fight links: ")
             print_progress(0, l, prefix="Progress:", suffix="Complete")
 
             for index, link in enumerate(event_links):
-                event_fights = []
-                soup = make_soup(link)
-                for row in soup.findAll(
-                    "tr",
-                    {
-                        "class": "b-fight-details__table-row b-fight-details__table-row__hover js-fight-details-click"
-                    },
-                ):
-                    href = row.get("data-link")
-                    event_fights.append(href)
-                event_and_fight_links[link] = event_fights
+                event_soup = make_soup(link)
+                fight_links[link] = self._get_fight_links(event_soup)
+                self.event_info[link] = self._get_event_info(event_soup)
 
                 print_progress(index + 1, l, prefix="Progress:", suffix="Complete")
 
-            return event_and_fight_links
-
-        new_events_and_fight_links = {}
-        if self.EVENT_AND_FIGHT_LINKS_PICKLE_PATH.exists():
-            if not self.new_event_links:
-                with open(
-                    self.EVENT_AND_FIGHT_LINKS_PICKLE_PATH.as_posix(), "rb"
-                ) as pickle_in:
-                    all_events_and_fight_links = pickle.load(pickle_in)
-
-                return new_events_and_fight_links, all_events_and_fight_links
-            else:
-                new_events_and_fight_links = get_fight_links(self.new_event_links)
+        fight_links, self.event_info = self._load_event_pages()
+        # Links saved before the event info was saved with them are fetched again
+        missing = [
+            link
+            for link in self.all_event_links
+            if link not in fight_links or link not in self.event_info
+        ]
+        if missing:
+            get_event_pages(missing)
+            with open(self.EVENT_AND_FIGHT_LINKS_PICKLE_PATH.as_posix(), "wb") as f:
+                pickle.dump({"fight_links": fight_links, "event_info": self.event_info}, f)
+
+        new_events_and_fight_links = {link: fight_links[link] for link in self.new_event_links}
+        all_events_and_fight_links = {link: fight_links[link] for link in self.all_event_links}
+        return new_events_and_fight_links, all_events_and_fight_links
 
-        all_events_and_fight_links = get_fight_links(self.all_event_links)
-        with open(self.EVENT_AND_FIGHT_LINKS_PICKLE_PATH.as_posix(), "wb") as f:
-            pickle.dump(all_events_and_fight_links, f)
+    def _load_event_pages(self) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
+        if not self.EVENT_AND_FIGHT_LINKS_PICKLE_PATH.exists():
+            return {}, {}
 
-        return new_events_and_fight_links, all_events_and_fight_links
+        with open(self.EVENT_AND_FIGHT_LINKS_PICKLE_PATH.as_posix(), "rb") as pickle_in:
+            saved = pickle.load(pickle_in)
+        if set(saved) != {"fight_links", "event_info"}:
+            # Only the fight links of every event
+            return saved, {}
+        return saved["fight_links"], saved["event_info"]
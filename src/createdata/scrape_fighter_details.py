@@ -1,11 +1,17 @@
 import pickle
 import concurrent.futures
 import threading
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+from bs4 import BeautifulSoup
 
+from src.createdata.checkpoint import ScrapeCheckpoint
+from src.createdata.fighter_ids import (REGISTRY, is_links_by_url,
+                                        with_fighter_ids)
+from src.createdata.metrics import CACHE_LOOKUPS, SCRAPE_ERRORS, SCRAPED_ITEMS
+from src.createdata.persist import WRITER
 from src.createdata.utils import make_soup, print_progress
 
 from src.createdata.data_files_path import (  # isort:skip
@@ -15,7 +21,16 @@ from src.createdata.data_files_path import (  # isort:skip
 )
 
 class FighterDetailsScraper:
-    def __init__(self):
+    # The details the fighter listing pages also have
+    LISTING_COLUMNS = ["Height", "Weight", "Reach", "Stance"]
+
+    def __init__(self, resume: bool = False, listing_refresh: bool = False):
+        """
+        With ``listing_refresh`` the height, weight, reach and stance of every
+        fighter are updated from the 26 fighter listing pages and profiles are
+        only fetched for the fighters that aren't scraped yet, the listings
+        have no DOB and career stats.
+        """
         self.HEADER = [
             "Height",
             "Weight",
@@ -36,8 +51,18 @@ class FighterDetailsScraper:
         self.SCRAPED_FIGHTER_DATA_DICT_PICKLE_PATH = SCRAPED_FIGHTER_DATA_DICT_PICKLE
         self.fighter_group_urls: List[str] = []
         self.new_fighters_exists = False
-        self.new_fighter_links: Dict[str, List[str]] = {}
-        self.all_fighter_links: Dict[str, List[str]] = {}
+        # The name of every fighter by the link to their profile, names aren't unique
+        self.new_fighter_links: Dict[str, str] = {}
+        self.all_fighter_links: Dict[str, str] = {}
+        # The ``LISTING_COLUMNS`` of every fighter by their link, from the listing pages
+        self.listing_details: Dict[str, List[str]] = {}
+        self.resume = resume
+        self.listing_refresh = listing_refresh
+        self.checkpoint = ScrapeCheckpoint("fighter_data")
+        # The details of the fighters scraped by this run, by their link
+        self.fighter_link_and_details: Dict[str, List[str]] = {}
+        # The content of ``raw_fighter_details.csv``, once it changed
+        self.fighter_details: Optional[pd.DataFrame] = None
 
     def _get_fighter_group_urls(self) -> List[str]:
         alphas = [chr(i) for i in range(ord("a"), ord("a") + 26)]
@@ -47,9 +72,8 @@ class FighterDetailsScraper:
         ]
         return fighter_group_urls
 
-    def _get_fighter_name_and_link(self,) -> Dict[str, List[str]]:
-        fighter_name_and_link = {}
-        fighter_name = ""
+    def _get_fighter_link_and_name(self,) -> Dict[str, str]:
+        fighter_link_and_name = {}
 
         l = len(self.fighter_group_urls)
         print("Scraping all fighter names and links: ")
@@ -57,25 +81,42 @@ class FighterDetailsScraper:
 
         for index, fighter_group_url in enumerate(self.fighter_group_urls):
             soup = make_soup(fighter_group_url)
-            table = soup.find("tbody")
-            names = table.findAll(
-                "a", {"class": "b-link b-link_style_black"}, href=True
-            )
-            for i, name in enumerate(names):
-                if (i + 1) % 3 != 0:
-                    if fighter_name == "":
-                        fighter_name = name.text
-                    else:
-                        fighter_name = fighter_name + " " + name.text
-                else:
-                    fighter_name_and_link[fighter_name] = name["href"]
-                    fighter_name = ""
+            for link, (fighter_name, details) in self._get_fighter_rows(soup).items():
+                fighter_link_and_name[link] = fighter_name
+                self.listing_details[link] = details
             print_progress(index + 1, l, prefix="Progress:", suffix="Complete")
 
-        return fighter_name_and_link
+        return fighter_link_and_name
+
+    @classmethod
+    def _get_fighter_rows(
+        cls, fighter_group_soup: BeautifulSoup
+    ) -> Dict[str, Tuple[str, List[str]]]:
+        """
+        The name and the ``LISTING_COLUMNS`` of every fighter of a listing page, by link.
+        A row is the first name, last name and nickname, all linking to the
+        profile, then the height, weight, reach, stance and the record.
+        """
+        fighter_rows = {}
+
+        table = fighter_group_soup.find("tbody")
+        for row in table.findAll("tr"):
+            cells = row.findAll("td", {"class": "b-statistics__table-col"})
+            links = [
+                cell.find("a", {"class": "b-link b-link_style_black"}, href=True)
+                for cell in cells[:3]
+            ]
+            if len(cells) < 3 + len(cls.LISTING_COLUMNS) or None in links:
+                continue
+
+            first_name, last_name = links[0].text, links[1].text
+            fighter_name = f"{first_name} {last_name}" if first_name else last_name
+            details = [cell.text.strip() for cell in cells[3 : 3 + len(cls.LISTING_COLUMNS)]]
+            fighter_rows[links[2]["href"]] = (fighter_name, details)
+        return fighter_rows
 
     def _get_updated_fighter_links(self):
-        all_fighter_links = self._get_fighter_name_and_link()
+        all_fighter_links = self._get_fighter_link_and_name()
 
         if not self.PAST_FIGHTER_LINKS_PICKLE_PATH.exists():
             # if no past event links are present, then there are no new event links
@@ -86,15 +127,15 @@ class FighterDetailsScraper:
                 self.PAST_FIGHTER_LINKS_PICKLE_PATH.as_posix(), "rb"
             ) as pickle_in:
                 past_event_links = pickle.load(pickle_in)
+            # Older versions saved the link of every name
+            if not is_links_by_url(past_event_links):
+                past_event_links = {link: name for name, link in past_event_links.items()}
 
             # Find links of the newer fighters
-            new_fighters = list(
-                set(all_fighter_links.keys()) - set(past_event_links.keys())
-            )
             new_fighter_links = {
-                name: link
-                for name, link in all_fighter_links.items()
-                if name in new_fighters
+                link: name
+                for link, name in all_fighter_links.items()
+                if link not in past_event_links
             }
 
         # dump all_event_links as PAST_EVENT_LINKS
@@ -103,94 +144,159 @@ class FighterDetailsScraper:
 
         return new_fighter_links, all_fighter_links
 
-    def _get_fighter_data_task(self, fighter_name, fighter_url):
+    def _add_unfinished_fighters(self, fighter_links: Dict[str, str]) -> Dict[str, str]:
+        """
+        Adds the fighters that failed on previous runs and, when resuming, the
+        fighters of an interrupted run to the links to scrape.
+        """
+        unfinished = {}
+        # Runs of older versions saved the link of every name, they are skipped
+        if self.resume and is_links_by_url(self.checkpoint.pending()):
+            unfinished.update(self.checkpoint.pending())
+        unfinished.update(self.checkpoint.failed())
+
+        if unfinished:
+            print(f"Retrying {len(unfinished)} unfinished fighters first")
+        return dict(fighter_links, **unfinished)
+
+    def _get_fighter_data_task(self, fighter_url, fighter_name):
         try:
             another_soup = make_soup(fighter_url)
-            divs = another_soup.findAll(
-                "li",
-                {"class": "b-list__box-list-item b-list__box-list-item_type_block"},
-            )
-            data = []
-            for i, div in enumerate(divs):
-                if i == 9:
-                    # An empty string is scraped here, let's not append that
-                    continue
-                data.append(
-                    div.text.replace("  ", "")
-                        .replace("\n", "")
-                        .replace("Height:", "")
-                        .replace("Weight:", "")
-                        .replace("Reach:", "")
-                        .replace("STANCE:", "")
-                        .replace("DOB:", "")
-                        .replace("SLpM:", "")
-                        .replace("Str. Acc.:", "")
-                        .replace("SApM:", "")
-                        .replace("Str. Def:", "")
-                        .replace("TD Avg.:", "")
-                        .replace("TD Acc.:", "")
-                        .replace("TD Def.:", "")
-                        .replace("Sub. Avg.:", "")
-                )
-            return fighter_name, data
+            return fighter_url, self._get_fighter_data(another_soup)
         except Exception as e:  # pragma: no cover - network errors are flaky
             # Log the error so that the calling code can skip this fighter but we
             # still get visibility into what went wrong.
             print(f"Error scraping fighter data for {fighter_name} ({fighter_url}): {e}")
-            return fighter_name, []
-
-    def _get_fighter_name_and_details(
-            self, fighter_name_and_link: Dict[str, List[str]]
-    ) -> None:
-        fighter_name_and_details = {}
+            return fighter_url, []
 
-        l = len(fighter_name_and_link)
+    @staticmethod
+    def _get_fighter_data(fighter_soup: BeautifulSoup) -> List[str]:
+        divs = fighter_soup.findAll(
+            "li",
+            {"class": "b-list__box-list-item b-list__box-list-item_type_block"},
+        )
+        data = []
+        for i, div in enumerate(divs):
+            if i == 9:
+                # An empty string is scraped here, let's not append that
+                continue
+            data.append(
+                div.text.replace("  ", "")
+                    .replace("\n", "")
+                    .replace("Height:", "")
+                    .replace("Weight:", "")
+                    .replace("Reach:", "")
+                    .replace("STANCE:", "")
+                    .replace("DOB:", "")
+                    .replace("SLpM:", "")
+                    .replace("Str. Acc.:", "")
+                    .replace("SApM:", "")
+                    .replace("Str. Def:", "")
+                    .replace("TD Avg.:", "")
+                    .replace("TD Acc.:", "")
+                    .replace("TD Def.:", "")
+                    .replace("Sub. Avg.:", "")
+            )
+        return data
+
+    def _get_fighter_link_and_details(self, fighter_link_and_name: Dict[str, str]) -> None:
+        completed = self.checkpoint.start(fighter_link_and_name, resume=self.resume)
+        fighter_link_and_details = {
+            url: completed[url] for url in fighter_link_and_name if url in completed
+        }
+        if fighter_link_and_details:
+            print(f"Resuming, {len(fighter_link_and_details)} fighters were already scraped")
+
+        remaining = {
+            url: name for url, name in fighter_link_and_name.items() if url not in completed
+        }
+        CACHE_LOOKUPS.labels("checkpoint", "hit").inc(len(fighter_link_and_details))
+        CACHE_LOOKUPS.labels("checkpoint", "miss").inc(len(remaining))
+        l = len(remaining)
         print(f'Scraping data for {l} fighters: ')
 
         # Get fighter data in parallel.
         with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-            futures = []
-            for index, (fighter_name, fighter_url) in enumerate(fighter_name_and_link.items()):
-                futures.append(executor.submit(FighterDetailsScraper._get_fighter_data_task, self=self,
-                                               fighter_name=fighter_name, fighter_url=fighter_url))
+            futures = {}
+            for index, (fighter_url, fighter_name) in enumerate(remaining.items()):
+                futures[executor.submit(FighterDetailsScraper._get_fighter_data_task, self=self,
+                                        fighter_url=fighter_url, fighter_name=fighter_name)] = fighter_name
             idx_progress = 0
             print_progress(0, l, prefix="Progress:", suffix="Complete")
             for future in concurrent.futures.as_completed(futures):
-                fighter_name_and_details[future.result()[0]] = future.result()[1]
+                fighter_url, details = future.result()
+                fighter_link_and_details[fighter_url] = details
+                # An empty result means the page couldn't be fetched
+                if details:
+                    SCRAPED_ITEMS.labels("fighter_data").inc()
+                    self.checkpoint.mark_completed(fighter_url, details)
+                else:
+                    SCRAPE_ERRORS.labels("fighter_data").inc()
+                    self.checkpoint.mark_failed(fighter_url, futures[future])
                 print_progress(idx_progress + 1, l, prefix="Progress:", suffix="Complete")
                 idx_progress += 1
 
         fighters_with_no_data = []
-        for name, details in fighter_name_and_details.items():
+        for url, details in fighter_link_and_details.items():
             if len(details) != len(self.HEADER):
-                fighters_with_no_data.append(name)
+                fighters_with_no_data.append(url)
 
-        [fighter_name_and_details.pop(name) for name in fighters_with_no_data]
+        [fighter_link_and_details.pop(url) for url in fighters_with_no_data]
 
-        if not fighter_name_and_details:
+        if not fighter_link_and_details:
             print("No new fighter data to scrape at the moment!")
             return
 
         self.new_fighters_exists = True
+        self.fighter_link_and_details = fighter_link_and_details
 
-        # dump fighter_name_and_details as scraped_fighter_data_dict
-        with open(self.SCRAPED_FIGHTER_DATA_DICT_PICKLE_PATH.as_posix(), "wb") as f:
-            pickle.dump(fighter_name_and_details, f)
+        # dump fighter_link_and_details as scraped_fighter_data_dict
+        def dump(path):
+            with open(path.as_posix(), "wb") as f:
+                pickle.dump(fighter_link_and_details, f)
 
-    def _fighter_details_to_df(self):
-
-        with open(self.SCRAPED_FIGHTER_DATA_DICT_PICKLE_PATH.as_posix(), "rb") as f:
-            fighter_name_and_details = pickle.load(f)
+        WRITER.write(self.SCRAPED_FIGHTER_DATA_DICT_PICKLE_PATH, dump)
 
+    def _fighter_details_to_df(self, fighter_link_and_name: Dict[str, str]):
+        links = list(self.fighter_link_and_details)
         df = (
-            pd.DataFrame(fighter_name_and_details)
+            pd.DataFrame(self.fighter_link_and_details)
             .T.replace("--", value=np.NaN)
             .replace("", value=np.NaN)
         )
         df.columns = self.HEADER
+        df.insert(0, "fighter_name", [fighter_link_and_name[link] for link in links])
+        df.index = pd.Index(REGISTRY.ids(links), name="fighter_id")
 
         return df
 
+    def _update_from_listing(self, fighter_details_df: pd.DataFrame) -> None:
+        listing_df = (
+            pd.DataFrame.from_dict(
+                self.listing_details, orient="index", columns=self.LISTING_COLUMNS
+            )
+            .replace("--", value=np.NaN)
+            .replace("", value=np.NaN)
+        )
+        listing_df.index = pd.Index(REGISTRY.ids(listing_df.index), name="fighter_id")
+        # Details missing from the listings are kept
+        fighter_details_df.update(listing_df)
+        n_listed = len(fighter_details_df.index.intersection(listing_df.index))
+        print(f"Updated the height, weight, reach and stance of {n_listed} fighters from the listings")
+
+    def _read_fighter_details(self) -> pd.DataFrame:
+        """
+        As strings, the rows that don't change are written back as they are.
+        Files written before the IDs get the IDs of their fighters' names.
+        """
+        fighter_details_df = pd.read_csv(self.FIGHTER_DETAILS_PATH, dtype=str)
+        if "fighter_id" not in fighter_details_df.columns:
+            return with_fighter_ids(fighter_details_df.set_index("fighter_name"))
+        fighter_details_df.index = pd.Index(
+            fighter_details_df.pop("fighter_id").astype(np.int32), name="fighter_id"
+        )
+        return fighter_details_df
+
     def create_fighter_data_csv(self) -> None:
 
         print("Getting fighter urls \n")
@@ -200,27 +306,43 @@ class FighterDetailsScraper:
             self._get_updated_fighter_links()
         )
 
-        if not self.new_fighter_links:
-            if self.FIGHTER_DETAILS_PATH.exists():
-                print(f'No new fighter data to scrape at the moment, loaded existing data from {self.FIGHTER_DETAILS_PATH}.')
-                return
-            else:
-                self._get_fighter_name_and_details(self.all_fighter_links)
-                fighter_details_df = self._fighter_details_to_df()
-        else:
-            self._get_fighter_name_and_details(self.new_fighter_links)
-            if self.new_fighters_exists:
-                new_fighter_details_df = self._fighter_details_to_df()
-            else:
-                return
-
-            old_fighter_details_df = pd.read_csv(
-                self.FIGHTER_DETAILS_PATH, index_col="fighter_name"
-            )
-
-            fighter_details_df = new_fighter_details_df.append(
-                old_fighter_details_df, ignore_index=False
-            )
+        if self.FIGHTER_DETAILS_PATH.exists():
+            self.new_fighter_links = self._add_unfinished_fighters(self.new_fighter_links)
 
-        fighter_details_df.to_csv(self.FIGHTER_DETAILS_PATH, index_label="fighter_name")
-        print(f'Successfully scraped and saved ufc fighter data to {self.FIGHTER_DETAILS_PATH}\n')
+        if not self.FIGHTER_DETAILS_PATH.exists():
+            self._get_fighter_link_and_details(self.all_fighter_links)
+            fighter_details_df = self._fighter_details_to_df(self.all_fighter_links)
+        elif not self.new_fighter_links and not self.listing_refresh:
+            print(f'No new fighter data to scrape at the moment, loaded existing data from {self.FIGHTER_DETAILS_PATH}.')
+            return
+        else:
+            WRITER.wait([self.FIGHTER_DETAILS_PATH])
+            fighter_details_df = self._read_fighter_details()
+
+            if self.new_fighter_links:
+                self._get_fighter_link_and_details(self.new_fighter_links)
+                if self.new_fighters_exists:
+                    new_fighter_details_df = self._fighter_details_to_df(self.new_fighter_links)
+                    # Retried fighters may already have an (outdated) row
+                    fighter_details_df = pd.concat(
+                        [
+                            new_fighter_details_df,
+                            fighter_details_df.drop(
+                                new_fighter_details_df.index, errors="ignore"
+                            ),
+                        ]
+                    )
+                elif not self.listing_refresh:
+                    self.checkpoint.finish()
+                    return
+
+        if self.listing_refresh:
+            self._update_from_listing(fighter_details_df)
+
+        # The preprocessing takes the details from here while they are written,
+        # the checkpoint is only cleared once they are
+        self.fighter_details = fighter_details_df
+        WRITER.submit(REGISTRY.save, path=REGISTRY.PATH)
+        WRITER.write(self.FIGHTER_DETAILS_PATH, lambda path: fighter_details_df.to_csv(path))
+        WRITER.submit(self.checkpoint.finish, after=[self.FIGHTER_DETAILS_PATH])
+        print(f'Successfully scraped ufc fighter data, saving it to {self.FIGHTER_DETAILS_PATH} in the background\n')
@@ -1,8 +1,15 @@
+import os
 import sys
+import threading
+from typing import Dict, Optional, Tuple
 
 import requests
 from bs4 import BeautifulSoup
 
+from src.createdata.archive import SCRAPE_MODES, PageArchive, ReplayAdapter
+from src.createdata.fetch import FetchScheduler
+from src.createdata.metrics import PARSE_DURATION, page_type
+
 
 # Re-use a single ``requests`` session so we get connection pooling and can also
 # configure retries in one place.  Some of the UFC endpoints occasionally return
@@ -29,24 +36,125 @@ _session.headers.update(
 )
 
 
+# Both scrapers share the session and the scheduler, so the request rate and
+# the connection budget are global: when fight and fighter data are scraped
+# concurrently their thread pools compete for the same budget.
+MAX_CONNECTIONS = 16
+_scheduler = FetchScheduler(_session, max_connections=MAX_CONNECTIONS)
+
+# The scrapers can run against a recorded copy of ufcstats, e.g. in CI or to
+# benchmark them: ``UFC_SCRAPE_MODE=record`` archives every fetched page and
+# ``UFC_SCRAPE_MODE=replay`` serves them back, ``UFC_REPLAY_LATENCY`` seconds
+# after each request.
+_scrape_mode = "live"
+_archive: Optional[PageArchive] = None
+
+
+def configure_http(
+    max_requests_per_second: Optional[float] = None,
+    max_connections: int = MAX_CONNECTIONS,
+    mode: Optional[str] = None,
+    archive_path: Optional[str] = None,
+    replay_latency: Optional[float] = None,
+) -> None:
+    """
+    Sets the global request rate, the maximum number of simultaneous
+    connections and whether pages are fetched live, recorded or replayed.
+    ``mode``, ``archive_path`` and ``replay_latency`` default to the
+    ``UFC_SCRAPE_MODE``, ``UFC_PAGE_ARCHIVE`` and ``UFC_REPLAY_LATENCY``
+    environment variables.
+    """
+    global _scrape_mode, _archive
+
+    mode = mode or os.environ.get("UFC_SCRAPE_MODE", "live")
+    if mode not in SCRAPE_MODES:
+        raise ValueError(f"Unknown scrape mode {mode}, expected one of {SCRAPE_MODES}")
+    archive_path = archive_path or os.environ.get("UFC_PAGE_ARCHIVE")
+    if replay_latency is None:
+        replay_latency = float(os.environ.get("UFC_REPLAY_LATENCY", 0))
+
+    _scheduler.configure(
+        max_requests_per_second=max_requests_per_second, max_connections=max_connections
+    )
+    _scrape_mode = mode
+    _archive = None
+    if mode != "live":
+        _archive = PageArchive(archive_path) if archive_path else PageArchive()
+    if mode == "replay":
+        adapter = ReplayAdapter(_archive, latency=replay_latency)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+
+
+configure_http()
+
+
 def make_soup(url: str) -> BeautifulSoup:
     """Return a :class:`~bs4.BeautifulSoup` object for ``url``.
 
-    The helper now follows redirects and raises an informative error if the
-    request fails.  Returning early when a non-``200`` status code is received
-    prevents downstream parsing functions from silently operating on the
-    "Forbidden" or "Moved" placeholder pages which previously led to completely
-    incorrect data being written to ``data.csv``.
+    The helper follows redirects and raises an informative error if the request
+    fails.  Raising when a non-``200`` status code is received prevents
+    downstream parsing functions from silently operating on the "Forbidden" or
+    "Moved" placeholder pages which previously led to completely incorrect data
+    being written to ``data.csv``.  Throttling responses, server errors and
+    network errors are retried with backoff by the fetch scheduler first, only
+    pages that still fail after that bubble up to the caller.
     """
 
-    response = _session.get(url, allow_redirects=True, timeout=10)
+    text = fetch_page(url)
+    with PARSE_DURATION.labels(page_type(url)).time():
+        return BeautifulSoup(text, "html.parser")
 
-    # ``raise_for_status`` will throw an ``HTTPError`` for 4xx/5xx responses.  We
-    # intentionally let this bubble up so the caller can decide how to handle
-    # failures rather than operating on bad HTML.
-    response.raise_for_status()
 
-    return BeautifulSoup(response.text, "html.parser")
+def fetch_page(url: str) -> str:
+    """Return the HTML of ``url``, archiving it in record mode."""
+    text = _scheduler.fetch(url)
+    if _scrape_mode == "record":
+        _archive.save(url, text)
+    return text
+
+
+class _ProgressBoard:
+    """
+    Combined progress line for tasks running in different threads.
+
+    A thread registers the task it works on with ``set_progress_task``, after
+    which its ``print_progress`` calls update that task's entry of a single
+    shared line instead of drawing a bar of their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._tasks: Dict[str, Tuple[int, int]] = {}
+
+    @property
+    def task(self) -> Optional[str]:
+        return getattr(self._local, "task", None)
+
+    @task.setter
+    def task(self, name: Optional[str]) -> None:
+        self._local.task = name
+
+    def update(self, iteration: int, total: int) -> None:
+        with self._lock:
+            self._tasks[self.task] = (iteration, total)
+            line = " | ".join(
+                f"{task}: {100 * (iteration / float(total or 1)):.2f}%"
+                for task, (iteration, total) in self._tasks.items()
+            )
+            sys.stdout.write(f"\r{line}")
+            if all(iteration == total for iteration, total in self._tasks.values()):
+                sys.stdout.write("\n")
+            sys.stdout.flush()
+
+
+_progress_board = _ProgressBoard()
+
+
+def set_progress_task(name: Optional[str]) -> None:
+    """Route the calling thread's progress to the combined progress line."""
+    _progress_board.task = name
 
 
 def print_progress(
@@ -67,6 +175,10 @@ def print_progress(
         decimals    - Optional  : positive number of decimals in percent complete (Int)
         bar_length  - Optional  : character length of bar (Int)
     """
+    if _progress_board.task is not None:
+        _progress_board.update(iteration, total)
+        return
+
     percents = f"{100 * (iteration / float(total)):.2f}"
     filled_length = int(round(bar_length * iteration / float(total)))
     bar = f'{"█" * filled_length}{"-" * (bar_length - filled_length)}'
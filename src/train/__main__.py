@@ -0,0 +1,95 @@
+import argparse
+import time
+from pathlib import Path
+
+from src.train.artifacts import ArtifactStore
+from src.train.incremental import IncrementalTrainer
+from src.train.trainer import PARAM_GRIDS, ModelTrainer
+
+from src.createdata.data_files_path import PREPROCESSED_DATA, UFC_DATA  # isort:skip
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.train",
+        description="Train the UFC prediction model and write versioned app artifacts.",
+    )
+    parser.add_argument("--model", choices=sorted(PARAM_GRIDS), default="xgboost")
+    parser.add_argument(
+        "--balance", choices=["reshuffle", "oversample", "none"], default="reshuffle"
+    )
+    parser.add_argument("--data", type=Path, default=PREPROCESSED_DATA)
+    parser.add_argument(
+        "--ufc-data", type=Path, default=UFC_DATA, help="data.csv with the dates of the rows of --data"
+    )
+    parser.add_argument("--cv-folds", type=int, default=5)
+    parser.add_argument("--early-stopping-rounds", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to all cores")
+    parser.add_argument("--no-cache", action="store_true", help="re-evaluate every config")
+    parser.add_argument("--no-promote", action="store_true", help="don't point LATEST at the new model")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="continue boosting the promoted model on the latest fights instead of a full retrain",
+    )
+    parser.add_argument("--window-days", type=int, default=730, help="incremental: sliding window")
+    parser.add_argument(
+        "--half-life-days", type=int, default=None, help="incremental: decay of the sample weights"
+    )
+    parser.add_argument("--holdout-events", type=int, default=3, help="incremental: events held out")
+    parser.add_argument("--rounds", type=int, default=50, help="incremental: boosting rounds to add")
+    parser.add_argument(
+        "--max-trees", type=int, default=2000, help="incremental: refit on the window past this many trees"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.005, help="incremental: allowed AUC/log-loss regression"
+    )
+    parser.add_argument(
+        "--export-app-data",
+        type=Path,
+        default=None,
+        help="also copy the promoted artifacts into this folder, e.g. src/app/app_data",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    time_start = time.time()
+    artifact_store = ArtifactStore()
+    if args.incremental:
+        trainer = IncrementalTrainer(
+            window_days=args.window_days,
+            half_life_days=args.half_life_days,
+            holdout_events=args.holdout_events,
+            rounds=args.rounds,
+            max_trees=args.max_trees,
+            tolerance=args.tolerance,
+            data_path=args.data,
+            ufc_data_path=args.ufc_data,
+            artifact_store=artifact_store,
+        )
+        version = trainer.retrain(promote=not args.no_promote)
+    else:
+        trainer = ModelTrainer(
+            model_type=args.model,
+            balance=args.balance,
+            cv_folds=args.cv_folds,
+            early_stopping_rounds=args.early_stopping_rounds,
+            max_workers=args.workers,
+            use_cache=not args.no_cache,
+            data_path=args.data,
+            ufc_data_path=args.ufc_data,
+            artifact_store=artifact_store,
+        )
+        version = trainer.train(promote=not args.no_promote)
+
+    # Only a promoted model is exported to the app
+    if args.export_app_data is not None and version == artifact_store.latest_version():
+        artifact_store.export(args.export_app_data, version)
+    print(f'elapsed seconds = {(time.time() - time_start):.2f}')
+
+
+if __name__ == "__main__":
+    main()
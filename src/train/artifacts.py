@@ -0,0 +1,117 @@
+import json
+import pickle
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.createdata.feature_store import FighterFeatureStore
+from src.createdata.preprocess_state import PreprocessState
+
+from src.createdata.data_files_path import FEATURE_STORE, MODEL_ARTIFACTS  # isort:skip
+
+# File names the dash app loads from ``src/app/app_data``.
+MODEL_FILE = "model.sav"
+COLS_FILE = "cols.list"
+SCALER_FILE = "standard.scaler"
+FIGHTER_STATS_FILE = "latest_fighter_stats.csv"
+METADATA_FILE = "metadata.json"
+LATEST_POINTER = "LATEST"
+
+
+class ArtifactStore:
+    """
+    Versioned storage for the artifacts the app needs to make predictions.
+
+    Every training run writes ``model.sav``, ``cols.list`` and ``standard.scaler``
+    (plus a ``metadata.json`` describing the run) into its own directory
+    ``data/models/<version>``. The ``LATEST`` file points at the version that is
+    currently promoted.
+    """
+
+    def __init__(self, base_path: Path = MODEL_ARTIFACTS):
+        self.BASE_PATH = Path(base_path)
+        self.LATEST_POINTER_PATH = self.BASE_PATH / LATEST_POINTER
+
+    @staticmethod
+    def new_version() -> str:
+        return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+    def versions(self) -> List[str]:
+        if not self.BASE_PATH.exists():
+            return []
+        return sorted(
+            path.name
+            for path in self.BASE_PATH.iterdir()
+            if path.is_dir() and (path / MODEL_FILE).exists()
+        )
+
+    def latest_version(self) -> Optional[str]:
+        if not self.LATEST_POINTER_PATH.exists():
+            return None
+        return self.LATEST_POINTER_PATH.read_text().strip() or None
+
+    def save(
+        self, model, cols: List[str], scaler, metadata: Dict, promote: bool = True
+    ) -> str:
+        version = self.new_version()
+        version_path = self.BASE_PATH / version
+        version_path.mkdir(parents=True, exist_ok=False)
+
+        with open(version_path / MODEL_FILE, "wb") as f:
+            pickle.dump(model, f)
+        with open(version_path / COLS_FILE, "wb") as f:
+            pickle.dump(list(cols), f)
+        with open(version_path / SCALER_FILE, "wb") as f:
+            pickle.dump(scaler, f)
+        with open(version_path / METADATA_FILE, "w") as f:
+            json.dump(dict(metadata, version=version), f, indent=2, default=str)
+
+        print(f"Saved model artifacts to {version_path}")
+
+        if promote:
+            self.promote(version)
+
+        return version
+
+    def load(self, version: Optional[str] = None):
+        version = version or self.latest_version()
+        if version is None:
+            raise FileNotFoundError(f"No promoted model artifacts in {self.BASE_PATH}")
+
+        version_path = self.BASE_PATH / version
+        with open(version_path / MODEL_FILE, "rb") as f:
+            model = pickle.load(f)
+        with open(version_path / COLS_FILE, "rb") as f:
+            cols = pickle.load(f)
+        with open(version_path / SCALER_FILE, "rb") as f:
+            scaler = pickle.load(f)
+        with open(version_path / METADATA_FILE, "r") as f:
+            metadata = json.load(f)
+
+        return model, cols, scaler, metadata
+
+    def promote(self, version: str) -> None:
+        if not (self.BASE_PATH / version / MODEL_FILE).exists():
+            raise FileNotFoundError(f"Unknown model version {version}")
+        self.LATEST_POINTER_PATH.write_text(version)
+        print(f"Promoted model version {version}")
+
+    def export(self, app_data_path: Path, version: Optional[str] = None) -> None:
+        """Copy the artifacts of ``version`` (default: latest) into the app folder."""
+        version = version or self.latest_version()
+        if version is None:
+            raise FileNotFoundError(f"No promoted model artifacts in {self.BASE_PATH}")
+
+        app_data_path = Path(app_data_path)
+        app_data_path.mkdir(parents=True, exist_ok=True)
+        for file_name in (MODEL_FILE, COLS_FILE, SCALER_FILE):
+            shutil.copyfile(self.BASE_PATH / version / file_name, app_data_path / file_name)
+
+        # The latest stats of every fighter, ``data.csv`` computes them the same way
+        feature_store = FighterFeatureStore.load(FEATURE_STORE)
+        if feature_store is not None:
+            state = PreprocessState().load()
+            ratings = state["ratings"].ratings() if state and "ratings" in state else None
+            feature_store.app_stats(ratings).to_csv(app_data_path / FIGHTER_STATS_FILE)
+        print(f"Exported model version {version} to {app_data_path}")
@@ -0,0 +1,295 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import (accuracy_score, brier_score_loss, log_loss,
+                             roc_auc_score)
+from xgboost import XGBClassifier
+
+from src.createdata.utils import print_progress
+from src.train.artifacts import ArtifactStore
+from src.train.trainer import load_training_data, split_features_and_target
+
+from src.createdata.data_files_path import (  # isort:skip
+    BACKTEST_CACHE,
+    BACKTEST_RESULTS,
+    PREPROCESSED_DATA,
+    UFC_DATA,
+)
+
+DEFAULT_PARAMS = {
+    "learning_rate": 0.1,
+    "n_estimators": 120,
+    "max_depth": 3,
+    "min_child_weight": 1,
+    "gamma": 0.3,
+    "subsample": 1,
+    "colsample_bytree": 1,
+    "objective": "binary:logistic",
+}
+
+# Shared, read-only state of the fold worker processes, sent once per worker
+_worker_X = None
+_worker_y = None
+_worker_swap = None
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray, swap: np.ndarray) -> None:
+    global _worker_X, _worker_y, _worker_swap
+    _worker_X, _worker_y, _worker_swap = X, y, swap
+
+
+def _fold_cache_key(train_end: int, params: Dict, reshuffle: bool, random_state: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(_worker_X[:train_end]).tobytes())
+    digest.update(np.ascontiguousarray(_worker_y[:train_end]).tobytes())
+    digest.update(
+        json.dumps(
+            {"params": params, "reshuffle": reshuffle, "random_state": random_state},
+            sort_keys=True,
+        ).encode()
+    )
+    return digest.hexdigest()
+
+
+def _run_fold(
+    train_end: int,
+    test_end: int,
+    params: Dict,
+    reshuffle: bool,
+    random_state: int,
+    cache_path: Path,
+) -> Tuple[int, np.ndarray, bool]:
+    model_path = cache_path / f"{_fold_cache_key(train_end, params, reshuffle, random_state)}.sav"
+
+    cached = model_path.exists()
+    if cached:
+        with open(model_path, "rb") as f:
+            model = pickle.load(f)
+    else:
+        X, y = _worker_X[:train_end], _worker_y[:train_end]
+        if reshuffle:
+            X, y = _reshuffle(X, y, random_state)
+        model = XGBClassifier(**params, n_jobs=1, random_state=random_state)
+        model.fit(X, y)
+        with open(model_path, "wb") as f:
+            pickle.dump(model, f)
+
+    return train_end, model.predict_proba(_worker_X[train_end:test_end])[:, 1], cached
+
+
+def _reshuffle(X: np.ndarray, y: np.ndarray, random_state: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Array version of ``trainer.reshuffle``: swap corners of some red wins."""
+    n_swap = (int((y == 1).sum()) - int((y == 0).sum())) // 2
+    if n_swap <= 0:
+        return X, y
+
+    rng = np.random.RandomState(random_state)
+    rows = rng.choice(np.flatnonzero(y == 1), size=n_swap, replace=False)
+    X, y = X.copy(), y.copy()
+    X[rows] = X[rows][:, _worker_swap]
+    y[rows] = 0
+    return X, y
+
+
+def corner_swap_index(columns: List[str]) -> np.ndarray:
+    """Column permutation that exchanges every ``R_`` column with its ``B_`` twin."""
+    position = {column: i for i, column in enumerate(columns)}
+    swap = []
+    for column in columns:
+        if column.startswith("R_") and "B_" + column[2:] in position:
+            swap.append(position["B_" + column[2:]])
+        elif column.startswith("B_") and "R_" + column[2:] in position:
+            swap.append(position["R_" + column[2:]])
+        else:
+            swap.append(position[column])
+    return np.array(swap)
+
+
+class Backtester:
+    """
+    Walk-forward evaluation: for every event date D a model is trained on all
+    the fights before D and predicts the fights at D.
+
+    Every row of ``preprocessed_data.csv`` already describes both fighters as
+    they were before that fight, so the folds are plain prefixes of the rows
+    sorted by date and nothing has to be preprocessed again. Fold models are
+    cached on disk keyed by their training rows, so rerunning the backtest
+    after a new event only trains the new fold.
+    """
+
+    def __init__(
+        self,
+        params: Optional[Dict] = None,
+        min_train_events: int = 50,
+        step: int = 1,
+        reshuffle: bool = True,
+        max_workers: Optional[int] = None,
+        random_state: int = 43,
+        data_path: Path = PREPROCESSED_DATA,
+        ufc_data_path: Path = UFC_DATA,
+    ):
+        self.params = params or DEFAULT_PARAMS
+        self.min_train_events = min_train_events
+        self.step = step
+        self.reshuffle = reshuffle
+        self.max_workers = max_workers or os.cpu_count()
+        self.random_state = random_state
+        self.DATA_PATH = Path(data_path)
+        self.UFC_DATA_PATH = Path(ufc_data_path)
+        self.BACKTEST_CACHE_PATH = BACKTEST_CACHE
+        self.BACKTEST_RESULTS_PATH = BACKTEST_RESULTS
+
+    def run(self) -> pd.DataFrame:
+        df, dates = load_training_data(self.DATA_PATH, self.UFC_DATA_PATH)
+        order = np.argsort(dates.values, kind="stable")
+        df, dates = df.iloc[order].reset_index(drop=True), dates.iloc[order].reset_index(drop=True)
+
+        X, y = split_features_and_target(df)
+        features = np.array(X, dtype=np.float64)
+        swap = corner_swap_index(list(X.columns))
+
+        folds = self._folds(dates)
+        self.BACKTEST_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+
+        probabilities = np.full(len(df), np.nan)
+        l = len(folds)
+        n_cached = 0
+        print(f"Running {l} walk-forward folds on {self.max_workers} workers: ")
+        print_progress(0, l, prefix="Progress:", suffix="Complete")
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(features, y, swap),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_fold,
+                    train_end,
+                    test_end,
+                    self.params,
+                    self.reshuffle,
+                    self.random_state,
+                    self.BACKTEST_CACHE_PATH,
+                )
+                for train_end, test_end in folds
+            ]
+            for index, future in enumerate(concurrent.futures.as_completed(futures)):
+                train_end, fold_probabilities, cached = future.result()
+                probabilities[train_end : train_end + len(fold_probabilities)] = fold_probabilities
+                n_cached += cached
+                print_progress(index + 1, l, prefix="Progress:", suffix="Complete")
+
+        print(f"{n_cached} of {l} fold models were loaded from the cache")
+
+        predictions = pd.DataFrame({"date": dates, "Winner": y, "probability": probabilities})
+        return predictions.dropna(subset=["probability"]).reset_index(drop=True)
+
+    def _folds(self, dates: pd.Series) -> List[Tuple[int, int]]:
+        """``(train_end, test_end)`` row offsets, one fold per ``step`` events."""
+        event_starts = np.flatnonzero(dates.ne(dates.shift()).values)
+        boundaries = list(event_starts[self.min_train_events :: self.step]) + [len(dates)]
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def save_report(self, predictions: pd.DataFrame, freq: str = "Y") -> None:
+        self.BACKTEST_RESULTS_PATH.mkdir(parents=True, exist_ok=True)
+        predictions.to_csv(self.BACKTEST_RESULTS_PATH / "predictions.csv", index=False)
+
+        report = metrics_over_time(predictions, freq=freq)
+        report.to_csv(self.BACKTEST_RESULTS_PATH / "metrics_over_time.csv")
+
+        calibration = calibration_table(predictions)
+        calibration.to_csv(self.BACKTEST_RESULTS_PATH / "calibration.csv", index=False)
+
+        overall = fold_metrics(predictions)
+        print(report.to_string(float_format=lambda x: f"{x:.4f}"))
+        print(calibration.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+        print(
+            f"Overall: accuracy {overall['accuracy']:.4f}, AUC {overall['auc']:.4f}, "
+            f"log-loss {overall['log_loss']:.4f}, brier {overall['brier']:.4f} "
+            f"over {overall['n_fights']} fights"
+        )
+        print(f"Saved backtest results to {self.BACKTEST_RESULTS_PATH}")
+
+
+def fold_metrics(predictions: pd.DataFrame) -> Dict:
+    y, probability = predictions["Winner"].values, predictions["probability"].values
+    return {
+        "n_fights": int(len(y)),
+        "accuracy": float(accuracy_score(y, probability > 0.5)),
+        "auc": float(roc_auc_score(y, probability)) if len(np.unique(y)) == 2 else np.nan,
+        "log_loss": float(log_loss(y, probability, labels=[0, 1])),
+        "brier": float(brier_score_loss(y, probability)),
+    }
+
+
+def metrics_over_time(predictions: pd.DataFrame, freq: str = "Y") -> pd.DataFrame:
+    grouped = predictions.groupby(predictions["date"].dt.to_period(freq))
+    return pd.DataFrame({period: fold_metrics(group) for period, group in grouped}).T
+
+
+def calibration_table(predictions: pd.DataFrame, bins: int = 10) -> pd.DataFrame:
+    bucket = pd.cut(predictions["probability"], np.linspace(0, 1, bins + 1), include_lowest=True)
+    grouped = predictions.groupby(bucket)
+    return pd.DataFrame(
+        {
+            "bin": [str(interval) for interval in grouped.size().index],
+            "n_fights": grouped.size().values,
+            "mean_predicted": grouped["probability"].mean().values,
+            "observed_red_win_rate": grouped["Winner"].mean().values,
+        }
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.train.backtest",
+        description="Walk-forward backtest of the UFC prediction model.",
+    )
+    parser.add_argument("--min-train-events", type=int, default=50)
+    parser.add_argument("--step", type=int, default=1, help="events predicted by each fold model")
+    parser.add_argument("--no-reshuffle", action="store_true")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to all cores")
+    parser.add_argument("--freq", default="Y", help="period of the metrics report, e.g. Y or Q")
+    parser.add_argument(
+        "--params-from-latest",
+        action="store_true",
+        help="use the hyperparameters of the promoted model instead of the defaults",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    time_start = time.time()
+    params = None
+    if args.params_from_latest:
+        _, _, _, metadata = ArtifactStore().load()
+        if metadata["model_type"] != "xgboost":
+            raise ValueError("The backtest only supports XGBoost models")
+        params = metadata["params"]
+
+    backtester = Backtester(
+        params=params,
+        min_train_events=args.min_train_events,
+        step=args.step,
+        reshuffle=not args.no_reshuffle,
+        max_workers=args.workers,
+    )
+    predictions = backtester.run()
+    backtester.save_report(predictions, freq=args.freq)
+    print(f'elapsed seconds = {(time.time() - time_start):.2f}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import log_loss, roc_auc_score
+from xgboost import XGBClassifier
+
+from src.train.artifacts import ArtifactStore
+from src.train.trainer import (ModelTrainer, load_training_data,
+                               split_features_and_target)
+
+from src.createdata.data_files_path import (  # isort:skip
+    PREPROCESSED_DATA,
+    UFC_DATA,
+)
+
+
+class IncrementalTrainer:
+    """
+    Continues boosting the promoted XGBoost model on the most recent fights
+    instead of refitting it on the whole history.
+
+    ``rounds`` new trees are fit on the fights of the last ``window_days``
+    the model hasn't been trained on (optionally with exponentially decaying
+    sample weights). Once the model would have more than ``max_trees`` trees
+    it is refit from scratch on the whole window with its tuned parameters
+    instead. The candidate is compared with the current model on a holdout
+    made of the last ``holdout_events`` events after ``trained_until``, so
+    neither has seen them. The new artifacts are only promoted if neither AUC
+    nor log-loss regress by more than ``tolerance``.
+    """
+
+    def __init__(
+        self,
+        window_days: int = 730,
+        half_life_days: Optional[int] = None,
+        holdout_events: int = 3,
+        rounds: int = 50,
+        max_trees: int = 2000,
+        tolerance: float = 0.005,
+        data_path: Path = PREPROCESSED_DATA,
+        ufc_data_path: Path = UFC_DATA,
+        artifact_store: Optional[ArtifactStore] = None,
+    ):
+        self.window_days = window_days
+        self.half_life_days = half_life_days
+        self.holdout_events = holdout_events
+        self.rounds = rounds
+        self.max_trees = max_trees
+        self.tolerance = tolerance
+        self.DATA_PATH = Path(data_path)
+        self.UFC_DATA_PATH = Path(ufc_data_path)
+        self.artifact_store = artifact_store or ArtifactStore()
+
+    def retrain(self, promote: bool = True) -> Optional[str]:
+        """
+        Saves a new version and returns it, or None when there is nothing new
+        to train on. It is only promoted with ``promote`` and when it passed
+        the holdout.
+        """
+        model, cols, scaler, metadata = self.artifact_store.load()
+        if not isinstance(model, XGBClassifier):
+            raise ValueError("Incremental training can only continue an XGBoost model")
+
+        df, dates = load_training_data(self.DATA_PATH, self.UFC_DATA_PATH)
+        trained_until = pd.Timestamp(metadata.get("trained_until", pd.Timestamp.min))
+        new = (dates > trained_until).values
+        n_new = int(new.sum())
+        if n_new == 0:
+            print(f"No fights after {trained_until.date()}, the model is up to date")
+            return None
+        print(f"Found {n_new} fights the current model has not been trained on")
+
+        X, y = split_features_and_target(df)
+        # Keep the feature space of the promoted model, e.g. a weight class that
+        # is new in the data gets no column until the next full retrain.
+        X = ModelTrainer._transform(scaler, X.reindex(columns=cols, fill_value=0))
+
+        # The holdout is made of new events only, at least one is left to train on
+        new_event_dates = np.sort(dates[new].unique())
+        if len(new_event_dates) < 2:
+            print(f"Only one event after {trained_until.date()}, retraining once it can be held out")
+            return None
+        holdout_start = new_event_dates[-min(self.holdout_events, len(new_event_dates) - 1)]
+        window_start = dates.max() - timedelta(days=self.window_days)
+
+        holdout = (dates >= holdout_start).values
+        window = (dates >= window_start).values
+        weights = self._sample_weights(dates, reference=dates.max())
+
+        n_trees = len(model.get_booster().get_dump())
+        refit = n_trees + self.rounds > self.max_trees
+        if refit:
+            print(f"The model has {n_trees} trees, refitting it on the window")
+        fit = window if refit else window & new
+        train = fit & ~holdout
+        if not train.any() or len(np.unique(y[holdout])) < 2:
+            raise ValueError("Not enough data in the window to evaluate the holdout, increase window_days")
+
+        candidate = self._fit(model, metadata, X[train], y[train], weights[train], refit)
+        current_metrics = self._evaluate(model, X[holdout], y[holdout])
+        candidate_metrics = self._evaluate(candidate, X[holdout], y[holdout])
+        print(f"Holdout of {int(holdout.sum())} fights since {pd.Timestamp(holdout_start).date()}")
+        print(f"current:   AUC {current_metrics['auc']:.4f}, log-loss {current_metrics['log_loss']:.4f}")
+        print(f"candidate: AUC {candidate_metrics['auc']:.4f}, log-loss {candidate_metrics['log_loss']:.4f}")
+
+        passed = (
+            candidate_metrics["auc"] >= current_metrics["auc"] - self.tolerance
+            and candidate_metrics["log_loss"] <= current_metrics["log_loss"] + self.tolerance
+        )
+
+        # The holdout passed, now learn from the latest events as well
+        if passed:
+            candidate = self._fit(model, metadata, X[fit], y[fit], weights[fit], refit)
+        else:
+            print("Candidate regressed on the holdout, keeping the current model")
+
+        new_metadata = dict(
+            metadata,
+            parent_version=metadata.get("version"),
+            incremental={
+                "window_days": self.window_days,
+                "half_life_days": self.half_life_days,
+                "rounds": self.rounds,
+                "max_trees": self.max_trees,
+                "refit": refit,
+                "n_new_rows": n_new,
+            },
+            holdout_metrics={"current": current_metrics, "candidate": candidate_metrics},
+            trained_until=(dates.max() if passed else trained_until).date().isoformat(),
+        )
+        return self.artifact_store.save(
+            candidate, cols, scaler, new_metadata, promote=promote and passed
+        )
+
+    def _sample_weights(self, dates: pd.Series, reference: pd.Timestamp) -> np.ndarray:
+        if not self.half_life_days:
+            return np.ones(len(dates))
+        age_days = (reference - dates).dt.days.values
+        return np.power(0.5, age_days / self.half_life_days)
+
+    def _fit(
+        self,
+        model: XGBClassifier,
+        metadata: Dict,
+        X: pd.DataFrame,
+        y: np.ndarray,
+        weights: np.ndarray,
+        refit: bool,
+    ) -> XGBClassifier:
+        """Adds ``rounds`` trees to ``model``, or refits it with the parameters it was tuned with."""
+        if refit:
+            candidate = XGBClassifier(**dict(model.get_params(), **metadata.get("params", {})))
+            candidate.fit(np.array(X), y, sample_weight=weights)
+            return candidate
+        params = dict(model.get_params(), n_estimators=self.rounds)
+        candidate = XGBClassifier(**params)
+        candidate.fit(np.array(X), y, sample_weight=weights, xgb_model=model.get_booster())
+        return candidate
+
+    @staticmethod
+    def _evaluate(model: XGBClassifier, X: pd.DataFrame, y: np.ndarray) -> Dict:
+        predprob = model.predict_proba(np.array(X))[:, 1]
+        return {
+            "auc": float(roc_auc_score(y, predprob)),
+            "log_loss": float(log_loss(y, predprob, labels=[0, 1])),
+        }
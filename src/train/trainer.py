@@ -0,0 +1,389 @@
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBClassifier
+
+from src.createdata.utils import print_progress
+from src.train.artifacts import ArtifactStore
+
+from src.createdata.data_files_path import (  # isort:skip
+    PREPROCESSED_DATA,
+    TRAINING_CACHE,
+    UFC_DATA,
+)
+
+TARGET = "Winner"
+# ``LabelEncoder`` ordering used in the notebooks: Blue -> 0, Red -> 1. The app
+# relies on it when unpacking ``predict_proba`` as ``[blue_proba, red_proba]``.
+LABELS = {"Blue": 0, "Red": 1}
+
+PARAM_GRIDS = {
+    "xgboost": {
+        "max_depth": [3, 4, 5],
+        "min_child_weight": [1, 3],
+        "gamma": [0, 0.1, 0.3],
+        "subsample": [0.8, 1.0],
+        "colsample_bytree": [0.8, 1.0],
+    },
+    "random_forest": {
+        "n_estimators": [200, 600],
+        "max_depth": [10, 50, None],
+        "max_features": ["sqrt"],
+        "min_samples_leaf": [1, 2, 4],
+        "bootstrap": [True, False],
+    },
+}
+
+BASE_PARAMS = {
+    "xgboost": {
+        "learning_rate": 0.1,
+        "n_estimators": 1000,
+        "objective": "binary:logistic",
+    },
+    "random_forest": {},
+}
+
+# Shared, read-only training data of the search worker processes. It is sent
+# once per worker through the pool initializer instead of once per config.
+_worker_X = None
+_worker_y = None
+
+
+def load_training_data(
+    filepath: Path = PREPROCESSED_DATA, ufc_data_filepath: Path = UFC_DATA
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Returns the preprocessed rows together with the date of each fight.
+
+    ``preprocessed_data.csv`` has no date column, but it holds the same rows as
+    ``data.csv`` in the same order, minus the draws.
+    """
+    df = pd.read_csv(filepath)
+    ufc_data = pd.read_csv(ufc_data_filepath, usecols=["date", TARGET])
+    ufc_data = ufc_data[ufc_data[TARGET] != "Draw"].reset_index(drop=True)
+    if len(ufc_data) != len(df):
+        raise ValueError(
+            f"{filepath} and {ufc_data_filepath} are out of sync, rerun the Preprocessor"
+        )
+
+    # Rows whose winner could not be matched to either corner are not usable
+    usable = df[TARGET].isin(LABELS.keys())
+    dates = pd.to_datetime(ufc_data.loc[usable, "date"]).reset_index(drop=True)
+    return df[usable].reset_index(drop=True), dates
+
+
+def split_features_and_target(df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    features = df.drop(columns=[TARGET])
+    non_numeric = list(features.select_dtypes(exclude=[np.number, bool]).columns)
+    if non_numeric:
+        print(f"Ignoring non numeric columns: {non_numeric}")
+        features = features.drop(columns=non_numeric)
+
+    # Every numeric feature is scaled as float64, booleans are left untouched,
+    # which is what ``normalize`` in the app does with the frame it builds.
+    numeric = features.select_dtypes(include=[np.number]).columns
+    features[numeric] = features[numeric].astype(np.float64)
+
+    return features, df[TARGET].map(LABELS).values
+
+
+def swap_corners(df: pd.DataFrame) -> pd.DataFrame:
+    """Swap every ``R_``/``B_`` column pair and flip the winner."""
+    rename_cols = {}
+    for column in df.columns:
+        if column.startswith("R_"):
+            rename_cols[column] = "B_" + column[2:]
+        elif column.startswith("B_"):
+            rename_cols[column] = "R_" + column[2:]
+
+    swapped = df.rename(rename_cols, axis="columns")[list(df.columns)]
+    if TARGET in swapped.columns:
+        swapped[TARGET] = swapped[TARGET].map({"Red": "Blue", "Blue": "Red"})
+    return swapped
+
+
+def reshuffle(df: pd.DataFrame, random_state: int = 43) -> pd.DataFrame:
+    """
+    Balances the classes by moving a random sample of the red corner winners to
+    the blue corner, like the ``xgboost-Reshuffled`` notebook does.
+    """
+    counts = df[TARGET].value_counts()
+    n_swap = (counts.get("Red", 0) - counts.get("Blue", 0)) // 2
+    if n_swap <= 0:
+        return df
+
+    sample = df[df[TARGET] == "Red"].sample(n=n_swap, random_state=random_state)
+    return pd.concat([df.drop(sample.index), swap_corners(sample)]).sort_index()
+
+
+def oversample(
+    X: pd.DataFrame, y: np.ndarray, random_state: int = 43
+) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Oversamples the minority class with ADASYN, like the ``xgboost-Oversampled`` notebook."""
+    try:
+        from imblearn.over_sampling import ADASYN
+    except ImportError:
+        raise ImportError("Oversampling requires imbalanced-learn: pip install imbalanced-learn")
+
+    X_resampled, y_resampled = ADASYN(random_state=random_state).fit_resample(X, y)
+    return pd.DataFrame(X_resampled, columns=X.columns), np.asarray(y_resampled)
+
+
+def data_fingerprint(X: pd.DataFrame, y: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(X.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    return digest.hexdigest()
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray) -> None:
+    global _worker_X, _worker_y
+    _worker_X, _worker_y = X, y
+
+
+def _evaluate_config(
+    model_type: str,
+    params: Dict,
+    cv_folds: int,
+    early_stopping_rounds: int,
+    random_state: int,
+) -> Dict:
+    # Each worker owns one core, the pool provides the parallelism.
+    if model_type == "xgboost":
+        xgb_params = {
+            "eta": params["learning_rate"],
+            "max_depth": params["max_depth"],
+            "min_child_weight": params["min_child_weight"],
+            "gamma": params["gamma"],
+            "subsample": params["subsample"],
+            "colsample_bytree": params["colsample_bytree"],
+            "objective": params["objective"],
+            "eval_metric": "auc",
+            "nthread": 1,
+            "seed": random_state,
+        }
+        cvresult = xgb.cv(
+            xgb_params,
+            xgb.DMatrix(_worker_X, label=_worker_y),
+            num_boost_round=params["n_estimators"],
+            nfold=cv_folds,
+            metrics="auc",
+            early_stopping_rounds=early_stopping_rounds,
+            seed=random_state,
+        )
+        return {
+            "score": float(cvresult["test-auc-mean"].iloc[-1]),
+            "n_estimators": int(cvresult.shape[0]),
+        }
+
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, **params)
+    scores = cross_val_score(model, _worker_X, _worker_y, cv=cv_folds, scoring="roc_auc")
+    return {"score": float(scores.mean()), "n_estimators": params["n_estimators"]}
+
+
+class ModelTrainer:
+    def __init__(
+        self,
+        model_type: str = "xgboost",
+        balance: str = "reshuffle",
+        cv_folds: int = 5,
+        early_stopping_rounds: int = 50,
+        valid_size: float = 0.1,
+        max_workers: Optional[int] = None,
+        random_state: int = 43,
+        use_cache: bool = True,
+        data_path: Path = PREPROCESSED_DATA,
+        ufc_data_path: Path = UFC_DATA,
+        artifact_store: Optional[ArtifactStore] = None,
+    ):
+        if model_type not in PARAM_GRIDS:
+            raise ValueError(f"Unknown model type {model_type}, expected one of {list(PARAM_GRIDS)}")
+        if balance not in ("reshuffle", "oversample", "none"):
+            raise ValueError(f"Unknown balancing strategy {balance}")
+
+        self.model_type = model_type
+        self.balance = balance
+        self.cv_folds = cv_folds
+        self.early_stopping_rounds = early_stopping_rounds
+        self.valid_size = valid_size
+        self.max_workers = max_workers or os.cpu_count()
+        self.random_state = random_state
+        self.use_cache = use_cache
+        self.DATA_PATH = Path(data_path)
+        self.UFC_DATA_PATH = Path(ufc_data_path)
+        self.TRAINING_CACHE_PATH = TRAINING_CACHE
+        self.artifact_store = artifact_store or ArtifactStore()
+
+    def train(self, promote: bool = True) -> str:
+        print(f"Reading training data from {self.DATA_PATH}")
+        df, dates = load_training_data(self.DATA_PATH, self.UFC_DATA_PATH)
+
+        train_df, valid_df = train_test_split(
+            df, test_size=self.valid_size, random_state=41, stratify=df[TARGET]
+        )
+        X_train, y_train = self._balanced_features_and_target(train_df)
+        X_valid, y_valid = split_features_and_target(valid_df)
+        X_valid = X_valid[X_train.columns]
+
+        print(f"Searching hyperparameters on {len(X_train)} rows, {len(X_train.columns)} features")
+        best_params, best_result = self.search(X_train, y_train)
+        print(f"Best params: {best_params} (cv auc = {best_result['score']:.4f})")
+
+        scaler, X_train_scaled = self._fit_scaler(X_train)
+        model = self._build_model(best_params, best_result["n_estimators"])
+        model.fit(np.array(X_train_scaled), y_train)
+
+        X_valid_scaled = self._transform(scaler, X_valid)
+        valid_predprob = model.predict_proba(np.array(X_valid_scaled))[:, 1]
+        metrics = {
+            "cv_auc": best_result["score"],
+            "valid_accuracy": float(accuracy_score(y_valid, valid_predprob > 0.5)),
+            "valid_auc": float(roc_auc_score(y_valid, valid_predprob)),
+        }
+        print(f"Accuracy (valid): {metrics['valid_accuracy']:.4f}")
+        print(f"AUC Score (valid): {metrics['valid_auc']:.4f}")
+
+        # Final model is refit on all the data with the selected hyperparameters
+        X, y = self._balanced_features_and_target(df)
+        X = X[X_train.columns]
+        scaler, X_scaled = self._fit_scaler(X)
+        model = self._build_model(best_params, best_result["n_estimators"])
+        model.fit(np.array(X_scaled), y)
+
+        metadata = {
+            "model_type": self.model_type,
+            "balance": self.balance,
+            "params": dict(best_params, n_estimators=best_result["n_estimators"]),
+            "metrics": metrics,
+            "n_rows": int(len(X)),
+            "trained_until": dates.max().date().isoformat(),
+            "data_fingerprint": data_fingerprint(X, y),
+        }
+        return self.artifact_store.save(
+            model, list(X.columns), scaler, metadata, promote=promote
+        )
+
+    def search(self, X: pd.DataFrame, y: np.ndarray) -> Tuple[Dict, Dict]:
+        configs = self._param_configs()
+        fingerprint = data_fingerprint(X, y)
+        results: Dict[int, Dict] = {}
+        pending: List[int] = []
+
+        for index, params in enumerate(configs):
+            cached = self._read_cache(fingerprint, params)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+
+        l = len(configs)
+        print(f"Evaluating {len(pending)} of {l} configs ({l - len(pending)} cached) on {self.max_workers} workers: ")
+        print_progress(len(results), l, prefix="Progress:", suffix="Complete")
+
+        if pending:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(np.array(X), y),
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        _evaluate_config,
+                        self.model_type,
+                        configs[index],
+                        self.cv_folds,
+                        self.early_stopping_rounds,
+                        self.random_state,
+                    ): index
+                    for index in pending
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    index = futures[future]
+                    results[index] = future.result()
+                    self._write_cache(fingerprint, configs[index], results[index])
+                    print_progress(len(results), l, prefix="Progress:", suffix="Complete")
+
+        best_index = max(results, key=lambda index: results[index]["score"])
+        return configs[best_index], results[best_index]
+
+    def _param_configs(self) -> List[Dict]:
+        grid = PARAM_GRIDS[self.model_type]
+        keys = sorted(grid)
+        return [
+            dict(BASE_PARAMS[self.model_type], **dict(zip(keys, values)))
+            for values in itertools.product(*(grid[key] for key in keys))
+        ]
+
+    def _balanced_features_and_target(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+        if self.balance == "reshuffle":
+            df = reshuffle(df, random_state=self.random_state)
+
+        X, y = split_features_and_target(df)
+
+        if self.balance == "oversample":
+            X, y = oversample(X, y, random_state=self.random_state)
+
+        return X, y
+
+    @staticmethod
+    def _fit_scaler(X: pd.DataFrame) -> Tuple[StandardScaler, pd.DataFrame]:
+        numeric = list(X.select_dtypes(include=[np.float64]).columns)
+        scaler = StandardScaler().fit(X[numeric])
+        return scaler, ModelTrainer._transform(scaler, X)
+
+    @staticmethod
+    def _transform(scaler: StandardScaler, X: pd.DataFrame) -> pd.DataFrame:
+        X = X.copy()
+        numeric = list(X.select_dtypes(include=[np.float64]).columns)
+        X[numeric] = scaler.transform(X[numeric])
+        return X
+
+    def _build_model(self, params: Dict, n_estimators: int):
+        if self.model_type == "xgboost":
+            return XGBClassifier(
+                **dict(params, n_estimators=n_estimators),
+                n_jobs=-1,
+                random_state=self.random_state,
+            )
+        return RandomForestClassifier(**params, n_jobs=-1, random_state=self.random_state)
+
+    def _cache_path(self, fingerprint: str, params: Dict) -> Path:
+        key = json.dumps(
+            {
+                "data": fingerprint,
+                "model_type": self.model_type,
+                "params": params,
+                "cv_folds": self.cv_folds,
+                "early_stopping_rounds": self.early_stopping_rounds,
+                "random_state": self.random_state,
+            },
+            sort_keys=True,
+        )
+        return self.TRAINING_CACHE_PATH / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _read_cache(self, fingerprint: str, params: Dict) -> Optional[Dict]:
+        if not self.use_cache:
+            return None
+        cache_path = self._cache_path(fingerprint, params)
+        if not cache_path.exists():
+            return None
+        with open(cache_path, "r") as f:
+            return json.load(f)
+
+    def _write_cache(self, fingerprint: str, params: Dict, result: Dict) -> None:
+        self.TRAINING_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        with open(self._cache_path(fingerprint, params), "w") as f:
+            json.dump(result, f)